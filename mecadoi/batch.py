@@ -9,29 +9,74 @@ given file.
 
 __all__ = [
     "deposit",
+    "new_parse_sandbox",
     "parse",
 ]
 
 from datetime import datetime
+from hashlib import sha256
 from logging import getLogger
 from pathlib import Path
-from typing import List, Tuple
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from mecadoi.article import Article, from_meca_manuscript
+from mecadoi.bundle import is_bundle, read_bundle
+from mecadoi.config import (
+    PARSE_CPU_LIMIT,
+    PARSE_MAX_ARCHIVE_SIZE,
+    PARSE_MAX_COMPRESSION_RATIO,
+    PARSE_MAX_MEMBERS,
+    PARSE_MAX_XML_SIZE,
+    PARSE_MEMORY_LIMIT,
+)
 from mecadoi.crossref.api import deposit as deposit_file
 from mecadoi.crossref.peer_review import generate_peer_review_deposition
 from mecadoi.crossref.verify import VerificationResult, verify
 from mecadoi.db import BatchDatabase, DepositionAttempt, ParsedFile
 from mecadoi.dois import get_random_doi, get_free_doi
-from mecadoi.meca import parse_meca_archive
+from mecadoi.meca import (
+    ArchiveLimitExceeded,
+    ArchiveLimits,
+    Manuscript,
+    ManuscriptTriage,
+    parse_meca_archive,
+    PARSER_VERSION,
+)
+from mecadoi.sandbox import LimitExceeded, Sandbox
+from mecadoi.timings import StageTimings
 
 LOGGER = getLogger(__name__)
 
+T = TypeVar("T")
 
-def parse(files: List[str], db: BatchDatabase) -> List[ParsedFile]:
+HASH_CHUNK_SIZE = 1024 * 1024
+
+MEGABYTE = 1024 * 1024
+
+
+def parse(
+    files: List[str],
+    db: BatchDatabase,
+    isolate: bool = True,
+    sandbox: Optional[Sandbox] = None,
+    stage_timings: Optional[StageTimings] = None,
+) -> List[ParsedFile]:
     """
     Parse all given files as MECA archives and store the results in `db`.
 
+    A `ReviewRecord` is stored for every review and author reply in files that can be deposited.
+
     If a file fails to parse, it is stored in the database with the status `ParsedFile.Invalid`.
     Files that are successfully parsed are stored with the status `ParsedFile.Valid` if they have a preprint DOI and
     reviews, with `ParsedFile.NoDoi` if they have a preprint DOI but no reviews, and with `ParsedFile.NoReviews` if they
@@ -39,52 +84,288 @@ def parse(files: List[str], db: BatchDatabase) -> List[ParsedFile]:
     Files that are successfully parsed but have the same preprint DOI as another file in the database are stored with
     the status `ParsedFile.Duplicate`.
 
+    Each file is triaged first by reading only its manifest and article metadata. Files that turn out to have no reviews
+    or to be duplicates are stored without a manuscript; only all other files are parsed completely, since their
+    manuscript is needed to deposit them or to add a preprint DOI later on.
+
+    The SHA-256 hash of each file's content is stored in the database. Files with the same content as a file parsed
+    earlier by the same parser version, in this or a previous batch, are not parsed again: they are stored as
+    `ParsedFile.Invalid` or `ParsedFile.NoReviews` if the earlier file had that status, and as `ParsedFile.Duplicate`
+    otherwise, even if they have no preprint DOI. Files whose earlier parse exceeded the limits of the worker process
+    (see below) are parsed again.
+
     The modification time of each file is stored in the database as the time when the file was received.
 
+    Files can also be directories with the extracted files of a MECA archive, or bundles: TAR or ZIP files that contain
+    MECA archives, see `mecadoi.bundle`. The MECA archives in a bundle are parsed without extracting the bundle and are
+    stored with paths of the form `<path of bundle>!/<name in bundle>`. If a bundle can't be read to its end, the
+    archives read so far are kept and the bundle itself is stored as `ParsedFile.Invalid`.
+
+    Files are read in a worker process, which may use at most `PARSE_CPU_LIMIT` seconds of CPU time and
+    `PARSE_MEMORY_LIMIT` megabytes of memory per file. Files that exceed these limits are stored as
+    `ParsedFile.LimitExceeded`, and so are archives that exceed the limits `PARSE_MAX_MEMBERS`,
+    `PARSE_MAX_ARCHIVE_SIZE`, `PARSE_MAX_COMPRESSION_RATIO` and `PARSE_MAX_XML_SIZE`; see `ArchiveLimits`. Such
+    files are parsed again if they're received again, e.g. after the limits were raised.
+
     Args:
-        files: A list of paths to potential MECA archives.
+        files: A list of paths to potential MECA archives or bundles of MECA archives.
         db: The database to store the results in.
+        isolate: If False, read the files in this process and without limits. Defaults to True.
+        sandbox: The sandbox to read the files in if `isolate` is True, e.g. to keep its worker process running
+            between calls. It's not closed by this function. Defaults to a new sandbox with the limits given above.
+        stage_timings: Records the time spent opening and hashing each archive (`archive_open`), reading its
+            metadata (`xml_triage`) and its complete content (`xml_parse`), and inserting the results into the
+            database (`db_insert`). Defaults to timings that are discarded.
 
     Returns:
         A list of parsed files, including their status.
     """
     # Parse each file and register it in the batch database
-    parsed_meca_archives = [
-        _parse_potential_meca_archive(potential_meca_archive, db)
-        for potential_meca_archive in sorted(files)
-    ]
-    db.insert_all(parsed_meca_archives)
+    timings = stage_timings or StageTimings()
+    parsed_meca_archives: List[ParsedFile] = []
+    parsed_meca_archives_by_sha256: Dict[str, ParsedFile] = {}
+    own_sandbox = isolate and sandbox is None
+    if own_sandbox:
+        sandbox = new_parse_sandbox()
+    elif not isolate:
+        sandbox = None
+    limits = ArchiveLimits(
+        max_members=PARSE_MAX_MEMBERS or None,
+        max_total_size=PARSE_MAX_ARCHIVE_SIZE * MEGABYTE or None,
+        max_compression_ratio=PARSE_MAX_COMPRESSION_RATIO or None,
+        max_xml_size=PARSE_MAX_XML_SIZE * MEGABYTE or None,
+    )
+    try:
+        for potential_meca_archive in sorted(files):
+            for parsed_meca_archive in _parse_potential_meca_archives(
+                potential_meca_archive,
+                db,
+                parsed_meca_archives_by_sha256,
+                sandbox,
+                limits,
+                timings,
+            ):
+                parsed_meca_archives.append(parsed_meca_archive)
+                if (
+                    parsed_meca_archive.sha256 is not None
+                    and parsed_meca_archive.status != ParsedFile.LimitExceeded
+                ):
+                    parsed_meca_archives_by_sha256.setdefault(
+                        parsed_meca_archive.sha256, parsed_meca_archive
+                    )
+    finally:
+        if own_sandbox and sandbox is not None:
+            sandbox.close()
+    with timings.stage("db_insert"):
+        db.insert_parsed_files(parsed_meca_archives)
 
     # Group the parsed files by their status
     return parsed_meca_archives
 
 
+def new_parse_sandbox() -> Sandbox:
+    """Create a sandbox with the limits `PARSE_CPU_LIMIT` and `PARSE_MEMORY_LIMIT` to parse files in."""
+    return Sandbox(
+        cpu_seconds=PARSE_CPU_LIMIT or None,
+        memory_bytes=PARSE_MEMORY_LIMIT * MEGABYTE or None,
+    )
+
+
+def _parse_potential_meca_archives(
+    path: str,
+    db: BatchDatabase,
+    parsed_meca_archives_by_sha256: Dict[str, ParsedFile],
+    sandbox: Optional[Sandbox],
+    limits: ArchiveLimits,
+    timings: StageTimings,
+) -> Iterator[ParsedFile]:
+    """Parse the given file, or each MECA archive in it if it's a bundle, see `parse()`."""
+    if not is_bundle(path):
+        with timings.stage("archive_open"):
+            received_at = _get_modification_time(path)
+            content_sha256 = _get_sha256(path)
+        yield _parse_potential_meca_archive(
+            path,
+            path,
+            received_at,
+            content_sha256,
+            db,
+            parsed_meca_archives_by_sha256,
+            sandbox,
+            limits,
+            timings,
+        )
+        return
+
+    try:
+        archives = read_bundle(path, max_size=limits.max_total_size)
+        while True:
+            # Reading and hashing the next archive in the bundle happens while iterating over the bundle.
+            with timings.stage("archive_open"):
+                archive = next(archives, None)
+            if archive is None:
+                break
+            if archive.content is None:
+                LOGGER.info('MECA archive "%s" is too large', archive.path)
+                yield ParsedFile(
+                    path=archive.path,
+                    received_at=archive.received_at,
+                    status=ParsedFile.LimitExceeded,
+                    parser_version=PARSER_VERSION,
+                )
+                continue
+            yield _parse_potential_meca_archive(
+                archive.path,
+                archive.content,
+                archive.received_at,
+                cast(str, archive.sha256),
+                db,
+                parsed_meca_archives_by_sha256,
+                sandbox,
+                limits,
+                timings,
+            )
+    except ValueError as e:
+        # The MECA archives that were read before the error are kept.
+        LOGGER.info('Invalid bundle "%s": %s', path, str(e))
+        yield ParsedFile(
+            path=path,
+            received_at=_get_modification_time(path),
+            status=ParsedFile.Invalid,
+            sha256=_get_sha256(path),
+            parser_version=PARSER_VERSION,
+        )
+
+
 def _parse_potential_meca_archive(
-    potential_meca_archive: str, db: BatchDatabase
+    potential_meca_archive: str,
+    content: Union[str, bytes],
+    received_at: datetime,
+    content_sha256: str,
+    db: BatchDatabase,
+    parsed_meca_archives_by_sha256: Dict[str, ParsedFile],
+    sandbox: Optional[Sandbox],
+    limits: ArchiveLimits,
+    timings: StageTimings,
 ) -> ParsedFile:
-    received_at = _get_modification_time(potential_meca_archive)
-    result = ParsedFile(path=potential_meca_archive, received_at=received_at)
+    """
+    Parse the MECA archive with the given path, reading it from `content`, which is either a path or the content of
+    the archive.
+    """
+    result = ParsedFile(
+        path=potential_meca_archive,
+        received_at=received_at,
+        sha256=content_sha256,
+        parser_version=PARSER_VERSION,
+    )
+
+    # Files with the same content as an earlier file are classified like that file, without parsing them again.
+    earlier_result = parsed_meca_archives_by_sha256.get(content_sha256)
+    status_and_doi = (
+        (earlier_result.status, earlier_result.doi)
+        if earlier_result is not None
+        else db.fetch_parse_result_with_sha256(content_sha256, PARSER_VERSION)
+    )
+    if status_and_doi is not None:
+        LOGGER.info('Content of "%s" was parsed before', potential_meca_archive)
+        status, result.doi = status_and_doi
+        if status in [ParsedFile.Invalid, ParsedFile.NoReviews]:
+            result.status = status
+        else:
+            result.status = ParsedFile.Duplicate
+        return result
 
     try:
-        result.manuscript = parse_meca_archive(potential_meca_archive)
+        # Reading the complete archive is only worth it for files that may be deposited, see `parse()`.
+        with timings.stage("xml_triage"):
+            triage = _run(sandbox, _triage_meca_archive, content, limits)
+        result.doi = triage.preprint_doi
+        if result.doi and not triage.has_reviews:
+            result.status = ParsedFile.NoReviews
+            return result
+        if result.doi and db.has_parsed_file_with_doi(result.doi):
+            result.status = ParsedFile.Duplicate
+            return result
+
+        with timings.stage("xml_parse"):
+            result.manuscript = _run(sandbox, _parse_meca_archive, content, limits)
+    except (LimitExceeded, ArchiveLimitExceeded) as e:
+        LOGGER.warning(
+            'Parsing "%s" exceeded a limit: %s', potential_meca_archive, str(e)
+        )
+        result.doi = None
+        result.status = ParsedFile.LimitExceeded
+        return result
     except ValueError as e:
         LOGGER.info('Invalid MECA archive "%s": %s', potential_meca_archive, str(e))
+        result.doi = None
         result.status = ParsedFile.Invalid
         return result
 
-    result.doi = result.manuscript.preprint_doi
     if not result.doi:
         result.status = ParsedFile.NoDoi
     elif not result.manuscript.review_process:
         result.status = ParsedFile.NoReviews
     else:
-        parsed_files_with_same_doi = db.fetch_parsed_files_with_doi(result.doi)
-        is_duplicate = len(parsed_files_with_same_doi) > 0
-        result.status = ParsedFile.Duplicate if is_duplicate else ParsedFile.Valid
+        result.status = ParsedFile.Valid
 
     return result
 
 
+def _triage_meca_archive(
+    content: Union[str, bytes], limits: ArchiveLimits
+) -> ManuscriptTriage:
+    return parse_meca_archive(content, level="triage", limits=limits)
+
+
+def _parse_meca_archive(
+    content: Union[str, bytes], limits: ArchiveLimits
+) -> Manuscript:
+    return parse_meca_archive(content, limits=limits)
+
+
+def _run(
+    sandbox: Optional[Sandbox],
+    function: Callable[[Union[str, bytes], ArchiveLimits], T],
+    content: Union[str, bytes],
+    limits: ArchiveLimits,
+) -> T:
+    """Call the given function in the sandbox, if there is one."""
+    if sandbox is None:
+        return function(content, limits)
+    return sandbox.run(function, content, limits)
+
+
+def _get_sha256(file_path: str) -> str:
+    """
+    Compute the SHA-256 hash of the given file without reading it into memory at once.
+
+    The hash of a directory covers the relative paths and the content of all files in it.
+    """
+    file_hash = sha256()
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    if Path(file_path).is_dir():
+        directory = Path(file_path)
+        paths = sorted(path for path in directory.rglob("*") if path.is_file())
+        for path in paths:
+            name = path.relative_to(directory).as_posix().encode()
+            file_hash.update(name + b"\0" + path.stat().st_size.to_bytes(8, "big"))
+            _update_hash(file_hash, path, view)
+    else:
+        _update_hash(file_hash, Path(file_path), view)
+    return file_hash.hexdigest()
+
+
+def _update_hash(file_hash: Any, path: Path, buffer: memoryview) -> None:
+    with open(path, "rb", buffering=0) as file:
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                break
+            file_hash.update(buffer[:size])
+
+
 def _get_modification_time(file_path: str) -> datetime:
     file = Path(file_path)
     mod_timestamp = file.stat().st_mtime
@@ -92,7 +373,10 @@ def _get_modification_time(file_path: str) -> datetime:
 
 
 def deposit(
-    mecas: List[ParsedFile], db: BatchDatabase, dry_run: bool = True
+    mecas: List[ParsedFile],
+    db: BatchDatabase,
+    dry_run: bool = True,
+    stage_timings: Optional[StageTimings] = None,
 ) -> Tuple[List[DepositionAttempt], List[Article]]:
     """
     Generate deposition files from the given ParsedFiles, try to send the files to the Crossref API, and store the
@@ -111,6 +395,7 @@ def deposit(
     When an error occurs while sending the deposition file to the Crossref API, the DepositionAttempt is stored in the
     database with the status `DepositionAttempt.Failed`.
     In any other case, the DepositionAttempt is stored in the database with the status `DepositionAttempt.Succeeded`.
+    The review records of each MECA are updated with the DOIs and the status of its deposition attempt.
 
     By default, nothing is actually sent to the Crossref API or stored in the database and only a dry run is executed.
     Set the `dry_run` parameter to False to actually do the depositions.
@@ -120,6 +405,9 @@ def deposit(
         db: The database to store the results in.
         dry_run: If True, don't actually send deposition files to the Crossref API and don't store the results in the
             database. Defaults to True.
+        stage_timings: Records the time spent generating each deposition file (`xml_generation`), verifying it with
+            EEB (`eeb_verification`), sending it to Crossref (`crossref_post`), and storing the results in the
+            database (`db_commit`). Defaults to timings that are discarded.
 
     Returns:
         A tuple of a list of all deposition attempts and a list of articles that were successfully deposited.
@@ -140,19 +428,25 @@ def deposit(
             return get_random_doi()
         return get_free_doi(db, resource)
 
+    timings = stage_timings or StageTimings()
     deposition_attempts = []
     successfully_deposited_articles = []
+    generated_articles: Dict[int, Article] = {}
     for meca in mecas:
         deposition_attempt = DepositionAttempt(meca=meca, attempted_at=datetime.now())
         deposition_attempts.append(deposition_attempt)
 
         try:
-            article = from_meca_manuscript(
-                meca.manuscript,  # type: ignore[arg-type] # meca.manuscript is checked to be not None above
-                meca.received_at,
-                doi_generator,
-            )
-            deposition_attempt.deposition = generate_peer_review_deposition([article])
+            with timings.stage("xml_generation"):
+                article = from_meca_manuscript(
+                    meca.manuscript,  # type: ignore[arg-type] # meca.manuscript is checked to be not None above
+                    meca.received_at,
+                    doi_generator,
+                )
+                deposition_attempt.deposition = generate_peer_review_deposition(
+                    [article]
+                )
+            generated_articles[meca.id] = article  # type: ignore[index] # meca.id is checked to be not None above
         except Exception as e:
             LOGGER.warning(
                 'Failed to generate deposition file from "%s": %s', meca.path, str(e)
@@ -161,7 +455,8 @@ def deposit(
             continue
 
         try:
-            verification_result = verify(deposition_attempt.deposition)[0]
+            with timings.stage("eeb_verification"):
+                verification_result = verify(deposition_attempt.deposition)[0]
         except Exception as e:
             LOGGER.exception(e)
             LOGGER.error(deposition_attempt.deposition)
@@ -192,7 +487,8 @@ def deposit(
             continue
 
         try:
-            deposit_file(deposition_attempt.deposition)
+            with timings.stage("crossref_post"):
+                deposit_file(deposition_attempt.deposition)
             deposition_attempt.status = DepositionAttempt.Succeeded
         except Exception as e:
             LOGGER.warning(
@@ -206,7 +502,8 @@ def deposit(
             successfully_deposited_articles.append(article)
 
     if not dry_run:
-        db.insert_all(deposition_attempts)
+        with timings.stage("db_commit"):
+            db.insert_deposition_attempts(deposition_attempts, generated_articles)
 
     return (deposition_attempts, successfully_deposited_articles)
 
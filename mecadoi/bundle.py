@@ -0,0 +1,173 @@
+"""
+Read bundles: TAR or ZIP files that contain many MECA archives.
+
+A bundle is read from start to end once. The MECA archives in it are not extracted to disk: small ones are read into
+memory, larger ones are copied to a temporary file that is deleted before the next one is read. The temporary space
+used is thus bounded by the size of the largest MECA archive in the bundle, not by the size of the bundle.
+
+MECA archives in a bundle are identified by paths of the form `<path of bundle>!/<name in bundle>`.
+"""
+
+__all__ = [
+    "BUNDLE_SEPARATOR",
+    "BundledArchive",
+    "get_bundle_path",
+    "is_bundle",
+    "read_bundle",
+]
+
+from dataclasses import dataclass
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from tarfile import is_tarfile, open as open_tar, TarError
+from tempfile import NamedTemporaryFile
+from typing import IO, Iterator, Optional, Union
+from zipfile import BadZipFile, is_zipfile, ZipFile
+from zlib import error as ZlibError
+
+BUNDLE_SEPARATOR = "!/"
+
+MAX_IN_MEMORY_SIZE = 64 * 1024 * 1024
+"""MECA archives in a bundle that are larger than this many bytes are copied to a temporary file instead of memory."""
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class BundledArchive:
+    """A MECA archive in a bundle."""
+
+    path: str
+    """The path of the bundle and the name of the archive in it, separated by `BUNDLE_SEPARATOR`."""
+
+    content: Optional[Union[bytes, str]]
+    """
+    The content of the archive, or the path of a temporary file with the content of large archives. None if the
+    archive is larger than the maximum size given to `read_bundle()`.
+    """
+
+    received_at: datetime
+    """The modification time of the archive as recorded in the bundle."""
+
+    sha256: Optional[str]
+    """The SHA-256 hash of the content of the archive, or None if `content` is None."""
+
+
+def is_bundle(path: str) -> bool:
+    """Whether the given file is a TAR file, or a ZIP file that contains ZIP files but is not a MECA archive itself."""
+    if Path(path).is_dir():
+        return False
+    # TAR files are checked first, as a TAR file that ends with a ZIP file looks like a ZIP file itself.
+    if is_tarfile(path):
+        return True
+    if is_zipfile(path):
+        try:
+            with ZipFile(path) as bundle:
+                names = bundle.namelist()
+        except BadZipFile:
+            return False
+        return "manifest.xml" not in names and any(map(_is_meca_archive, names))
+    return False
+
+
+def get_bundle_path(path: str) -> str:
+    """Return the path of the bundle that contains the MECA archive with the given path, or the path itself."""
+    return path.split(BUNDLE_SEPARATOR, 1)[0]
+
+
+def read_bundle(path: str, max_size: Optional[int] = None) -> Iterator[BundledArchive]:
+    """
+    Yield the MECA archives in the given bundle, i.e. all files whose names end in ".zip", in the order in which they
+    are stored in the bundle.
+
+    The temporary file of a yielded archive is deleted when the next one is requested, so its content must be processed
+    before that. Archives larger than `max_size` bytes are yielded without their content.
+
+    Raises a ValueError if the bundle can't be read.
+    """
+    try:
+        if is_tarfile(path):
+            yield from _read_tar_bundle(path, max_size)
+        else:
+            yield from _read_zip_bundle(path, max_size)
+    except (TarError, BadZipFile, ZlibError, EOFError) as e:
+        raise ValueError(f'Bad bundle "{path}": {e}')
+
+
+def _read_zip_bundle(path: str, max_size: Optional[int]) -> Iterator[BundledArchive]:
+    with ZipFile(path) as bundle:
+        for info in bundle.infolist():
+            if info.is_dir() or not _is_meca_archive(info.filename):
+                continue
+            received_at = datetime(*info.date_time)
+            with bundle.open(info) as file:
+                yield from _read_archive(
+                    path, info.filename, file, info.file_size, received_at, max_size
+                )
+
+
+def _read_tar_bundle(path: str, max_size: Optional[int]) -> Iterator[BundledArchive]:
+    # In stream mode, the bundle is read sequentially, which also works well for compressed TAR files.
+    with open_tar(path, "r|*") as bundle:
+        for info in bundle:
+            if not info.isfile() or not _is_meca_archive(info.name):
+                continue
+            received_at = datetime.fromtimestamp(info.mtime)
+            file = bundle.extractfile(info)
+            assert file is not None  # it's a regular file
+            yield from _read_archive(
+                path, info.name, file, info.size, received_at, max_size
+            )
+
+
+def _read_archive(
+    bundle_path: str,
+    name: str,
+    file: IO[bytes],
+    size: int,
+    received_at: datetime,
+    max_size: Optional[int],
+) -> Iterator[BundledArchive]:
+    path = f"{bundle_path}{BUNDLE_SEPARATOR}{name}"
+    if max_size is not None and size > max_size:
+        yield BundledArchive(
+            path=path, content=None, received_at=received_at, sha256=None
+        )
+        return
+
+    if size <= MAX_IN_MEMORY_SIZE:
+        content = file.read()
+        yield BundledArchive(
+            path=path,
+            content=content,
+            received_at=received_at,
+            sha256=sha256(content).hexdigest(),
+        )
+        return
+
+    with NamedTemporaryFile(suffix=".zip") as temporary_file:
+        content_sha256 = _copy(file, temporary_file)
+        temporary_file.flush()
+        yield BundledArchive(
+            path=path,
+            content=temporary_file.name,
+            received_at=received_at,
+            sha256=content_sha256,
+        )
+
+
+def _copy(source: IO[bytes], target: IO[bytes]) -> str:
+    """Copy the content of `source` to `target` and return its SHA-256 hash."""
+    content_hash = sha256()
+    while True:
+        chunk = source.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            break
+        content_hash.update(chunk)
+        target.write(chunk)
+    return content_hash.hexdigest()
+
+
+def _is_meca_archive(name: str) -> bool:
+    return name.lower().endswith(".zip")
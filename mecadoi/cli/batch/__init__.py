@@ -1,5 +1,5 @@
 import click
-from .commands import deposit, ls, parse, prune
+from .commands import deposit, ls, parse, prune, stats, watch
 
 
 @click.group()
@@ -17,3 +17,5 @@ batch.add_command(deposit)
 batch.add_command(ls)
 batch.add_command(parse)
 batch.add_command(prune)
+batch.add_command(stats)
+batch.add_command(watch)
@@ -1,21 +1,112 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
+from random import randrange
 from dateutil import parser
 from dataclasses import asdict
+from json import dumps as json_dumps
 from logging import getLogger
-from os import mkdir, remove, walk
-from os.path import join
-from shutil import move
-from typing import Any, Dict, List, Optional
+from os import mkdir, remove
+from shutil import rmtree
+from signal import SIGTERM, signal
+from time import perf_counter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from uuid import uuid4
 import click
 from yaml import dump
-from mecadoi.batch import deposit as batch_deposit, parse as batch_parse
-from mecadoi.config import DB_URL
-from mecadoi.db import BatchDatabase, DepositionAttempt, ParsedFile
+from mecadoi import config
+from mecadoi.batch import (
+    deposit as batch_deposit,
+    new_parse_sandbox,
+    parse as batch_parse,
+)
+from mecadoi.bundle import get_bundle_path
+from mecadoi.config import (
+    DB_URL,
+    DEPOSIT_LEASE_SECONDS,
+    PARSE_LEASE_SECONDS,
+    PARSE_MAX_WAIT,
+    PARSE_MIN_AGE,
+    SLOW_QUERY_THRESHOLD,
+)
+from mecadoi.db import (
+    BatchDatabase,
+    BatchRun,
+    DepositionAttempt,
+    ParsedFile,
+    ParsedFileSummary,
+    ReviewRecord,
+)
+from mecadoi.dois import DOIS_PER_YEAR, has_year
+from mecadoi.inbox import Inbox
+from mecadoi.timings import StageTimings
+from mecadoi.watch import get_snapshots, Watcher
+
+try:
+    from orjson import dumps
+
+    orjson_dumps: Any = dumps
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson_dumps = None
 
 LOGGER = getLogger(__name__)
 
+Command = TypeVar("Command", bound=Callable[..., Any])
+
+
+def timings_option(command: Command) -> Command:
+    return click.option(
+        "--timings/--no-timings",
+        default=False,
+        help=(
+            "Add the number of calls and the time spent in database methods, and the number of slow SQL "
+            "statements to the output, and for `parse` and `deposit` the duration of the run and of its stages. "
+            "DEFAULT: `--no-timings`"
+        ),
+    )(command)
+
+
+YAML = "yaml"
+JSONL = "jsonl"
+
+
+def format_option(command: Command) -> Command:
+    return click.option(
+        "--format",
+        "output_format",
+        type=click.Choice([YAML, JSONL]),
+        default=YAML,
+        help=(
+            "Print the result as a single YAML document, or as JSON Lines with one record per file, which are printed "
+            "as soon as they are available, followed by a record with information about the command invocation. "
+            "DEFAULT: `yaml`"
+        ),
+    )(command)
+
+
+def open_batch_db() -> BatchDatabase:
+    return BatchDatabase(DB_URL, slow_query_threshold=SLOW_QUERY_THRESHOLD)
+
+
+def add_timings(
+    result: Dict[str, Any], batch_db: BatchDatabase, started_at: float
+) -> None:
+    result["timings"] = {
+        "total_seconds": round(perf_counter() - started_at, 4),
+        **batch_db.timings.summary(),
+    }
+
 
 @click.command()
 @click.argument(
@@ -29,72 +120,335 @@ LOGGER = getLogger(__name__)
     type=click.Path(exists=True, file_okay=False, dir_okay=True, writable=True),
     help="The directory to which processed files will be archived. Must be an existing directory.",
 )
-def parse(input_dir: str, output_dir: str) -> None:
+@click.option(
+    "--claim-size",
+    default=100,
+    help=(
+        "Claim and parse this many files at a time, so that concurrently running workers share the files in "
+        "`INPUT_DIR`, or claim all files at once if it's 0. DEFAULT: 100"
+    ),
+)
+@format_option
+@timings_option
+def parse(
+    input_dir: str,
+    output_dir: str,
+    claim_size: int = 100,
+    output_format: str = YAML,
+    timings: bool = False,
+) -> None:
     """
     Import files into the MECADOI database.
 
-    The command archives all files in `INPUT_DIR` to a new folder in `--output-dir`, tries to parse
+    The command moves the files in `INPUT_DIR` to a new folder in `--output-dir`, tries to parse
     them as MECA archives, and registers them in the MECADOI database.
 
     The processed files are moved to a subfolder named `parsed/<id>/` within `--output-dir`, where
     <id> is the unique ID generated for this command invocation.
 
+    Directories that contain a manifest.xml file are parsed as extracted MECA archives, and TAR or
+    ZIP files that contain MECA archives are parsed as bundles of MECA archives.
+
+    Several `parse` or `watch` commands, also on different machines, can process the same
+    `INPUT_DIR` at the same time. Each file is claimed by exactly one of them, which records a lease
+    on the file in the MECADOI database and renames it to its `parsed/<id>/` folder. If a command
+    crashes, the files it has claimed but not registered are returned to `INPUT_DIR` once their
+    lease expires, see the `PARSE_LEASE_SECONDS` setting. Files that are added to `INPUT_DIR` while
+    the command runs are left for the next one.
+
+    Files that are still being written are left for the next run as well: files modified less than
+    `PARSE_MIN_AGE` seconds ago, files with temporary names such as WinSCP's `<name>.filepart`, and
+    ZIP or TAR files that lack their end, e.g. the central directory of a ZIP file. Hidden files,
+    such as rsync's temporary `.<name>.<suffix>` files or `.DS_Store`, are always left.
+
     The ID of this command invocation and a list of all processed files is printed to stdout. The
     files are grouped by their status:
 
     \b
     - `invalid` for files that are not MECA archives (e.g. non-ZIP files)
+    - `limit_exceeded` for files that took too much CPU time or memory to parse, or that exceed the
+      archive limits (see `PARSE_MAX_MEMBERS` etc.); they are parsed again if they're received again
     - `no_reviews` for MECA archives that contain no reviews or author replies
     - `no_preprint_doi` for MECA archives that contain no preprint DOI (required for DOI creation)
+    - `duplicate` for MECA archives with the preprint DOI of a file parsed before
     - `ready_for_deposition` for MECA archives where review and author reply DOIs can be created
+
+    With `--format jsonl`, the files are printed with their status as soon as their chunk has been
+    parsed.
+
+    The duration of the run and of its stages, `discovery`, `claim`, `archive_open`, `xml_triage`,
+    `xml_parse` and `db_insert`, is recorded in the MECADOI database for runs that parse any files.
+
+    With `--timings`, the output also contains these durations, the number of files parsed per
+    second, and the time spent in the MECADOI database.
     """
+    started_at = perf_counter()
+    stage_timings = StageTimings()
     LOGGER.debug('parse("%s", "%s")', input_dir, output_dir)
 
-    # move the input files to the output directory
     id_batch_run = str(uuid4())
-    output_dir = f"{output_dir}/parsed/{id_batch_run}/"
-
-    move(input_dir, output_dir)
-    mkdir(input_dir)
-
-    # find all files in the output directory: these are the potential MECA archives. Usually they're .zip files,
-    # but let's just find everything in case they're not.
-    input_files = [
-        join(dirpath, filename)
-        for dirpath, _, filenames in walk(output_dir)
-        for filename in filenames
-    ]
-    LOGGER.debug("input_files=%s", input_files)
-
-    # parse and register the input files
-    parsed_files = batch_parse(input_files, BatchDatabase(DB_URL))
+    batch_output_dir = f"{output_dir}/parsed/{id_batch_run}/"
+    batch_db = open_batch_db()
+    inbox = open_inbox(input_dir, batch_db, min_age=PARSE_MIN_AGE)
+
+    # find all files in the input directory: these are the potential MECA archives. Usually they're .zip files,
+    # but let's just find everything in case they're not. Directories with a manifest are extracted MECA archives.
+    # Files that are still being written are left for the next run.
+    with stage_timings.stage("discovery"):
+        inbox.recover_expired_leases()
+        candidates = inbox.discover()
+    LOGGER.debug("candidates=%s", candidates)
+    # Concurrent workers start at different files, so that they rarely compete for the same ones.
+    offset = randrange(len(candidates)) if candidates else 0
+    candidates = candidates[offset:] + candidates[:offset]
+
+    # claim, parse and register the input files, a chunk at a time
+    chunk_size = claim_size or len(candidates) or 1
+    parsed_files = []
+    for start in range(0, len(candidates), chunk_size):
+        end = start + chunk_size
+        with stage_timings.stage("claim"):
+            leases = inbox.claim(candidates[start:end], batch_output_dir)
+        parsed = False
+        try:
+            parsed_chunk = batch_parse(
+                [lease.staged_path for lease in leases],
+                batch_db,
+                stage_timings=stage_timings,
+            )
+            parsed = True
+        finally:
+            # If parsing failed, the files that were not registered are parsed again by the next run.
+            inbox.release(leases, return_unregistered=not parsed)
+        parsed_files.extend(parsed_chunk)
+        if output_format == JSONL:
+            echo_records(map(get_parsed_file_record, parsed_chunk))
     LOGGER.debug("parsed_files=%s", parsed_files)
 
-    result = group_parsed_files_by_status(parsed_files)
+    result = group_parsed_files_by_status(parsed_files) if output_format == YAML else {}
     result["id"] = id_batch_run
-    click.echo(output(result), nl=False)
+    run = record_batch_run(
+        batch_db, id_batch_run, BatchRun.Parse, len(parsed_files), stage_timings
+    )
+    if timings:
+        result["run"] = run
+        add_timings(result, batch_db, started_at)
+    echo_result(result, output_format)
 
     LOGGER.info(
         'Parsed and moved %s files from "%s" to "%s"',
-        len(input_files),
+        len(parsed_files),
         input_dir,
-        output_dir,
+        batch_output_dir,
+    )
+
+
+def record_batch_run(
+    batch_db: BatchDatabase,
+    id_batch_run: str,
+    command: str,
+    files: int,
+    stage_timings: StageTimings,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Record the duration of the batch run and of its stages in the database, unless it's a dry run or no files were
+    processed, and return them for the output.
+    """
+    seconds = stage_timings.seconds()
+    stages = stage_timings.summary()
+    if files and not dry_run:
+        batch_db.insert_all(
+            [
+                BatchRun(
+                    id=id_batch_run,
+                    command=command,
+                    started_at=datetime.now() - timedelta(seconds=seconds),
+                    seconds=round(seconds, 4),
+                    files=files,
+                    stages=stages,
+                )
+            ]
+        )
+    return {
+        "files": files,
+        "seconds": round(seconds, 4),
+        "files_per_second": round(files / seconds, 2) if seconds else 0.0,
+        "stages": stages,
+    }
+
+
+def open_inbox(input_dir: str, batch_db: BatchDatabase, min_age: float) -> Inbox:
+    return Inbox(
+        input_dir,
+        batch_db,
+        lease_seconds=PARSE_LEASE_SECONDS,
+        min_age=min_age,
+        max_wait=PARSE_MAX_WAIT,
+    )
+
+
+@click.command()
+@click.argument(
+    "input-dir",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True),
+)
+@click.option(
+    "-o",
+    "--output-dir",
+    required=True,
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, writable=True),
+    help="The directory to which processed files will be archived. Must be an existing directory.",
+)
+@click.option(
+    "--stable-seconds",
+    default=10.0,
+    help="Parse files once their size and modification time have not changed for this many seconds. DEFAULT: 10",
+)
+@click.option(
+    "--poll-interval",
+    default=5.0,
+    help="Scan `INPUT_DIR` at least every this many seconds. DEFAULT: 5",
+)
+@click.option(
+    "--deposit-interval",
+    default=0.0,
+    help="Deposit DOIs every this many seconds, or never if it's 0. DEFAULT: 0",
+)
+@click.option(
+    "--deposit-delay",
+    default=0,
+    help="Only deposit DOIs for MECA archives received at least this many days ago. DEFAULT: 0",
+)
+@click.option(
+    "--dry-run/--no-dry-run",
+    default=True,
+    help="Only show what would happen / actually deposit DOIs. DEFAULT: `--dry-run`",
+)
+@format_option
+def watch(
+    input_dir: str,
+    output_dir: str,
+    stable_seconds: float = 10,
+    poll_interval: float = 5,
+    deposit_interval: float = 0,
+    deposit_delay: int = 0,
+    dry_run: bool = True,
+    output_format: str = YAML,
+) -> None:
+    """
+    Parse MECA archives as soon as they arrive in `INPUT_DIR`, and deposit DOIs regularly.
+
+    This command runs until it's interrupted or terminated. It keeps a single process with its
+    database connection, worker process for parsing, and HTTP connections running, instead of
+    starting a new process for every `parse` and `deposit` command.
+
+    Files and extracted MECA archives in `INPUT_DIR` are moved and parsed like in the `parse`
+    command as soon as they are completely written, i.e. when their size and modification time have
+    not changed for `--stable-seconds`, and unless they have temporary names or lack their end.
+    Changes are detected within a second if the `watchdog` package is installed; otherwise
+    `INPUT_DIR` is scanned every `--poll-interval` seconds.
+
+    With `--deposit-interval`, DOIs are deposited like in the `deposit` command right away and then
+    at that interval.
+
+    The results of every parse and deposit are printed to stdout as separate YAML documents, or,
+    with `--format jsonl`, as JSON Lines like in the `parse` and `deposit` commands.
+
+    NOTE: By default, this command will *not* create any DOIs. Pass the `--no-dry-run` option to
+    actually execute the irreversible deposition and update the database.
+    """
+    batch_db = open_batch_db()
+    sandbox = new_parse_sandbox()
+
+    # The watcher only passes on files whose size and modification time have been stable.
+    inbox = open_inbox(input_dir, batch_db, min_age=0)
+
+    def ingest(paths: List[str]) -> None:
+        stage_timings = StageTimings()
+        id_batch_run = str(uuid4())
+        with stage_timings.stage("claim"):
+            inbox.recover_expired_leases()
+            complete_paths = inbox.select_complete(get_snapshots(paths))
+            leases = inbox.claim(complete_paths, f"{output_dir}/parsed/{id_batch_run}")
+        if not leases:
+            return
+
+        parsed = False
+        try:
+            parsed_files = batch_parse(
+                [lease.staged_path for lease in leases],
+                batch_db,
+                sandbox=sandbox,
+                stage_timings=stage_timings,
+            )
+            parsed = True
+        finally:
+            # If parsing failed, the files that were not registered are parsed again by the next cycle.
+            inbox.release(leases, return_unregistered=not parsed)
+        record_batch_run(
+            batch_db, id_batch_run, BatchRun.Parse, len(parsed_files), stage_timings
+        )
+        if output_format == JSONL:
+            echo_records(map(get_parsed_file_record, parsed_files))
+            echo_result({"id": id_batch_run}, output_format)
+            return
+        result = group_parsed_files_by_status(parsed_files)
+        result["id"] = id_batch_run
+        click.echo(f"---\n{output(result)}", nl=False)
+
+    def deposit() -> None:
+        deposition_attempts, result = deposit_files(
+            batch_db,
+            output_dir,
+            dry_run=dry_run,
+            retry_failed=False,
+            after=datetime(1, 1, 1),
+            before=datetime.now() - timedelta(days=deposit_delay),
+        )
+        if output_format == JSONL:
+            echo_records(map(get_deposition_attempt_record, deposition_attempts))
+            echo_result({key: result[key] for key in ["id", "dry_run"]}, output_format)
+            return
+        click.echo(f"---\n{output(result)}", nl=False)
+
+    watcher = Watcher(
+        input_dir,
+        ingest,
+        stable_seconds=stable_seconds,
+        poll_interval=poll_interval,
+        deposit=deposit,
+        deposit_interval=deposit_interval,
     )
+    previous_handler = signal(SIGTERM, lambda signum, frame: watcher.stop())
+    LOGGER.info('Watching "%s"', input_dir)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal(SIGTERM, previous_handler)
+        sandbox.close()
+    LOGGER.info('Stopped watching "%s"', input_dir)
+
 
+GROUPS_BY_STATUS: Dict[Optional[int], str] = {
+    ParsedFile.Invalid: "invalid",
+    ParsedFile.LimitExceeded: "limit_exceeded",
+    ParsedFile.NoReviews: "no_reviews",
+    ParsedFile.NoDoi: "no_preprint_doi",
+    ParsedFile.Duplicate: "duplicate",
+    ParsedFile.Valid: "ready_for_deposition",
+}
 
-def group_parsed_files_by_status(meca_archives: List[ParsedFile]) -> Dict[str, Any]:
+
+def group_parsed_files_by_status(
+    meca_archives: Iterable[Union[ParsedFile, ParsedFileSummary]],
+) -> Dict[str, Any]:
     result: Dict[str, Any] = {}
 
     for meca_archive in meca_archives:
-        resulting_list = None
-        if meca_archive.manuscript is None:
-            resulting_list = result.setdefault("invalid", [])
-        elif not meca_archive.manuscript.review_process:
-            resulting_list = result.setdefault("no_reviews", [])
-        elif not meca_archive.manuscript.preprint_doi:
-            resulting_list = result.setdefault("no_preprint_doi", [])
-        else:
-            resulting_list = result.setdefault("ready_for_deposition", [])
+        resulting_list = result.setdefault(GROUPS_BY_STATUS[meca_archive.status], [])
         resulting_list.append(get_name(meca_archive))
 
     return result
@@ -131,12 +485,16 @@ def group_parsed_files_by_status(meca_archives: List[ParsedFile]) -> Dict[str, A
     "--before",
     help="Only attempt to deposit DOIs for MECA archives that were received before this date. Example: 2022-10-01",
 )
+@format_option
+@timings_option
 def deposit(
     output_dir: str,
     dry_run: bool = True,
     retry_failed: bool = False,
     after: Optional[str] = None,
     before: Optional[str] = None,
+    output_format: str = YAML,
+    timings: bool = False,
 ) -> None:
     """
     Create DOIs for MECA archives in the MECADOI database.
@@ -172,28 +530,75 @@ def deposit(
 
     NOTE: By default, this command will *not* create any DOIs or update the MECADOI database. Pass
     the `--no-dry-run` option to actually execute the irreversible deposition and update the database.
+
+    The duration of the run and of its stages, `xml_generation`, `eeb_verification`,
+    `crossref_post` and `db_commit`, is recorded in the MECADOI database unless it's a dry run.
+
+    With `--timings`, the output also contains these durations and the time spent in the MECADOI
+    database. The rest of the total time is mostly spent generating depositions and communicating
+    with EEB and Crossref.
     """
-    batch_db = BatchDatabase(DB_URL)
+    started_at = perf_counter()
+    batch_db = open_batch_db()
     after_as_datetime = parser.parse(after) if after is not None else datetime(1, 1, 1)
     before_as_datetime = parser.parse(before) if before is not None else datetime.now()
 
-    files_to_deposit = (
-        batch_db.get_files_to_retry_deposition(
-            after=after_as_datetime, before=before_as_datetime
-        )
-        if retry_failed
-        else batch_db.get_files_ready_for_deposition(
-            after=after_as_datetime, before=before_as_datetime
-        )
-    )
-    deposition_attempts, successfully_deposited_articles = batch_deposit(
-        files_to_deposit, batch_db, dry_run=dry_run
+    deposition_attempts, result = deposit_files(
+        batch_db,
+        output_dir,
+        dry_run=dry_run,
+        retry_failed=retry_failed,
+        after=after_as_datetime,
+        before=before_as_datetime,
+        timings=timings,
     )
+    if output_format == JSONL:
+        echo_records(map(get_deposition_attempt_record, deposition_attempts))
+        result = {key: result[key] for key in ["id", "dry_run", "run"] if key in result}
+    if timings:
+        add_timings(result, batch_db, started_at)
+    echo_result(result, output_format)
+
+
+def deposit_files(
+    batch_db: BatchDatabase,
+    output_dir: str,
+    dry_run: bool,
+    retry_failed: bool,
+    after: datetime,
+    before: datetime,
+    timings: bool = False,
+) -> Tuple[List[DepositionAttempt], Dict[str, Any]]:
+    """
+    Deposit the parsed files that are due, see `deposit`, and return the deposition attempts and the result. With
+    `timings`, the result contains the duration of the run and of its stages.
+    """
+    stage_timings = StageTimings()
+    # Claiming the files keeps concurrently running deposit commands from depositing the same file twice.
+    with batch_db.claim_files_for_deposition(
+        after=after,
+        before=before,
+        retry_failed=retry_failed,
+        lease_seconds=DEPOSIT_LEASE_SECONDS,
+    ) as files_to_deposit:
+        deposition_attempts, successfully_deposited_articles = batch_deposit(
+            files_to_deposit, batch_db, dry_run=dry_run, stage_timings=stage_timings
+        )
 
     result = group_deposition_attempts_by_status(deposition_attempts, dry_run=dry_run)
     id_batch_run = str(uuid4())
     result["id"] = id_batch_run
     result["dry_run"] = dry_run
+    run = record_batch_run(
+        batch_db,
+        id_batch_run,
+        BatchRun.Deposit,
+        len(deposition_attempts),
+        stage_timings,
+        dry_run=dry_run,
+    )
+    if timings:
+        result["run"] = run
 
     if successfully_deposited_articles:
         deposition_output_dir = f"{output_dir}/deposited"
@@ -204,7 +609,7 @@ def deposit(
         with open(f"{deposition_output_dir}/{id_batch_run}.yml", "w") as f:
             dump([asdict(article) for article in successfully_deposited_articles], f)
 
-    click.echo(output(result), nl=False)
+    return deposition_attempts, result
 
 
 def group_deposition_attempts_by_status(
@@ -213,25 +618,56 @@ def group_deposition_attempts_by_status(
     result: Dict[str, Any] = {}
 
     for deposition_attempt in deposition_attempts:
-        resulting_list = None
-        if deposition_attempt.status == DepositionAttempt.GenerationFailed:
-            resulting_list = result.setdefault("deposition_generation_failed", [])
-        elif deposition_attempt.status == DepositionAttempt.DoisAlreadyPresent:
-            resulting_list = result.setdefault("dois_already_present", [])
-        elif deposition_attempt.status == DepositionAttempt.VerificationFailed:
-            resulting_list = result.setdefault("deposition_verification_failed", [])
-        elif deposition_attempt.status == DepositionAttempt.Succeeded:
-            resulting_list = result.setdefault("deposition_succeeded", [])
-        elif deposition_attempt.status == DepositionAttempt.Failed:
-            resulting_list = result.setdefault("deposition_failed", [])
-        else:
-            resulting_list = result.setdefault("other", [])
+        resulting_list = result.setdefault(
+            get_deposition_status_name(deposition_attempt.status), []
+        )
         resulting_list.append(get_name(deposition_attempt.meca))
 
     return result
 
 
-def get_name(parsed_file: ParsedFile) -> Any:
+def get_deposition_status_name(status: Optional[int]) -> str:
+    if status == DepositionAttempt.GenerationFailed:
+        return "deposition_generation_failed"
+    if status == DepositionAttempt.DoisAlreadyPresent:
+        return "dois_already_present"
+    if status == DepositionAttempt.VerificationFailed:
+        return "deposition_verification_failed"
+    if status == DepositionAttempt.Succeeded:
+        return "deposition_succeeded"
+    if status == DepositionAttempt.Failed:
+        return "deposition_failed"
+    return "other"
+
+
+def group_review_records_by_status(
+    review_records: Iterable[ReviewRecord],
+) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+
+    for review_record in review_records:
+        status_name = (
+            "pending"
+            if review_record.status is None
+            else get_deposition_status_name(review_record.status)
+        )
+        resulting_list = result.setdefault(status_name, [])
+        resulting_list.append(get_review_name(review_record))
+
+    return result
+
+
+def get_review_name(review_record: ReviewRecord) -> str:
+    name = (
+        f"{review_record.preprint_doi} - {review_record.revision_id}"
+        f" - {review_record.running_number or 'author reply'}"
+    )
+    if review_record.doi:
+        return f"{name}|{review_record.doi}"
+    return name
+
+
+def get_name(parsed_file: Union[ParsedFile, ParsedFileSummary]) -> Any:
     if parsed_file.doi:
         return f"{parsed_file.path}|{parsed_file.doi}"
     return parsed_file.path
@@ -240,19 +676,175 @@ def get_name(parsed_file: ParsedFile) -> Any:
 @click.command(hidden=True)
 @click.option("-a", "--after")
 @click.option("-b", "--before")
-def ls(after: Optional[str] = None, before: Optional[str] = None) -> None:
+@click.option(
+    "--reviews/--files",
+    default=False,
+    help="List the reviews and author replies in the files / the files themselves. DEFAULT: `--files`",
+)
+@click.option(
+    "--summary/--no-summary",
+    default=False,
+    help="Only count the files or reviews per status / list them. DEFAULT: `--no-summary`",
+)
+@format_option
+@timings_option
+def ls(
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    reviews: bool = False,
+    summary: bool = False,
+    output_format: str = YAML,
+    timings: bool = False,
+) -> None:
     """
     List files in the batch database.
+
+    With `--reviews`, list every review and author reply in these files instead, grouped by the
+    status of its latest deposition attempt. Reviews without deposition attempt are `pending`.
+
+    With `--summary`, only the number of files or reviews per status is printed, which the database
+    counts without reading them.
+
+    With `--format jsonl`, each file or review is printed as soon as it's read from the database.
     """
-    batch_db = BatchDatabase(DB_URL)
+    started_at = perf_counter()
+    batch_db = open_batch_db()
     after_as_datetime = parser.parse(after) if after is not None else datetime(1, 1, 1)
     before_as_datetime = parser.parse(before) if before is not None else datetime.now()
-    parsed_files = batch_db.fetch_parsed_files_between(
-        after_as_datetime, before_as_datetime
+    if summary:
+        counts = (
+            batch_db.count_review_records_by_status(
+                after_as_datetime, before_as_datetime
+            )
+            if reviews
+            else batch_db.count_parsed_files_by_status(
+                after_as_datetime, before_as_datetime
+            )
+        )
+        counts_by_name = count_by_name(
+            counts, get_review_status_name if reviews else get_file_status_name
+        )
+        if output_format == JSONL:
+            echo_records(
+                {"status": name, "count": count}
+                for name, count in sorted(counts_by_name.items())
+            )
+            result_as_dict: Dict[str, Any] = {}
+        else:
+            result_as_dict = dict(counts_by_name)
+    elif reviews:
+        review_records = batch_db.stream_review_records_between(
+            after_as_datetime, before_as_datetime
+        )
+        if output_format == JSONL:
+            echo_records(map(get_review_record_record, review_records))
+            result_as_dict = {}
+        else:
+            result_as_dict = group_review_records_by_status(review_records)
+    else:
+        parsed_files = batch_db.stream_parsed_files_between(
+            after_as_datetime, before_as_datetime
+        )
+        if output_format == JSONL:
+            echo_records(map(get_parsed_file_record, parsed_files))
+            result_as_dict = {}
+        else:
+            result_as_dict = group_parsed_files_by_status(parsed_files)
+
+    if timings:
+        add_timings(result_as_dict, batch_db, started_at)
+    echo_result(result_as_dict, output_format)
+
+
+BACKLOG_PERCENTILES = {"p50": 50, "p90": 90, "p99": 99, "max": 100}
+
+
+@click.command()
+@click.option(
+    "--days",
+    default=7,
+    help="Count the files received and the deposition attempts per day for this many days. DEFAULT: 7",
+)
+@timings_option
+def stats(days: int = 7, timings: bool = False) -> None:
+    """
+    Show statistics about the files and deposition attempts in the batch database.
+
+    The output contains the number of files per status and deposition attempts per status, the number of files
+    received and deposition attempts per day for the last `--days` days, the age in days of the files that are ready
+    for deposition, and the number of DOIs used per year out of the DOIs available per year. If the DOI template
+    doesn't contain the year, the DOIs used altogether are shown under `all` instead.
+
+    All numbers are counted by the database, which uses its indexes for them and does not read the manuscripts.
+    """
+    started_at = perf_counter()
+    batch_db = open_batch_db()
+    now = datetime.now()
+    since = datetime.combine(now.date() - timedelta(days=days - 1), datetime.min.time())
+
+    per_day: Dict[str, Dict[str, int]] = {
+        day: {"received": count}
+        for day, count in sorted(
+            batch_db.count_parsed_files_per_day(since, now).items()
+        )
+    }
+    for day, counts in sorted(
+        batch_db.count_deposition_attempts_per_day(since, now).items()
+    ):
+        counts_of_day = per_day.setdefault(day, {"received": 0})
+        for status, count in counts.items():
+            name = get_deposition_status_name(status)
+            counts_of_day[name] = counts_of_day.get(name, 0) + count
+
+    backlog, received_at = batch_db.fetch_backlog_percentiles(
+        list(BACKLOG_PERCENTILES.values()), now
     )
-    result_as_dict = group_parsed_files_by_status(parsed_files)
 
-    click.echo(output(result_as_dict), nl=False)
+    result: Dict[str, Any] = {
+        "parsed_files": count_by_name(
+            batch_db.count_parsed_files_by_status(),
+            get_file_status_name,
+        ),
+        "deposition_attempts": count_by_name(
+            batch_db.count_deposition_attempts_by_status(),
+            get_deposition_status_name,
+        ),
+        "per_day": dict(sorted(per_day.items())),
+        "backlog": {
+            "files": backlog,
+            "age_days": {
+                name: round((now - received_at[percentile]).total_seconds() / 86400, 2)
+                for name, percentile in BACKLOG_PERCENTILES.items()
+                if percentile in received_at
+            },
+        },
+        "dois": {
+            year: {
+                "used": count,
+                "available": DOIS_PER_YEAR - count,
+                "utilization": round(count / DOIS_PER_YEAR, 6),
+            }
+            for year, count in (
+                batch_db.count_used_dois_per_year().items()
+                if has_year(config.DOI_TEMPLATE)
+                else [("all", batch_db.count_used_dois())]
+            )
+        },
+    }
+    if timings:
+        add_timings(result, batch_db, started_at)
+    click.echo(output(result), nl=False)
+
+
+def count_by_name(
+    counts: Dict[Optional[int], int], get_status_name: Callable[[Optional[int]], str]
+) -> Dict[str, int]:
+    """Add up the counts per status by the name of the status, as several statuses may have the same name."""
+    counts_by_name: Dict[str, int] = {}
+    for status, count in counts.items():
+        name = get_status_name(status)
+        counts_by_name[name] = counts_by_name.get(name, 0) + count
+    return counts_by_name
 
 
 def output(result: Dict[str, Any]) -> str:
@@ -261,13 +853,95 @@ def output(result: Dict[str, Any]) -> str:
     return ""
 
 
+def json_line(record: Dict[str, Any]) -> str:
+    if orjson_dumps is not None:
+        return f"{orjson_dumps(record).decode()}\n"
+    return f"{json_dumps(record, ensure_ascii=False, separators=(',', ':'))}\n"
+
+
+def echo_records(records: Iterable[Dict[str, Any]]) -> None:
+    for record in records:
+        click.echo(json_line(record), nl=False)
+
+
+def echo_result(result: Dict[str, Any], output_format: str) -> None:
+    """Print the result of a command as YAML, or as the last JSON line if there's anything to print."""
+    if output_format == JSONL:
+        if result:
+            click.echo(json_line(result), nl=False)
+    else:
+        click.echo(output(result), nl=False)
+
+
+def get_file_status_name(status: Optional[int]) -> str:
+    return GROUPS_BY_STATUS.get(status, "other")
+
+
+def get_review_status_name(status: Optional[int]) -> str:
+    return "pending" if status is None else get_deposition_status_name(status)
+
+
+def get_parsed_file_record(
+    parsed_file: Union[ParsedFile, ParsedFileSummary]
+) -> Dict[str, Any]:
+    return {
+        "path": parsed_file.path,
+        "doi": parsed_file.doi,
+        "status": get_file_status_name(parsed_file.status),
+        "received_at": parsed_file.received_at.isoformat(),
+    }
+
+
+def get_deposition_attempt_record(
+    deposition_attempt: DepositionAttempt,
+) -> Dict[str, Any]:
+    return {
+        "path": deposition_attempt.meca.path,
+        "doi": deposition_attempt.meca.doi,
+        "status": get_deposition_status_name(deposition_attempt.status),
+    }
+
+
+def get_review_record_record(review_record: ReviewRecord) -> Dict[str, Any]:
+    return {
+        "preprint_doi": review_record.preprint_doi,
+        "revision_id": review_record.revision_id,
+        "running_number": review_record.running_number,
+        "doi": review_record.doi,
+        "status": get_review_status_name(review_record.status),
+        "received_at": review_record.received_at.isoformat(),
+    }
+
+
 @click.command()
 @click.option(
     "--dry-run/--no-dry-run",
     default=True,
     help="Only show what would happen / actually delete MECA archives. DEFAULT: `--dry-run`",
 )
-def prune(dry_run: bool = True) -> None:
+@click.option(
+    "--rescan/--no-rescan",
+    default=False,
+    help=(
+        "Also check the path of every MECA archive in the MECADOI database that has not been pruned for whether it "
+        "exists on disk / only delete the files recorded when they were moved by `parse` or `watch`. "
+        "DEFAULT: `--no-rescan`"
+    ),
+)
+@click.option(
+    "--workers",
+    default=8,
+    help="Check and delete this many files at a time, which is faster on network file systems. DEFAULT: 8",
+)
+@format_option
+@timings_option
+def prune(
+    dry_run: bool = True,
+    rescan: bool = False,
+    workers: int = 8,
+    output_format: str = YAML,
+    timings: bool = False,
+) -> None:
     """
     Delete MECA archives that are no longer needed for deposition.
 
@@ -275,31 +949,98 @@ def prune(dry_run: bool = True) -> None:
     creation is stored in the MECADOI database. After this step, the actual file on disk is no
     longer needed to create DOIs.
 
-    This command checks the file path of every MECA archive registered in the MECADOI database and
-    deletes those files that exist on disk.
+    The `parse` and `watch` commands record every file that they move from their input directory.
+    This command deletes the recorded files, except those that are still being parsed, without
+    checking every path in the MECADOI database. For MECA archives in a bundle, the bundle is
+    deleted, and directories with extracted MECA archives are deleted with all their content.
+
+    Files parsed before files were recorded are recorded by the database migration that introduced
+    the recording, if they still exist on disk.
+
+    With `--rescan`, this command also checks the file path of every MECA archive registered in the
+    MECADOI database that has not been pruned, and deletes those files that exist on disk. This
+    finds files that were not recorded, e.g. because they were moved by an older release that was
+    still running during the migration.
+
+    Pruned MECA archives are marked as such in the MECADOI database, together with those that
+    `--rescan` finds to be gone already, so that they are not checked again by later runs.
 
     NOTE: By default, this command will *not* delete any files. Pass the `--no-dry-run` option to
     actually execute the deletions.
     """
-    batch_db = BatchDatabase(DB_URL)
-    to_delete = set(
-        [path for path in batch_db.fetch_all(ParsedFile.path) if Path(path).exists()]
-    )
+    started_at = perf_counter()
+    batch_db = open_batch_db()
+    recorded = batch_db.fetch_prunable_paths()
+    ids_by_path: Dict[str, List[int]] = {}
+    for id_parsed_file, path in batch_db.fetch_unpruned_files(
+        None if rescan else recorded
+    ):
+        ids_by_path.setdefault(get_bundle_path(path), []).append(id_parsed_file)
 
-    deletion_failed = set()
-    if not dry_run:
-        for path in to_delete:
-            try:
-                remove(path)
-            except Exception as e:
-                LOGGER.warning('Pruning "%s" failed with "%s"', path, str(e))
-                deletion_failed.add(path)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        to_delete = set(recorded)
+        gone: Set[str] = set()
+        if rescan:
+            to_check = sorted(ids_by_path.keys() - to_delete)
+            for path, exists in zip(to_check, executor.map(path_exists, to_check)):
+                (to_delete if exists else gone).add(path)
+
+        deletion_failed = set()
+        if not dry_run:
+            paths = sorted(to_delete)
+            for path, error in zip(paths, executor.map(delete_path, paths)):
+                if error is not None:
+                    LOGGER.warning('Pruning "%s" failed with "%s"', path, str(error))
+                    deletion_failed.add(path)
     deleted = to_delete - deletion_failed
 
+    if not dry_run:
+        pruned_ids = [
+            id_parsed_file
+            for path in sorted(deleted | gone)
+            for id_parsed_file in ids_by_path.get(path, [])
+        ]
+        batch_db.mark_as_pruned(pruned_ids, datetime.now())
+        batch_db.forget_seen_files(
+            [path for path in recorded if path not in deletion_failed]
+        )
+
     result: Dict[str, Any] = {"dry_run": dry_run}
-    if deleted:
-        result["deleted"] = list(sorted(deleted))
-    if deletion_failed:
-        result["failed"] = list(sorted(deletion_failed))
+    if output_format == JSONL:
+        echo_records(
+            {"path": path, "status": get_pruning_status(path, dry_run, deletion_failed)}
+            for path in sorted(to_delete)
+        )
+    else:
+        if deleted:
+            result["deleted"] = list(sorted(deleted))
+        if deletion_failed:
+            result["failed"] = list(sorted(deletion_failed))
+    if timings:
+        add_timings(result, batch_db, started_at)
 
-    click.echo(output(result), nl=False)
+    echo_result(result, output_format)
+
+
+def get_pruning_status(path: str, dry_run: bool, deletion_failed: Set[str]) -> str:
+    if dry_run:
+        return "would_delete"
+    return "failed" if path in deletion_failed else "deleted"
+
+
+def path_exists(path: str) -> bool:
+    return Path(path).exists()
+
+
+def delete_path(path: str) -> Optional[Exception]:
+    """Delete the given file or directory and return the error if that fails."""
+    try:
+        if Path(path).is_dir():
+            rmtree(path)
+        else:
+            remove(path)
+    except FileNotFoundError:
+        pass  # it has been deleted since it was recorded
+    except Exception as e:
+        return e
+    return None
@@ -0,0 +1,46 @@
+"""
+A click group that imports the modules of its subcommands only when they are invoked.
+
+Importing a command module can be expensive, as it may pull in the database, the Crossref API client, or the
+configuration. With a `LazyGroup`, running one command only imports the module of that command.
+"""
+
+__all__ = ["LazyGroup"]
+
+from importlib import import_module
+from typing import Any, Dict, List, Optional
+
+import click
+
+
+class LazyGroup(click.Group):
+    """
+    A click group with subcommands that are given by the import path of their module and their name in that module,
+    separated by a colon, e.g. `{"meca": "mecadoi.cli.meca:meca"}`.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        lazy_subcommands: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted([*super().list_commands(ctx), *self.lazy_subcommands])
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_subcommands:
+            return self._load(cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _load(self, cmd_name: str) -> click.Command:
+        module_name, command_name = self.lazy_subcommands[cmd_name].split(":")
+        command = getattr(import_module(module_name), command_name)
+        if not isinstance(command, click.Command):
+            raise ValueError(
+                f'Lazy subcommand "{cmd_name}" is not a click command: {command!r}'
+            )
+        return command
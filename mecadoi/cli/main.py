@@ -1,18 +1,59 @@
-from click import group
+from typing import Optional
 
-from .batch import batch
-from .crossref import crossref
-from .meca import meca
+from click import BadParameter, Context, group, option, Parameter, Path
 
+from .lazy import LazyGroup
 
-@group()
+
+def start_profiling(ctx: Context, param: Parameter, path: Optional[str]) -> None:
+    """Profile the rest of the command, including importing the modules of the invoked subcommand."""
+    if path is None:
+        return
+    from .profile import CommandProfiler
+
+    try:
+        profiler = CommandProfiler(path)
+    except ValueError as e:
+        raise BadParameter(str(e), ctx=ctx, param=param)
+    profiler.start()
+    ctx.call_on_close(lambda: profiler.stop(top=ctx.meta.get("profile_top", 20)))
+
+
+def set_profile_top(ctx: Context, param: Parameter, top: int) -> None:
+    ctx.meta["profile_top"] = top
+
+
+@group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "batch": "mecadoi.cli.batch:batch",
+        "crossref": "mecadoi.cli.crossref:crossref",
+        "meca": "mecadoi.cli.meca:meca",
+    },
+)
+@option(
+    "--profile",
+    type=Path(dir_okay=False, writable=True),
+    callback=start_profiling,
+    expose_value=False,
+    help=(
+        "Profile the command and write the profile to this file, readable with `pstats`, or as a flame graph "
+        "recorded by the sampling profiler `pyinstrument` if the file name ends with `.html`, which requires "
+        "pyinstrument to be installed. The functions that took the most time are printed to stderr."
+    ),
+)
+@option(
+    "--profile-top",
+    default=20,
+    callback=set_profile_top,
+    expose_value=False,
+    help="The number of functions printed to stderr with `--profile`. DEFAULT: 20",
+)
 def main() -> None:
-    pass
+    from mecadoi.config import configure_logging
 
+    configure_logging()
 
-main.add_command(batch)
-main.add_command(crossref)
-main.add_command(meca)
 
 if __name__ == "__main__":
     main()
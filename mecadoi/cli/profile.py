@@ -0,0 +1,129 @@
+"""
+Profile a CLI command and summarize where its time went.
+
+With `--profile <file>`, the main command group runs the invoked command under a profiler, writes the profile to the
+given file, and prints the functions that took the most time to stderr. By default, the deterministic `cProfile`
+profiler records every function call, and the file can be read with `pstats` or tools like snakeviz. If the file name
+ends with `.html`, the optional `pyinstrument` sampling profiler is used instead, which records the call stack at
+regular intervals, and the file is an interactive flame graph that can be opened in a browser.
+"""
+
+__all__ = ["CommandProfiler", "HotFunction", "SAMPLING_PROFILE_SUFFIX"]
+
+import sys
+from cProfile import Profile
+from os.path import join, relpath
+from pstats import Stats
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+try:
+    from pyinstrument import Profiler
+
+    SamplingProfiler: Any = Profiler
+except ImportError:  # pragma: no cover - pyinstrument is optional
+    SamplingProfiler = None
+
+SAMPLING_PROFILE_SUFFIX = ".html"
+"""Profiles written to files with this suffix are recorded by the sampling profiler."""
+
+
+class HotFunction(NamedTuple):
+    """A function and the time spent in it, excluding the functions that it called."""
+
+    seconds: float
+    location: str
+    """The function name with the file path and the line number of its definition."""
+
+
+class CommandProfiler:
+    """Profiles the code between `start()` and `stop()` and writes the profile to `path`."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.sampling = path.endswith(SAMPLING_PROFILE_SUFFIX)
+        if self.sampling and SamplingProfiler is None:
+            raise ValueError(
+                f"Profiles ending with {SAMPLING_PROFILE_SUFFIX} need the optional pyinstrument package"
+            )
+        self._profiler: Any = SamplingProfiler() if self.sampling else Profile()
+        self._started_at = 0.0
+
+    def start(self) -> None:
+        self._started_at = perf_counter()
+        if self.sampling:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self, top: int = 20, stream: Optional[TextIO] = None) -> None:
+        """Write the profile and print the `top` functions that took the most time to `stream`, by default stderr."""
+        stream = stream or sys.stderr
+        if self.sampling:
+            self._profiler.stop()
+            self._profiler.write_html(self.path)
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.path)
+        total_seconds = perf_counter() - self._started_at
+
+        print(
+            f'Profile written to "{self.path}". Top {top} functions by own time of {total_seconds:.3f} s:',
+            file=stream,
+        )
+        for hot_function in self.hot_functions()[:top]:
+            share = hot_function.seconds / total_seconds if total_seconds else 0
+            print(
+                f"{hot_function.seconds:10.3f} s {share:6.1%}  {hot_function.location}",
+                file=stream,
+            )
+        stream.flush()
+
+    def hot_functions(self) -> List[HotFunction]:
+        """Return the profiled functions, sorted by the time spent in them, excluding the functions that they called."""
+        seconds: Dict[str, float] = {}
+        for location, own_seconds in self._own_seconds():
+            seconds[location] = seconds.get(location, 0.0) + own_seconds
+        return sorted(
+            (
+                HotFunction(own_seconds, location)
+                for location, own_seconds in seconds.items()
+            ),
+            reverse=True,
+        )
+
+    def _own_seconds(self) -> Iterator[Tuple[str, float]]:
+        if not self.sampling:
+            stats = Stats(self._profiler).stats  # type: ignore[attr-defined]
+            for (file_name, line_no, function), timings in stats.items():
+                # the numbers of primitive and all calls, the own and the cumulative time, and the callers
+                yield _format_location(file_name, line_no, function), timings[2]
+            return
+
+        session = self._profiler.last_session
+        frames = [session.root_frame()] if session is not None else []
+        while frames:
+            frame = frames.pop()
+            if frame is None:
+                continue
+            frames.extend(frame.children)
+            if not frame.is_synthetic:
+                yield _format_location(
+                    frame.file_path or "", frame.line_no or 0, frame.function
+                ), frame.total_self_time
+
+
+def _format_location(file_name: str, line_no: int, function: str) -> str:
+    if not line_no:
+        return function  # built-in functions, e.g. "<built-in method posix.stat>"
+    return f"{_shorten(file_name)}:{line_no}({function})"
+
+
+def _shorten(file_name: str) -> str:
+    """Shorten the file name to the path relative to its entry on `sys.path`, e.g. `mecadoi/db.py`."""
+    candidates = [
+        relpath(file_name, entry)
+        for entry in sys.path
+        if entry and file_name.startswith(join(entry, ""))
+    ]
+    return min(candidates, key=len) if candidates else file_name
@@ -0,0 +1,137 @@
+"""
+Compact binary encoding for the XML and YAML documents stored in the batch database.
+
+Documents are compressed with zlib using a preset dictionary of fragments that occur in every Crossref deposition and
+every manuscript YAML dump. Most documents are only a few kilobytes in size, which is too little for zlib to learn
+these fragments from the document itself, so the dictionary considerably reduces the size of the compressed output.
+
+Every encoded value starts with a header consisting of a NUL byte, which never occurs in XML or YAML text, and a
+format byte. Values without this header are UTF-8 encoded text written before compression was introduced.
+
+The dictionary used by a format must never change once values have been written with it. To use a different
+dictionary, add a new format and make `compress` write it; `decompress` keeps reading all formats.
+"""
+
+__all__ = ["compress", "decompress"]
+
+from zlib import compressobj, decompressobj, MAX_WBITS
+from typing import Dict, Union
+
+HEADER = b"\x00"
+"""Marks a value as written by `compress`."""
+
+STORED = 0
+"""Format of values that are stored uncompressed, because compressing did not make them smaller."""
+
+ZLIB_V1 = 1
+"""Format of values compressed with zlib and the dictionary `DICTIONARY_V1`."""
+
+COMPRESSION_LEVEL = 1
+"""zlib compression level. Higher levels are several times slower, but produce only slightly smaller output."""
+
+# zlib can refer back to the last 32 KiB, so the dictionary must not be larger than this. Fragments near the end of the
+# dictionary are encoded with shorter back-references, so the most common ones come last.
+DICTIONARY_V1 = (
+    # manuscript YAML
+    "!!python/object:mecadoi.meca.Manuscript\nauthors:\n"
+    "doi: 10.15252/\njournal: Review Commons\npreprint_doi: 10.1101/\nreview_process:\n"
+    "text:\n  abstract: \ntitle: \n"
+    "- !!python/object:mecadoi.model.Author\n  given_name: \n  institutions:\n"
+    "  - !!python/object:mecadoi.model.Institution\n    city: \n    country: \n    department: \n    name: \n"
+    "  is_corresponding_author: true\n  orcid: https://orcid.org/0000-000\n  surname: \n"
+    "- !!python/object:mecadoi.meca.RevisionRound\n"
+    "  author_reply: null\n"
+    "  author_reply: !!python/object:mecadoi.meca.AuthorReply\n    authors:\n"
+    "    text: {}\n  reviews:\n"
+    "      Estimated time to Complete Revisions (Required): Cannot tell / Not applicable\n"
+    "      Estimated time to Complete Revisions (Required): Between 1 and 3 months\n"
+    "      Evidence, reproducibility and clarity (Required): \n"
+    "      Significance (Required): \n"
+    "  revision_id: '0'\n"
+    "  - !!python/object:mecadoi.meca.Review\n    authors:\n"
+    "    - !!python/object:mecadoi.model.Author\n      given_name: redacted\n      institutions: []\n"
+    "      is_corresponding_author: false\n      orcid: null\n      surname: redacted\n"
+    "    running_number: '1'\n    text:\n"
+    "    - !!python/object:mecadoi.model.Author\n      given_name: \n      institutions:\n"
+    "      - !!python/object:mecadoi.model.Institution\n        city: \n        country: \n"
+    "        department: \n        name: \n"
+    "      is_corresponding_author: false\n      orcid: null\n      surname: \n"
+    # Crossref deposition XML
+    '<doi_batch xmlns="http://www.crossref.org/schema/5.3.1" xmlns:rel="http://www.crossref.org/relations.xsd" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" version="5.3.1" '
+    'xsi:schemaLocation="http://www.crossref.org/schema/5.3.1 http://www.crossref.org/schemas/crossref5.3.1.xsd">\n'
+    "  <head>\n    <doi_batch_id>rc.</doi_batch_id>\n    <timestamp></timestamp>\n    <depositor>\n"
+    "      <depositor_name>EMBO</depositor_name>\n      <email_address></email_address>\n    </depositor>\n"
+    "    <registrant>EMBO</registrant>\n  </head>\n  <body>\n"
+    "  </body>\n</doi_batch>\n"
+    '          <ORCID authenticated="false">https://orcid.org/0000-000</ORCID>\n'
+    '    <peer_review language="en" revision-round="0" type="author-comment" stage="pre-publication">\n'
+    "      <contributors>\n"
+    '        <person_name sequence="first" contributor_role="author">\n'
+    '        <person_name sequence="additional" contributor_role="author">\n'
+    "          <given_name></given_name>\n          <surname></surname>\n"
+    "          <affiliations>\n            <institution>\n              <institution_name></institution_name>\n"
+    "              <institution_place></institution_place>\n"
+    "              <institution_department></institution_department>\n"
+    "            </institution>\n          </affiliations>\n"
+    "        </person_name>\n"
+    "      </contributors>\n"
+    "      <titles>\n        <title>Author Reply to Peer Reviews of </title>\n      </titles>\n"
+    "      <running_number>Author Reply</running_number>\n"
+    '    <peer_review language="en" revision-round="0" type="referee-report" stage="pre-publication">\n'
+    "      <contributors>\n"
+    '        <anonymous sequence="first" contributor_role="author"/>\n'
+    "      </contributors>\n"
+    "      <titles>\n        <title>Peer Review #1 of </title>\n      </titles>\n"
+    "      <review_date>\n        <month></month>\n        <day></day>\n        <year>20</year>\n"
+    "      </review_date>\n"
+    "      <institution>\n        <institution_name>Review Commons</institution_name>\n      </institution>\n"
+    "      <running_number></running_number>\n"
+    "      <rel:program>\n"
+    "        <rel:related_item>\n"
+    '          <rel:inter_work_relation relationship-type="isReviewOf" identifier-type="doi">10.1101/'
+    "</rel:inter_work_relation>\n"
+    "        </rel:related_item>\n"
+    "      </rel:program>\n"
+    "      <doi_data>\n        <doi>10.15252/rc.20</doi>\n"
+    "        <resource>https://eeb.embo.org/doi/10.1101/</resource>\n"
+    "      </doi_data>\n"
+    "    </peer_review>\n"
+).encode("utf-8")
+
+DICTIONARIES: Dict[int, bytes] = {ZLIB_V1: DICTIONARY_V1}
+
+
+def compress(text: str) -> bytes:
+    """Encode the given text as compactly as possible."""
+    data = text.encode("utf-8")
+    compressor = compressobj(
+        COMPRESSION_LEVEL, wbits=MAX_WBITS, zdict=DICTIONARIES[ZLIB_V1]
+    )
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) < len(data):
+        return HEADER + bytes([ZLIB_V1]) + compressed
+    return HEADER + bytes([STORED]) + data
+
+
+def decompress(value: Union[bytes, memoryview, str]) -> str:
+    """
+    Decode a value that was encoded with `compress`.
+
+    Values that were stored before compression was introduced are returned as they are (strings) or decoded as UTF-8
+    (bytes).
+    """
+    if isinstance(value, str):
+        return value
+    data = bytes(value)
+    if not data.startswith(HEADER):
+        return data.decode("utf-8")
+
+    format = data[1]
+    if format == STORED:
+        return data[2:].decode("utf-8")
+    if format not in DICTIONARIES:
+        raise ValueError(f"unknown compression format {format}")
+
+    decompressor = decompressobj(wbits=MAX_WBITS, zdict=DICTIONARIES[format])
+    return (decompressor.decompress(data[2:]) + decompressor.flush()).decode("utf-8")
@@ -5,52 +5,134 @@ The configuration parameters are loaded from a file called ".env" in the working
 parent folders of the working directory are searched.
 
 The configuration file can also be specified by setting the environment variable ENV_FILE when invoking the application.
+
+The configuration file is loaded and each parameter is read when it is first used, e.g. by `from mecadoi.config import
+DB_URL`. Missing required parameters only raise a ValueError at that point.
 """
 
 from dotenv import load_dotenv
 from logging import basicConfig
 from os import getenv
+from typing import Any, Callable, Dict, Optional, Tuple
+
+_REQUIRED = object()
+
+# The type and default value of every setting. Settings are only read from the environment when they're first used, so
+# that commands that don't need e.g. the Crossref credentials can run without them.
+_SETTINGS: Dict[str, Tuple[Callable[[str], Any], Any]] = {
+    "DEPOSITOR_NAME": (str, _REQUIRED),
+    "DEPOSITOR_EMAIL": (str, _REQUIRED),
+    "REGISTRANT_NAME": (str, _REQUIRED),
+    "INSTITUTION_NAME": (str, _REQUIRED),
+    "REVIEW_RESOURCE_URL_TEMPLATE": (str, _REQUIRED),
+    "REVIEW_TITLE_TEMPLATE": (str, _REQUIRED),
+    "AUTHOR_REPLY_RESOURCE_URL_TEMPLATE": (str, _REQUIRED),
+    "AUTHOR_REPLY_TITLE_TEMPLATE": (str, _REQUIRED),
+    "DOI_TEMPLATE": (str, _REQUIRED),
+    "DB_URL": (str, _REQUIRED),
+    "SLOW_QUERY_THRESHOLD": (float, 1.0),
+    "PARSE_CPU_LIMIT": (int, 60),
+    "PARSE_MEMORY_LIMIT": (int, 1024),
+    "PARSE_MAX_MEMBERS": (int, 10_000),
+    "PARSE_MAX_ARCHIVE_SIZE": (int, 4096),
+    "PARSE_MAX_COMPRESSION_RATIO": (float, 100),
+    "PARSE_MAX_XML_SIZE": (int, 100),
+    "PARSE_LEASE_SECONDS": (int, 3600),
+    "PARSE_MIN_AGE": (int, 60),
+    "PARSE_MAX_WAIT": (int, 86400),
+    "DEPOSIT_LEASE_SECONDS": (int, 86400),
+    "CROSSREF_DEPOSITION_URL": (str, _REQUIRED),
+    "CROSSREF_USERNAME": (str, _REQUIRED),
+    "CROSSREF_PASSWORD": (str, _REQUIRED),
+    "LOG_FILE": (str, None),
+    "LOG_LEVEL": (str, None),
+}
+
+DEPOSITOR_NAME: str
+DEPOSITOR_EMAIL: str
+REGISTRANT_NAME: str
+INSTITUTION_NAME: str
+REVIEW_RESOURCE_URL_TEMPLATE: str
+REVIEW_TITLE_TEMPLATE: str
+AUTHOR_REPLY_RESOURCE_URL_TEMPLATE: str
+AUTHOR_REPLY_TITLE_TEMPLATE: str
+DOI_TEMPLATE: str
+
+DB_URL: str
+SLOW_QUERY_THRESHOLD: float
+
+PARSE_CPU_LIMIT: int
+PARSE_MEMORY_LIMIT: int
+PARSE_MAX_MEMBERS: int
+PARSE_MAX_ARCHIVE_SIZE: int
+PARSE_MAX_COMPRESSION_RATIO: float
+PARSE_MAX_XML_SIZE: int
+PARSE_LEASE_SECONDS: int
+PARSE_MIN_AGE: int
+PARSE_MAX_WAIT: int
+
+DEPOSIT_LEASE_SECONDS: int
 
-# Use the ENV_FILE parameter to load the configuration file. If the parameter isn't set, the dotenv library searches
-# for a file called ".env", first in the current folder and then in its parents.
-load_dotenv(dotenv_path=getenv("ENV_FILE"))
+CROSSREF_DEPOSITION_URL: str
+CROSSREF_USERNAME: str
+CROSSREF_PASSWORD: str
+
+LOG_FILE: Optional[str]
+LOG_LEVEL: Optional[str]
+
+_loaded = False
 
 
 def getenv_or_raise(name: str) -> str:
+    _load()
     val = getenv(name)
     if val is None:
         raise ValueError(f'no env variable found for name "{name}"')
     return val
 
 
-DEPOSITOR_NAME = getenv_or_raise("DEPOSITOR_NAME")
-DEPOSITOR_EMAIL = getenv_or_raise("DEPOSITOR_EMAIL")
-REGISTRANT_NAME = getenv_or_raise("REGISTRANT_NAME")
-INSTITUTION_NAME = getenv_or_raise("INSTITUTION_NAME")
-REVIEW_RESOURCE_URL_TEMPLATE = getenv_or_raise("REVIEW_RESOURCE_URL_TEMPLATE")
-REVIEW_TITLE_TEMPLATE = getenv_or_raise("REVIEW_TITLE_TEMPLATE")
-AUTHOR_REPLY_RESOURCE_URL_TEMPLATE = getenv_or_raise(
-    "AUTHOR_REPLY_RESOURCE_URL_TEMPLATE"
-)
-AUTHOR_REPLY_TITLE_TEMPLATE = getenv_or_raise("AUTHOR_REPLY_TITLE_TEMPLATE")
-DOI_TEMPLATE = getenv_or_raise("DOI_TEMPLATE")
+def configure_logging() -> None:
+    """Log to `LOG_FILE`, if it is set. This happens automatically when the first setting is used."""
+    _load()
+
+
+def __getattr__(name: str) -> Any:
+    """Read the setting with the given name from the environment when it's first used."""
+    try:
+        convert, default = _SETTINGS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    if default is _REQUIRED:
+        value = convert(getenv_or_raise(name))
+    else:
+        _load()
+        raw_value = getenv(name)
+        value = convert(raw_value) if raw_value else default
+    # Later uses of the setting find it in the module and don't call this function again.
+    globals()[name] = value
+    return value
+
 
-DB_URL = getenv_or_raise("DB_URL")
+def _load() -> None:
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
 
-CROSSREF_DEPOSITION_URL = getenv_or_raise("CROSSREF_DEPOSITION_URL")
-CROSSREF_USERNAME = getenv_or_raise("CROSSREF_USERNAME")
-CROSSREF_PASSWORD = getenv_or_raise("CROSSREF_PASSWORD")
+    # Use the ENV_FILE parameter to load the configuration file. If the parameter isn't set, the dotenv library searches
+    # for a file called ".env", first in the current folder and then in its parents.
+    load_dotenv(dotenv_path=getenv("ENV_FILE"))
 
-LOG_FILE = getenv("LOG_FILE")
-LOG_LEVEL = getenv("LOG_LEVEL")
+    log_file = getenv("LOG_FILE")
+    if log_file:
+        level = getenv("LOG_LEVEL") or "INFO"
+        basicConfig(
+            filename=log_file,
+            level=level,
+            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        )
 
-if LOG_FILE:
-    level = LOG_LEVEL or "INFO"
-    basicConfig(
-        filename=LOG_FILE,
-        level=level,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
 
 __all__ = [
     "DEPOSITOR_NAME",
@@ -63,9 +145,21 @@ __all__ = [
     "AUTHOR_REPLY_TITLE_TEMPLATE",
     "DOI_TEMPLATE",
     "DB_URL",
+    "SLOW_QUERY_THRESHOLD",
+    "PARSE_CPU_LIMIT",
+    "PARSE_MEMORY_LIMIT",
+    "PARSE_MAX_MEMBERS",
+    "PARSE_MAX_ARCHIVE_SIZE",
+    "PARSE_MAX_COMPRESSION_RATIO",
+    "PARSE_MAX_XML_SIZE",
+    "PARSE_LEASE_SECONDS",
+    "PARSE_MIN_AGE",
+    "PARSE_MAX_WAIT",
+    "DEPOSIT_LEASE_SECONDS",
     "CROSSREF_DEPOSITION_URL",
     "CROSSREF_USERNAME",
     "CROSSREF_PASSWORD",
     "LOG_FILE",
     "LOG_LEVEL",
+    "configure_logging",
 ]
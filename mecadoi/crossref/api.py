@@ -1,5 +1,9 @@
 from requests import PreparedRequest, Request, Session
-from mecadoi.config import CROSSREF_DEPOSITION_URL, CROSSREF_USERNAME, CROSSREF_PASSWORD
+from mecadoi import config
+
+# The session keeps connections to the Crossref API open between depositions, e.g. in a long-running `batch watch`
+# process.
+SESSION = Session()
 
 
 def pretty_print_request(req: PreparedRequest) -> None:
@@ -24,20 +28,23 @@ def prep_request(
         "login_id": crossref_username,
         "login_passwd": crossref_password,
     }
-    url = CROSSREF_DEPOSITION_URL
+    url = config.CROSSREF_DEPOSITION_URL
     req = Request("POST", url, files=files, data=data)
     return req.prepare()
 
 
 def deposit(deposition_file: str, verbose: int = 0) -> str:
     """Send a deposition file to the Crossref API."""
-    if not (CROSSREF_USERNAME and CROSSREF_PASSWORD):
+    # The settings are read when they're needed, so that commands that don't deposit don't need the credentials.
+    crossref_username = config.CROSSREF_USERNAME
+    crossref_password = config.CROSSREF_PASSWORD
+    if not (crossref_username and crossref_password):
         raise ValueError("No CrossRef username or password given!")
 
     if verbose:
         pretty_print_request(prep_request(deposition_file, "***", "***"))
 
-    req = prep_request(deposition_file, CROSSREF_USERNAME, CROSSREF_PASSWORD)
-    resp = Session().send(req)
+    req = prep_request(deposition_file, crossref_username, crossref_password)
+    resp = SESSION.send(req)
     resp.raise_for_status()
     return resp.text
@@ -9,16 +9,7 @@ from time import time_ns
 from typing import Generator, List
 from xsdata.formats.dataclass.serializers import XmlSerializer
 from xsdata.formats.dataclass.serializers.config import SerializerConfig
-from mecadoi.config import (
-    DEPOSITOR_NAME,
-    DEPOSITOR_EMAIL,
-    REGISTRANT_NAME,
-    INSTITUTION_NAME,
-    REVIEW_RESOURCE_URL_TEMPLATE,
-    REVIEW_TITLE_TEMPLATE,
-    AUTHOR_REPLY_TITLE_TEMPLATE,
-    AUTHOR_REPLY_RESOURCE_URL_TEMPLATE,
-)
+from mecadoi import config
 from mecadoi.article import Article
 from mecadoi.crossref.xml.doi_batch import (
     Affiliations,
@@ -73,10 +64,10 @@ def generate_peer_review_deposition(articles: List[Article]) -> str:
             doi_batch_id=f"rc.{timestamp}",
             timestamp=timestamp,
             depositor=Depositor(
-                depositor_name=DEPOSITOR_NAME,
-                email_address=DEPOSITOR_EMAIL,
+                depositor_name=config.DEPOSITOR_NAME,
+                email_address=config.DEPOSITOR_EMAIL,
             ),
-            registrant=REGISTRANT_NAME,
+            registrant=config.REGISTRANT_NAME,
         ),
         body=Body(
             peer_review=[
@@ -105,11 +96,11 @@ def _generate_reviews(article: Article) -> Generator[PeerReview, None, None]:
     )
     for revision, revision_round in enumerate(article.review_process):
         for running_number, review in enumerate(revision_round.reviews, start=1):
-            title = Template(REVIEW_TITLE_TEMPLATE).substitute(
+            title = Template(config.REVIEW_TITLE_TEMPLATE).substitute(
                 article_title=article.title,
                 review_number=running_number,
             )
-            resource_url = Template(REVIEW_RESOURCE_URL_TEMPLATE).substitute(
+            resource_url = Template(config.REVIEW_RESOURCE_URL_TEMPLATE).substitute(
                 article_doi=article.doi,
                 revision=revision,
                 running_number=running_number,
@@ -128,7 +119,9 @@ def _generate_reviews(article: Article) -> Generator[PeerReview, None, None]:
                     month=review.publication_date.month,
                     day=review.publication_date.day,
                 ),
-                institution=CrossrefInstitution(institution_name=INSTITUTION_NAME),
+                institution=CrossrefInstitution(
+                    institution_name=config.INSTITUTION_NAME
+                ),
                 running_number=str(running_number),
                 program=Program(related_item=[is_review_of_relation]),
                 doi_data=DoiData(
@@ -139,10 +132,12 @@ def _generate_reviews(article: Article) -> Generator[PeerReview, None, None]:
 
         author_reply = revision_round.author_reply
         if author_reply:
-            title = Template(AUTHOR_REPLY_TITLE_TEMPLATE).substitute(
+            title = Template(config.AUTHOR_REPLY_TITLE_TEMPLATE).substitute(
                 article_title=article.title
             )
-            resource_url = Template(AUTHOR_REPLY_RESOURCE_URL_TEMPLATE).substitute(
+            resource_url = Template(
+                config.AUTHOR_REPLY_RESOURCE_URL_TEMPLATE
+            ).substitute(
                 article_doi=article.doi,
                 revision=revision,
             )
@@ -158,7 +153,9 @@ def _generate_reviews(article: Article) -> Generator[PeerReview, None, None]:
                     month=review.publication_date.month,
                     day=review.publication_date.day,
                 ),
-                institution=CrossrefInstitution(institution_name=INSTITUTION_NAME),
+                institution=CrossrefInstitution(
+                    institution_name=config.INSTITUTION_NAME
+                ),
                 running_number="Author Reply",
                 program=Program(
                     related_item=[is_review_of_relation]
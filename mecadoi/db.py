@@ -1,34 +1,87 @@
 """Interface for the batch database storing information about processed MECAs and deposition attempts."""
 
-__all__ = ["BatchDatabase", "DepositionAttempt", "ParsedFile"]
+__all__ = [
+    "BatchDatabase",
+    "BatchRun",
+    "DepositionAttempt",
+    "DepositionClaim",
+    "FileLease",
+    "MethodTimings",
+    "ParsedFile",
+    "ParsedFileSummary",
+    "QueryTimings",
+    "ReviewRecord",
+    "SeenFile",
+]
 
+from contextlib import contextmanager
 from copy import deepcopy
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from functools import wraps
+from logging import getLogger
+from os import getpid
+from socket import gethostname
+from threading import local, Lock
+from time import perf_counter
 from sqlalchemy import (
+    and_,
+    BigInteger,
     Boolean,
     Column,
     create_engine,
     DateTime,
+    delete,
+    event,
+    exists,
+    Float,
     ForeignKey,
+    func,
+    Index,
     Integer,
+    JSON,
+    LargeBinary,
     MetaData,
     Table,
+    or_,
     Text,
     select,
-    text,
+    update,
 )
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import registry, relationship, Session  # type: ignore[attr-defined] # it does have this attribute
 from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy.types import TypeDecorator
-from typing import Any, List, Optional
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 from yaml import dump, load, Loader
 
+from mecadoi.article import Article
+from mecadoi.bundle import BUNDLE_SEPARATOR
+from mecadoi.compression import compress, decompress
 from mecadoi.meca import Manuscript
 
+LOGGER = getLogger(__name__)
 
 mapper_registry = registry()
 
+IN_CLAUSE_CHUNK_SIZE = 500
+"""The number of values bound at a time in `IN` clauses, well below the limits of the supported databases."""
+
+STREAM_BATCH_SIZE = 1000
+"""The number of rows that methods streaming their results fetch from the database at a time."""
+
 
 @dataclass
 class ParsedFile:
@@ -56,6 +109,7 @@ class ParsedFile:
 
     Valid = 1
     Invalid = 10
+    LimitExceeded = 11
     NoDoi = 20
     NoReviews = 21
     Duplicate = 22
@@ -63,9 +117,22 @@ class ParsedFile:
     """
     The status of this file.
 
-    One of the constants defined in this class: `Valid`, `Invalid`, `NoDoi`, `NoReviews`, `Duplicate`.
+    One of the constants defined in this class: `Valid`, `Invalid`, `LimitExceeded`, `NoDoi`, `NoReviews`, `Duplicate`.
+
+    `LimitExceeded` means that parsing the file exceeded the CPU time, memory or wall-clock time limit of the sandbox,
+    or that the file exceeded one of the `ArchiveLimits` on the number and size of its members.
+    Unlike `Invalid`, this may depend on the load of the host and on the configured limits.
     """
 
+    sha256: Optional[str] = None
+    """The hex-encoded SHA-256 hash of the file's content. Is None for files that were parsed before it was stored."""
+
+    parser_version: Optional[int] = None
+    """The version of the MECA parser that parsed the file, see `mecadoi.meca.PARSER_VERSION`."""
+
+    pruned_at: Optional[datetime] = None
+    """The time when the file was deleted by `batch prune`, or found to be gone. Is None while the file is kept."""
+
     id: Optional[int] = None
     """A unique identifier for this file."""
 
@@ -73,6 +140,16 @@ class ParsedFile:
         return f"ParsedFile(id={self.id}, path={self.path}, doi={self.doi}, received_at={self.received_at})"
 
 
+class ParsedFileSummary(NamedTuple):
+    """The columns of a parsed file that are listed by `batch ls`, read without its manuscript."""
+
+    id: int
+    path: str
+    doi: Optional[str]
+    status: Optional[int]
+    received_at: datetime
+
+
 @dataclass
 class DepositionAttempt:
     """An attempt for depositing DOIs for reviews in a MECA."""
@@ -121,8 +198,210 @@ class UsedDoi:
     """The time when the DOI was claimed."""
 
 
+@dataclass
+class FileLease:
+    """
+    A file that a parse worker has claimed by moving it out of the input directory, and that it has not finished
+    parsing yet.
+    """
+
+    path: str
+    """The path of the file in the input directory."""
+    staged_path: str
+    """The path that the worker moved the file to."""
+    worker_id: str
+    """Identifies the worker, e.g. by host name and process ID."""
+    claimed_at: datetime
+    """The time when the file was claimed."""
+    expires_at: datetime
+    """
+    The time after which the file may be returned to the input directory, as the worker is assumed to have crashed.
+    """
+
+
+@dataclass
+class DepositionClaim:
+    """A parsed file that a deposit worker has claimed, and that it has not finished depositing yet."""
+
+    id_parsed_file: int
+    """The ID of the claimed parsed file."""
+    worker_id: str
+    """Identifies the worker, e.g. by host name and process ID."""
+    claimed_at: datetime
+    """The time when the file was claimed."""
+    expires_at: datetime
+    """The time after which other workers may claim the file again, as the worker is assumed to have crashed."""
+
+
+@dataclass
+class SeenFile:
+    """
+    The state of a file or of a directory with an extracted MECA archive as it was last seen by a parse worker.
+
+    Recording what has been seen allows finding new or changed files without re-examining the unchanged ones, and
+    knowing which files exist without `stat`-ing them.
+    """
+
+    path: str
+    """The path of the file or directory."""
+    size: int
+    """The size in bytes of the file, or the total size of the files in the directory."""
+    mtime_ns: int
+    """The modification time in nanoseconds of the file, or the latest one of the files in the directory."""
+    inode: int
+    """The inode number of the file or directory."""
+    status: int
+    """Why the file was recorded, e.g. `SeenFile.Incomplete`."""
+    seen_at: datetime
+    """The time when the file was seen in this state."""
+
+    Incomplete = 0
+    """The file is in the input directory and was still being written when it was seen."""
+    Archived = 1
+    """The file was claimed from the input directory and moved to this path, where it's kept until it's pruned."""
+
+
+@dataclass
+class BatchRun:
+    """The duration of a `batch parse` or `batch deposit` run and of its stages, to compare runs across releases."""
+
+    id: str
+    """The id of the run, which is also part of the paths of its output files."""
+    command: str
+    """`BatchRun.Parse` or `BatchRun.Deposit`."""
+    started_at: datetime
+    seconds: float
+    """The duration of the complete run."""
+    files: int
+    """The number of files parsed, or of deposition attempts."""
+    stages: Dict[str, Dict[str, float]]
+    """The number of runs, the median, 95th percentile and maximum duration, and the total duration of each stage."""
+
+    Parse = "parse"
+    Deposit = "deposit"
+
+
+@dataclass
+class ReviewRecord:
+    """
+    A review or author reply in a parsed MECA archive, together with the DOI it was assigned.
+
+    Review records duplicate parts of `ParsedFile.manuscript` and of the deposition attempts. This allows querying
+    reviews without deserializing manuscripts. They are created when a file is parsed and updated after every
+    deposition attempt.
+    """
+
+    id_parsed_file: int
+    """The id of the parsed file that contains this review."""
+
+    received_at: datetime
+    """The time when the parsed file that contains this review was received."""
+
+    preprint_doi: Optional[str]
+    """The DOI of the preprint that is reviewed. Is None if the MECA archive has no preprint DOI."""
+
+    revision_id: str
+    """The ID of the revision round that this review belongs to."""
+
+    running_number: Optional[str]
+    """The running number of this review within its revision round. Is None for author replies."""
+
+    doi: Optional[str] = None
+    """
+    The DOI assigned to this review in the latest deposition attempt.
+
+    Is None if no deposition file was generated for this review yet.
+    """
+
+    status: Optional[int] = None
+    """
+    The status of the latest deposition attempt for this review.
+
+    One of the constants defined in `DepositionAttempt`. Is None if no deposition has been attempted yet.
+    """
+
+    id: Optional[int] = None
+    """A unique identifier for this record."""
+
+
+def _review_records(parsed_file: ParsedFile) -> List[ReviewRecord]:
+    """Create a review record for every review and author reply in the given parsed file."""
+    if (
+        parsed_file.id is None
+        or parsed_file.manuscript is None
+        or not parsed_file.manuscript.review_process
+    ):
+        return []
+
+    records = []
+    for revision_round in parsed_file.manuscript.review_process:
+        running_numbers: List[Optional[str]] = [
+            review.running_number for review in revision_round.reviews
+        ]
+        if revision_round.author_reply:
+            running_numbers.append(None)
+        records += [
+            ReviewRecord(
+                id_parsed_file=parsed_file.id,
+                received_at=parsed_file.received_at,
+                preprint_doi=parsed_file.doi,
+                revision_id=revision_round.revision_id,
+                running_number=running_number,
+            )
+            for running_number in running_numbers
+        ]
+    return records
+
+
+def _assigned_dois(
+    manuscript: Manuscript, article: Article
+) -> Dict[Tuple[str, Optional[str]], str]:
+    """Map the revision ID and running number of every review in the manuscript to the DOI it has in the article."""
+    dois: Dict[Tuple[str, Optional[str]], str] = {}
+    for manuscript_round, article_round in zip(
+        manuscript.review_process or [], article.review_process
+    ):
+        revision_id = manuscript_round.revision_id
+        for manuscript_review, article_review in zip(
+            manuscript_round.reviews, article_round.reviews
+        ):
+            dois[(revision_id, manuscript_review.running_number)] = article_review.doi
+        if article_round.author_reply:
+            dois[(revision_id, None)] = article_round.author_reply.doi
+    return dois
+
+
+class Compressed(TypeDecorator):  # type: ignore[type-arg]
+    """An SQLAlchemy type for storing text in compressed form, see `mecadoi.compression`."""
+
+    cache_ok = True
+    impl = LargeBinary
+
+    def process_bind_param(self, value: Any, _: Any) -> Any:
+        if value is None:
+            return None
+        return compress(value)
+
+    def process_result_value(self, value: Any, _: Any) -> Any:
+        if value is None:
+            return None
+        return decompress(value)
+
+    def result_processor(self, dialect: Any, coltype: Any) -> Any:
+        # LargeBinary's own result processor converts values to bytes, which fails for text that was written before
+        # compression was introduced. `decompress` accepts all value types that database drivers return.
+        def process(value: Any) -> Any:
+            return self.process_result_value(value, dialect)
+
+        return process
+
+
 class Yaml(TypeDecorator):  # type: ignore[type-arg]
-    """An SQLAlchemy type for storing objects as YAML."""
+    """
+    An SQLAlchemy type for storing objects as YAML.
+
+    Only used by the migration that created the `parsed_file` table. Manuscripts are stored as `CompressedYaml` since.
+    """
 
     cache_ok = False
     impl = Text
@@ -137,17 +416,48 @@ class Yaml(TypeDecorator):  # type: ignore[type-arg]
             return None
 
 
+class CompressedYaml(Compressed):
+    """An SQLAlchemy type for storing objects as compressed YAML."""
+
+    cache_ok = False
+
+    def process_bind_param(self, obj: Any, dialect: Any) -> Any:
+        return super().process_bind_param(dump(obj), dialect)
+
+    def process_result_value(self, value: Any, dialect: Any) -> Any:
+        text = super().process_result_value(value, dialect)
+        if text:
+            return load(text, Loader=Loader)
+        else:
+            return None
+
+
 metadata = MetaData()
 
 tbl_parsed_file = Table(
     "parsed_file",
     metadata,
     Column("id", Integer, primary_key=True),
-    Column("path", Text, nullable=False),
+    # Paths are compared bytewise, as by SQLite, so that the MECA archives in a bundle form a range of the index.
+    Column(
+        "path", Text().with_variant(Text(collation="C"), "postgresql"), nullable=False
+    ),
     Column("received_at", DateTime, nullable=False),
-    Column("manuscript", Yaml, nullable=True),
+    Column("manuscript", CompressedYaml, nullable=True),
     Column("doi", Text, nullable=True),
     Column("status", Integer, nullable=True),
+    Column("sha256", Text, nullable=True),
+    Column("parser_version", Integer, nullable=True),
+    Column("pruned_at", DateTime, nullable=True),
+    Index("ix_parsed_file_received_at", "received_at"),
+    Index("ix_parsed_file_sha256_parser_version", "sha256", "parser_version"),
+    Index("ix_parsed_file_pruned_at", "pruned_at"),
+    # Finds files and the MECA archives in a bundle by path.
+    Index("ix_parsed_file_path", "path"),
+    # Finds duplicates of a MECA archive by its preprint DOI.
+    Index("ix_parsed_file_doi", "doi"),
+    # Counts files per status, and finds files ready for deposition by age, without reading the manuscripts.
+    Index("ix_parsed_file_status_received_at", "status", "received_at"),
 )
 mapper_registry.map_imperatively(ParsedFile, tbl_parsed_file)
 
@@ -156,11 +466,19 @@ tbl_deposition_attempt = Table(
     metadata,
     Column("id", Integer, primary_key=True),
     Column("id_parsed_file", ForeignKey("parsed_file.id")),
-    Column("deposition", Text),
+    Column("deposition", Compressed),
     Column("verification_failed", Boolean),
     Column("attempted_at", DateTime),
     Column("succeeded", Boolean),
     Column("status", Integer, nullable=True),
+    # Finds the (latest) attempts of a parsed file without scanning all attempts.
+    Index(
+        "ix_deposition_attempt_id_parsed_file_attempted_at",
+        "id_parsed_file",
+        "attempted_at",
+    ),
+    Index("ix_deposition_attempt_status", "status"),
+    Index("ix_deposition_attempt_attempted_at_status", "attempted_at", "status"),
 )
 mapper_registry.map_imperatively(
     DepositionAttempt,
@@ -174,16 +492,229 @@ tbl_used_dois = Table(
     Column("doi", Text, primary_key=True),
     Column("resource", Text, nullable=False),
     Column("claimed_at", DateTime, nullable=False),
+    Index("ix_used_dois_claimed_at", "claimed_at"),
 )
 mapper_registry.map_imperatively(UsedDoi, tbl_used_dois)
 
+tbl_file_lease = Table(
+    "file_lease",
+    metadata,
+    Column("path", Text, primary_key=True),
+    Column("staged_path", Text, nullable=False),
+    Column("worker_id", Text, nullable=False),
+    Column("claimed_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+    Index("ix_file_lease_expires_at", "expires_at"),
+)
+mapper_registry.map_imperatively(FileLease, tbl_file_lease)
+
+tbl_deposition_claim = Table(
+    "deposition_claim",
+    metadata,
+    Column("id_parsed_file", ForeignKey("parsed_file.id"), primary_key=True),
+    Column("worker_id", Text, nullable=False),
+    Column("claimed_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+)
+mapper_registry.map_imperatively(DepositionClaim, tbl_deposition_claim)
+
+tbl_seen_file = Table(
+    "seen_file",
+    metadata,
+    Column("path", Text, primary_key=True),
+    Column("size", BigInteger, nullable=False),
+    Column("mtime_ns", BigInteger, nullable=False),
+    Column("inode", BigInteger, nullable=False),
+    Column("status", Integer, nullable=False),
+    Column("seen_at", DateTime, nullable=False),
+    Index("ix_seen_file_status", "status"),
+)
+mapper_registry.map_imperatively(SeenFile, tbl_seen_file)
+
+tbl_batch_run = Table(
+    "batch_run",
+    metadata,
+    Column("id", Text, primary_key=True),
+    Column("command", Text, nullable=False),
+    Column("started_at", DateTime, nullable=False),
+    Column("seconds", Float, nullable=False),
+    Column("files", Integer, nullable=False),
+    Column("stages", JSON, nullable=False),
+    Index("ix_batch_run_command_started_at", "command", "started_at"),
+)
+mapper_registry.map_imperatively(BatchRun, tbl_batch_run)
+
+tbl_review_record = Table(
+    "review_record",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("id_parsed_file", ForeignKey("parsed_file.id"), nullable=False),
+    Column("received_at", DateTime, nullable=False),
+    Column("preprint_doi", Text, nullable=True),
+    Column("revision_id", Text, nullable=False),
+    Column("running_number", Text, nullable=True),
+    Column("doi", Text, nullable=True),
+    Column("status", Integer, nullable=True),
+    Index("ix_review_record_id_parsed_file", "id_parsed_file"),
+    Index("ix_review_record_preprint_doi", "preprint_doi"),
+    Index("ix_review_record_received_at", "received_at"),
+    Index("ix_review_record_status", "status"),
+)
+mapper_registry.map_imperatively(ReviewRecord, tbl_review_record)
+
+
+@dataclass
+class MethodTimings:
+    """Statistics about the calls of a `BatchDatabase` method."""
+
+    calls: int = 0
+    seconds: float = 0.0
+    """Total time spent in the method, including converting rows to objects, e.g. decoding manuscripts."""
+    sql_seconds: float = 0.0
+    """Time spent executing SQL statements."""
+    statements: int = 0
+    rows: int = 0
+    """Rows returned by the method or, for statements that write, affected rows as reported by the database."""
+
+
+class QueryTimings:
+    """
+    Record the duration of every SQL statement executed through an engine and log slow statements.
+
+    The statements are attributed to the `BatchDatabase` method executing them. Statements executed while one method
+    calls another are attributed to the outer method only.
+    """
+
+    def __init__(self, engine: Any, slow_query_threshold: Optional[float]) -> None:
+        self.slow_query_threshold = slow_query_threshold
+        """Statements taking longer than this many seconds are logged as warnings. None disables logging."""
+        self.methods: Dict[str, MethodTimings] = {}
+        self.slow_queries = 0
+        self._lock = Lock()
+        self._local = local()
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)  # type: ignore[no-untyped-call]
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)  # type: ignore[no-untyped-call]
+
+    @contextmanager
+    def method(self, name: str) -> Iterator[Optional[MethodTimings]]:
+        """
+        Attribute all statements executed in the `with` block to the given method.
+
+        Yields the statistics of the method, or None if the block is nested in another method.
+        """
+        if getattr(self._local, "current", None) is not None:
+            yield None
+            return
+
+        timings = MethodTimings(calls=1)
+        self._local.current = timings
+        started_at = perf_counter()
+        try:
+            yield timings
+        finally:
+            timings.seconds = perf_counter() - started_at
+            self._local.current = None
+            with self._lock:
+                total = self.methods.setdefault(name, MethodTimings())
+                total.calls += timings.calls
+                total.seconds += timings.seconds
+                total.sql_seconds += timings.sql_seconds
+                total.statements += timings.statements
+                total.rows += timings.rows
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize the recorded timings for the output of batch commands."""
+        return {
+            "db": {
+                name: {
+                    key: round(value, 4) if isinstance(value, float) else value
+                    for key, value in asdict(timings).items()
+                }
+                for name, timings in self.methods.items()
+            },
+            "slow_queries": self.slow_queries,
+        }
+
+    def _before_cursor_execute(self, conn: Any, *_: Any) -> None:
+        conn.info.setdefault("statement_started_at", []).append(perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        _parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        duration = perf_counter() - conn.info["statement_started_at"].pop()
+        rowcount = cursor.rowcount
+
+        timings = getattr(self._local, "current", None)
+        if timings is not None:
+            timings.sql_seconds += duration
+            timings.statements += 1
+            if rowcount > 0 and (
+                context.isinsert or context.isupdate or context.isdelete
+            ):
+                timings.rows += rowcount
+
+        if (
+            self.slow_query_threshold is not None
+            and duration > self.slow_query_threshold
+        ):
+            with self._lock:
+                self.slow_queries += 1
+            LOGGER.warning(
+                "Slow query (%.3f s, %s rows%s): %s",
+                duration,
+                rowcount if rowcount >= 0 else "unknown",
+                ", executemany" if executemany else "",
+                statement,
+            )
+
+
+Method = TypeVar("Method", bound=Callable[..., Any])
+
+
+def _is_in_bundle(bundle_path: str) -> Any:
+    """
+    Filter for the parsed files that are MECA archives in the bundle with the given path.
+
+    All paths that start with the bundle path and the separator sort between these and the bundle path followed by the
+    separator with its last character incremented. Unlike `LIKE 'bundle!/%'`, such a range can be looked up in the index
+    on the path.
+    """
+    lower_bound = f"{bundle_path}{BUNDLE_SEPARATOR}"
+    upper_bound = f"{lower_bound[:-1]}{chr(ord(lower_bound[-1]) + 1)}"
+    return and_(ParsedFile.path >= lower_bound, ParsedFile.path < upper_bound)
+
+
+def _timed(method: Method) -> Method:
+    """Record the timings of the decorated `BatchDatabase` method in `BatchDatabase.timings`."""
+
+    @wraps(method)
+    def timed_method(self: "BatchDatabase", *args: Any, **kwargs: Any) -> Any:
+        with self.timings.method(method.__name__) as timings:
+            result = method(self, *args, **kwargs)
+            if timings is not None and isinstance(result, list):
+                timings.rows += len(result)
+            return result
+
+    return cast(Method, timed_method)
+
 
 class BatchDatabase:
     """Store and retrieve information about processed MECAs and deposition attempts."""
 
-    def __init__(self, db_url: str) -> None:
+    def __init__(
+        self, db_url: str, slow_query_threshold: Optional[float] = None
+    ) -> None:
         self.engine = create_engine(db_url)
+        self.timings = QueryTimings(self.engine, slow_query_threshold)
+        """Timings of the statements executed by the methods of this object."""
 
+    @_timed
     def initialize(self) -> None:
         """Create all necessary tables. Does nothing if they already exist."""
         metadata.create_all(self.engine)
@@ -191,6 +722,7 @@ class BatchDatabase:
     def session(self) -> Session:
         return Session(self.engine)
 
+    @_timed
     def insert_all(self, objects: Any) -> None:
         """Insert all given objects into the database."""
         with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
@@ -199,11 +731,69 @@ class BatchDatabase:
                 # SQLAlchemy's ORM kicks in and might raise errors if modifying the passed-in objects.
                 session.add_all(deepcopy(objects))
 
+    @_timed
+    def insert_parsed_files(self, parsed_files: List[ParsedFile]) -> None:
+        """
+        Insert the given parsed files and a review record for each of their reviews and author replies.
+
+        Review records are created for files that are ready for deposition or only miss a preprint DOI.
+        """
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                inserted_files = deepcopy(parsed_files)
+                session.add_all(inserted_files)
+                session.flush()  # assigns the ids referenced by the review records
+                session.add_all(
+                    [
+                        record
+                        for parsed_file in inserted_files
+                        if parsed_file.status in [ParsedFile.Valid, ParsedFile.NoDoi]
+                        for record in _review_records(parsed_file)
+                    ]
+                )
+
+    @_timed
+    def insert_deposition_attempts(
+        self,
+        deposition_attempts: List[DepositionAttempt],
+        articles: Dict[int, Article],
+    ) -> None:
+        """
+        Insert the given deposition attempts and update the review records of the deposited files.
+
+        Args:
+            deposition_attempts: The deposition attempts to insert.
+            articles: The articles generated during the deposition attempts, keyed by the id of their parsed file. The
+                DOIs of their reviews and author replies are stored in the review records.
+        """
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                session.add_all(deepcopy(deposition_attempts))
+                for deposition_attempt in deposition_attempts:
+                    meca = deposition_attempt.meca
+                    article = articles.get(meca.id) if meca.id is not None else None
+                    dois = (
+                        _assigned_dois(meca.manuscript, article)
+                        if meca.manuscript is not None and article is not None
+                        else {}
+                    )
+                    records = session.execute(
+                        select(ReviewRecord).filter(  # type: ignore
+                            ReviewRecord.id_parsed_file == meca.id
+                        )
+                    ).scalars()
+                    for record in records:
+                        record.doi = dois.get(
+                            (record.revision_id, record.running_number)
+                        )
+                        record.status = deposition_attempt.status
+
     def _fetch_rows(self, statement: Any) -> Any:
         with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
             rows = session.execute(statement).all()
             return rows
 
+    @_timed
     def fetch_all(self, clazz: Any) -> List[Any]:
         """Fetch all objects of the given type from the database."""
         statement = select(clazz)
@@ -213,11 +803,45 @@ class BatchDatabase:
     def _fetch_parsed_files(self, statement: Any) -> List[ParsedFile]:
         return [row["ParsedFile"] for row in self._fetch_rows(statement)]
 
+    @_timed
     def fetch_parsed_files_with_doi(self, doi: str) -> List[ParsedFile]:
         return self._fetch_parsed_files(
             select(ParsedFile).filter(ParsedFile.doi == doi)  # type: ignore
         )
 
+    @_timed
+    def has_parsed_file_with_doi(self, doi: str) -> bool:
+        """
+        Whether a parsed file with the given DOI is in the database. Unlike `fetch_parsed_files_with_doi()`, this
+        doesn't read and decompress the manuscripts.
+        """
+        rows = self._fetch_rows(
+            select(ParsedFile.id).filter(ParsedFile.doi == doi).limit(1)  # type: ignore
+        )
+        return bool(rows)
+
+    @_timed
+    def fetch_parse_result_with_sha256(
+        self, sha256: str, parser_version: int
+    ) -> Optional[Tuple[Optional[int], Optional[str]]]:
+        """
+        Fetch the status and DOI of the first file with the given content hash that was parsed by the given parser
+        version, or None if there is no such file. Files that exceeded the limits of the sandbox are ignored, so that
+        their content is parsed again.
+        """
+        rows = self._fetch_rows(
+            select(ParsedFile.status, ParsedFile.doi)  # type: ignore
+            .filter(
+                ParsedFile.sha256 == sha256,
+                ParsedFile.parser_version == parser_version,
+                ParsedFile.status != ParsedFile.LimitExceeded,
+            )
+            .order_by(ParsedFile.id)
+            .limit(1)
+        )
+        return (rows[0][0], rows[0][1]) if rows else None
+
+    @_timed
     def fetch_parsed_files_with_manuscript_id(
         self, manuscript_id: str
     ) -> List[ParsedFile]:
@@ -225,6 +849,7 @@ class BatchDatabase:
             select(ParsedFile).filter(ParsedFile.path.like(f"%{manuscript_id}%"))  # type: ignore
         )
 
+    @_timed
     def fetch_parsed_files_between(
         self, after: datetime, before: datetime
     ) -> List[ParsedFile]:
@@ -238,52 +863,620 @@ class BatchDatabase:
             .order_by(ParsedFile.id)
         )
 
+    def stream_parsed_files_between(
+        self, after: datetime, before: datetime
+    ) -> Iterator[ParsedFileSummary]:
+        """
+        Yield the id, path, DOI, status and time of receipt of all parsed files in the database between the given dates,
+        as they are read from the database. Their manuscripts are not read.
+        """
+        columns = [
+            ParsedFile.id,
+            ParsedFile.path,
+            ParsedFile.doi,
+            ParsedFile.status,
+            ParsedFile.received_at,
+        ]
+        for row in self._stream_rows(
+            "stream_parsed_files_between",
+            select(*columns)  # type: ignore
+            .filter(
+                ParsedFile.received_at > after,
+                ParsedFile.received_at < before,
+            )
+            .order_by(ParsedFile.id),
+        ):
+            yield ParsedFileSummary(*row)
+
+    @_timed
+    def count_parsed_files_by_status(
+        self, after: Optional[datetime] = None, before: Optional[datetime] = None
+    ) -> Dict[Optional[int], int]:
+        """
+        Count the parsed files in the database between the given dates per status, or all parsed files if no dates are
+        given. Without dates, the files are counted on the index on their status alone.
+        """
+        criteria = []
+        if after is not None:
+            criteria.append(ParsedFile.received_at > after)
+        if before is not None:
+            criteria.append(ParsedFile.received_at < before)
+        return {
+            row[0]: row[1]
+            for row in self._fetch_rows(
+                select(ParsedFile.status, func.count())  # type: ignore
+                .filter(*criteria)
+                .group_by(ParsedFile.status)
+            )
+        }
+
+    @_timed
     def get_files_ready_for_deposition(
         self, after: datetime, before: datetime
     ) -> List[ParsedFile]:
         """Fetch all parsed files in the database that are ready to be deposited."""
-        ids_parsed_files_with_deposition_attempt = select(DepositionAttempt.id_parsed_file)  # type: ignore
         return self._fetch_parsed_files(
             select(ParsedFile)  # type: ignore
-            .filter(
-                ParsedFile.received_at > after,
-                ParsedFile.received_at < before,
-                ParsedFile.id.not_in(ids_parsed_files_with_deposition_attempt),  # type: ignore
-                ParsedFile.status == ParsedFile.Valid,
-            )
+            .filter(*self._ready_for_deposition(after, before))
             .order_by(ParsedFile.id)
         )
 
+    @_timed
     def get_files_to_retry_deposition(
         self, after: datetime, before: datetime
     ) -> List[ParsedFile]:
-        """Fetch all parsed files in the database that are ready to be deposited."""
-        ids_parsed_files_with_failed_deposition_attempts = text(
-            "SELECT id_parsed_file "
-            "FROM ("
-            "  SELECT id_parsed_file, MAX(attempted_at) "
-            "  FROM deposition_attempt "
-            "  GROUP BY id_parsed_file "
-            f" HAVING status={DepositionAttempt.Failed} "
-            f"     OR status={DepositionAttempt.VerificationFailed} "
-            ")"
-        )
+        """Fetch all parsed files in the database whose latest deposition attempt failed."""
         return self._fetch_parsed_files(
             select(ParsedFile)  # type: ignore
+            .filter(*self._to_retry_deposition(after, before))
+            .order_by(ParsedFile.id)
+        )
+
+    @contextmanager
+    def claim_files_for_deposition(
+        self,
+        after: datetime,
+        before: datetime,
+        retry_failed: bool = False,
+        lease_seconds: float = 86400,
+        worker_id: Optional[str] = None,
+    ) -> Iterator[List[ParsedFile]]:
+        """
+        Claim the parsed files that are ready to be deposited for the duration of the `with` block.
+
+        Selects the same files as `get_files_ready_for_deposition()`, or `get_files_to_retry_deposition()` if
+        `retry_failed` is True, except those that another worker has claimed. The claims are recorded as
+        `DepositionClaim`s in a short transaction and deleted when the block exits, so that no transaction is open and
+        no row is locked while the files are deposited. Claims that are not deleted, e.g. because the worker crashed,
+        expire after `lease_seconds`, which must be longer than the longest deposit run. `worker_id` identifies the
+        worker in the claims and defaults to the host name and the process ID.
+
+        The ID of the parsed file is the primary key of the claims, so of multiple workers concurrently claiming the
+        same file at most one succeeds. On databases with row-level locking such as PostgreSQL, the files are selected
+        with `SELECT ... FOR NO KEY UPDATE SKIP LOCKED`, and files that another worker is claiming at the same time are
+        skipped. SQLite has no row-level locks and ignores the locking clause. There, all but one of the concurrently
+        claiming workers fail with an error.
+
+        Example:
+            with db.claim_files_for_deposition(after, before) as files:
+                deposit(files, db, dry_run=False)
+        """
+        criteria = (
+            self._to_retry_deposition(after, before)
+            if retry_failed
+            else self._ready_for_deposition(after, before)
+        )
+        claimed_at = datetime.now()
+        is_claimed = (
+            exists()
+            .where(tbl_deposition_claim.c.id_parsed_file == ParsedFile.id)
+            .where(tbl_deposition_claim.c.expires_at > claimed_at)
+        )
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                with self.timings.method("claim_files_for_deposition"):
+                    claimed_files = self._lock_files(session, [*criteria, ~is_claimed])
+                    ids = [f.id for f in claimed_files]
+                    # Claims that other workers have let expire are replaced.
+                    for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE):
+                        end = start + IN_CLAUSE_CHUNK_SIZE
+                        session.execute(
+                            delete(DepositionClaim).where(  # type: ignore
+                                DepositionClaim.id_parsed_file.in_(ids[start:end])  # type: ignore
+                            )
+                        )
+                    claims = [
+                        DepositionClaim(
+                            id_parsed_file=cast(int, f.id),
+                            worker_id=worker_id or f"{gethostname()}:{getpid()}",
+                            claimed_at=claimed_at,
+                            expires_at=claimed_at + timedelta(seconds=lease_seconds),
+                        )
+                        for f in claimed_files
+                    ]
+                    # The inserted claims count as the rows of this method.
+                    session.add_all(claims)
+                    session.flush()
+
+                # Detach the files so that they stay usable after the transaction ends.
+                session.expunge_all()
+
+        try:
+            yield claimed_files
+        finally:
+            self.release_deposition_claims(claims)
+
+    @_timed
+    def release_deposition_claims(self, claims: List[DepositionClaim]) -> None:
+        """
+        Delete the given claims. A claim that another worker has made on the same file after the given one expired is
+        kept.
+        """
+        ids = [claim.id_parsed_file for claim in claims]
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE):
+                    end = start + IN_CLAUSE_CHUNK_SIZE
+                    session.execute(
+                        delete(DepositionClaim).where(  # type: ignore
+                            DepositionClaim.id_parsed_file.in_(ids[start:end]),  # type: ignore
+                            DepositionClaim.worker_id.in_(  # type: ignore
+                                {claim.worker_id for claim in claims}
+                            ),
+                            DepositionClaim.claimed_at.in_(  # type: ignore
+                                {claim.claimed_at for claim in claims}
+                            ),
+                        )
+                    )
+
+    def _lock_files(self, session: Session, criteria: List[Any]) -> List[ParsedFile]:
+        locked_files = [
+            row["ParsedFile"]
+            for row in session.execute(
+                select(ParsedFile)  # type: ignore
+                .filter(*criteria)
+                .order_by(ParsedFile.id)
+                .with_for_update(skip_locked=True, key_share=True, of=ParsedFile)
+            ).all()
+        ]
+
+        # Another worker may have finished depositing one of these files after our query started but before
+        # we acquired its lock. Re-evaluating the criteria on the locked rows sees all committed attempts.
+        if locked_files:
+            ids_still_eligible = set(
+                session.execute(
+                    select(ParsedFile.id).filter(  # type: ignore
+                        ParsedFile.id.in_([f.id for f in locked_files]),  # type: ignore
+                        *criteria,
+                    )
+                ).scalars()
+            )
+            locked_files = [f for f in locked_files if f.id in ids_still_eligible]
+        return locked_files
+
+    def _ready_for_deposition(self, after: datetime, before: datetime) -> List[Any]:
+        has_deposition_attempt = exists().where(
+            tbl_deposition_attempt.c.id_parsed_file == ParsedFile.id
+        )
+        return [
+            ParsedFile.received_at > after,
+            ParsedFile.received_at < before,
+            ~has_deposition_attempt,
+            ParsedFile.status == ParsedFile.Valid,
+        ]
+
+    def _to_retry_deposition(self, after: datetime, before: datetime) -> List[Any]:
+        # Look up the latest attempt of each candidate file. The index on (id_parsed_file, attempted_at) finds it
+        # directly, so the cost grows with the number of candidates rather than with the history of all attempts.
+        status_of_latest_attempt = (
+            select(tbl_deposition_attempt.c.status)  # type: ignore
+            .filter(tbl_deposition_attempt.c.id_parsed_file == ParsedFile.id)
+            .order_by(
+                tbl_deposition_attempt.c.attempted_at.desc(),
+                tbl_deposition_attempt.c.id.desc(),
+            )
+            .limit(1)
+            .scalar_subquery()
+        )
+        return [
+            ParsedFile.received_at > after,
+            ParsedFile.received_at < before,
+            status_of_latest_attempt.in_(
+                [DepositionAttempt.Failed, DepositionAttempt.VerificationFailed]
+            ),
+        ]
+
+    @_timed
+    def fetch_review_records_between(
+        self, after: datetime, before: datetime
+    ) -> List[ReviewRecord]:
+        """Fetch the review records of all files in the database received between the given dates."""
+        return [
+            row[0]
+            for row in self._fetch_rows(
+                select(ReviewRecord)  # type: ignore
+                .filter(
+                    ReviewRecord.received_at > after,
+                    ReviewRecord.received_at < before,
+                )
+                .order_by(ReviewRecord.id)
+            )
+        ]
+
+    def stream_review_records_between(
+        self, after: datetime, before: datetime
+    ) -> Iterator[ReviewRecord]:
+        """Yield the review records of all files in the database received between the given dates as they are read."""
+        for row in self._stream_rows(
+            "stream_review_records_between",
+            select(ReviewRecord)  # type: ignore
             .filter(
-                ParsedFile.received_at > after,
-                ParsedFile.received_at < before,
-                ParsedFile.id.in_(ids_parsed_files_with_failed_deposition_attempts),  # type: ignore
+                ReviewRecord.received_at > after,
+                ReviewRecord.received_at < before,
             )
-            .order_by(ParsedFile.id)
+            .order_by(ReviewRecord.id),
+        ):
+            yield row[0]
+
+    @_timed
+    def count_review_records_by_status(
+        self, after: datetime, before: datetime
+    ) -> Dict[Optional[int], int]:
+        """
+        Count the review records of all files in the database received between the given dates per the status of their
+        latest deposition attempt. Review records without deposition attempt are counted under None.
+        """
+        return {
+            row[0]: row[1]
+            for row in self._fetch_rows(
+                select(ReviewRecord.status, func.count())  # type: ignore
+                .filter(
+                    ReviewRecord.received_at > after,
+                    ReviewRecord.received_at < before,
+                )
+                .group_by(ReviewRecord.status)
+            )
+        }
+
+    @_timed
+    def count_parsed_files_per_day(
+        self, after: datetime, before: datetime
+    ) -> Dict[str, int]:
+        """Count the files received between the given dates per day, which is given in ISO format."""
+        day = func.date(ParsedFile.received_at)
+        return {
+            str(row[0]): row[1]
+            for row in self._fetch_rows(
+                select(day, func.count())  # type: ignore
+                .filter(
+                    ParsedFile.received_at > after,
+                    ParsedFile.received_at < before,
+                )
+                .group_by(day)
+            )
+        }
+
+    @_timed
+    def count_deposition_attempts_by_status(self) -> Dict[Optional[int], int]:
+        """Count all deposition attempts in the database per status."""
+        return {
+            row[0]: row[1]
+            for row in self._fetch_rows(
+                select(DepositionAttempt.status, func.count()).group_by(  # type: ignore
+                    tbl_deposition_attempt.c.status
+                )
+            )
+        }
+
+    @_timed
+    def count_deposition_attempts_per_day(
+        self, after: datetime, before: datetime
+    ) -> Dict[str, Dict[Optional[int], int]]:
+        """Count the deposition attempts between the given dates per day, which is given in ISO format, and status."""
+        attempted_at = tbl_deposition_attempt.c.attempted_at
+        status = tbl_deposition_attempt.c.status
+        day = func.date(attempted_at)
+        result: Dict[str, Dict[Optional[int], int]] = {}
+        for row in self._fetch_rows(
+            select(day, status, func.count())  # type: ignore
+            .filter(attempted_at > after, attempted_at < before)
+            .group_by(day, status)
+        ):
+            result.setdefault(str(row[0]), {})[row[1]] = row[2]
+        return result
+
+    @_timed
+    def fetch_backlog_percentiles(
+        self, percentiles: Sequence[int], before: datetime
+    ) -> Tuple[int, Dict[int, datetime]]:
+        """
+        Return the number of files received before the given date that are ready for deposition, and the time of receipt
+        of the file at each of the given percentiles, 1 to 100, of their age. 100 is the oldest file.
+
+        The file at percentile p is the one at rank ceil(p * n / 100) of the n files, counted from the youngest one.
+        PostgreSQL finds these files with `percentile_disc` in the same pass that counts the files. Other databases
+        count the files and find the oldest one in one pass, and then walk the index on status and time of receipt once
+        from the youngest file, skipping with an offset from the file at one percentile to the file at the next one.
+        """
+        received_at = tbl_parsed_file.c.received_at
+        criteria = self._ready_for_deposition(datetime(1, 1, 1), before)
+        percentiles = sorted(set(percentiles))
+        if self.engine.dialect.name == "postgresql":
+            [row] = self._fetch_rows(
+                select(  # type: ignore
+                    func.count(),
+                    *[
+                        func.percentile_disc(percentile / 100).within_group(
+                            received_at.desc()
+                        )
+                        for percentile in percentiles
+                    ],
+                ).filter(*criteria)
+            )
+            if not row[0]:
+                return 0, {}
+            return row[0], dict(zip(percentiles, row[1:]))
+
+        [(total, oldest)] = self._fetch_rows(
+            select(func.count(), func.min(received_at)).filter(*criteria)  # type: ignore
         )
+        if not total:
+            return 0, {}
+        file_id = tbl_parsed_file.c.id
+        received_at_by_percentile = {}
+        previous_rank, previous_file = 0, cast(Any, None)
+        for percentile in percentiles:
+            rank = -(-percentile * total // 100)
+            if rank == total:
+                received_at_by_percentile[percentile] = oldest
+                continue
+            if rank > previous_rank:
+                if previous_file is not None:
+                    # Continue after the previous file, ordering files received at the same time by id. Bounding the
+                    # time of receipt lets the database start there in the index rather than at the youngest file.
+                    previous_received_at, previous_id = previous_file
+                    criteria = [
+                        *self._ready_for_deposition(
+                            datetime(1, 1, 1),
+                            previous_received_at + timedelta(microseconds=1),
+                        ),
+                        or_(received_at < previous_received_at, file_id < previous_id),
+                    ]
+                [previous_file] = self._fetch_rows(
+                    select(received_at, file_id)  # type: ignore
+                    .filter(*criteria)
+                    .order_by(received_at.desc(), file_id.desc())
+                    .offset(rank - previous_rank - 1)
+                    .limit(1)
+                )
+                previous_rank = rank
+            received_at_by_percentile[percentile] = previous_file[0]
+        return total, received_at_by_percentile
 
+    @_timed
+    def count_used_dois(self) -> int:
+        """Count all used DOIs."""
+        [(count,)] = self._fetch_rows(select(func.count()).select_from(tbl_used_dois))
+        return int(count)
+
+    @_timed
+    def count_used_dois_per_year(self) -> Dict[int, int]:
+        """
+        Count the used DOIs per year in which they were claimed. Each year is counted by a range query on the index on
+        the time of claiming, so the DOIs are not read.
+        """
+        claimed_at = tbl_used_dois.c.claimed_at
+        # Separate statements, as SQLite only looks up a lone min() or max() in the index.
+        [(first,)] = self._fetch_rows(select(func.min(claimed_at)))
+        [(last,)] = self._fetch_rows(select(func.max(claimed_at)))
+        if first is None:
+            return {}
+        counts = {}
+        for year in range(first.year, last.year + 1):
+            [(count,)] = self._fetch_rows(
+                select(func.count()).filter(  # type: ignore
+                    claimed_at >= datetime(year, 1, 1),
+                    claimed_at < datetime(year + 1, 1, 1),
+                )
+            )
+            if count:
+                counts[year] = count
+        return counts
+
+    def _stream_rows(self, method_name: str, statement: Any) -> Iterator[Any]:
+        # Rows are fetched in batches as they are consumed. Only executing the statement is timed, as the time spent
+        # between batches is mostly spent by the consumer.
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with self.timings.method(method_name):
+                result = session.execute(
+                    statement.execution_options(stream_results=True)
+                )
+            yield from result.yield_per(STREAM_BATCH_SIZE)
+
+    @_timed
     def mark_doi_as_used(self, doi: str, resource: str) -> None:
+        """
+        Reserve the given DOI for the given resource.
+
+        Raises an IntegrityError if the DOI is already reserved. The DOI is the primary key of its table, so of multiple
+        workers concurrently reserving the same DOI exactly one succeeds.
+        """
         used_doi = UsedDoi(doi=doi, resource=resource, claimed_at=datetime.now())
         with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
             with session.begin():
                 session.add(deepcopy(used_doi))
 
+    @_timed
+    def acquire_lease(self, lease: FileLease) -> bool:
+        """
+        Record the given lease unless another worker holds a lease on the same path. Returns whether it was recorded.
+
+        The path is the primary key of the lease table, so of multiple workers concurrently leasing the same path
+        exactly one succeeds.
+        """
+        try:
+            with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+                with session.begin():
+                    session.add(deepcopy(lease))
+        except IntegrityError:
+            return False
+        return True
+
+    @_timed
+    def release_leases(self, leases: List[FileLease]) -> None:
+        """
+        Delete the given leases. They are identified by their staged paths, so that a lease that another worker has
+        since acquired on the same path in the input directory is kept.
+        """
+        staged_paths = [lease.staged_path for lease in leases]
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                for start in range(0, len(staged_paths), IN_CLAUSE_CHUNK_SIZE):
+                    end = start + IN_CLAUSE_CHUNK_SIZE
+                    session.execute(
+                        delete(FileLease).where(  # type: ignore
+                            FileLease.staged_path.in_(staged_paths[start:end])  # type: ignore
+                        )
+                    )
+
+    @_timed
+    def fetch_expired_leases(self, now: datetime) -> List[FileLease]:
+        """Fetch the leases that expired before the given time, oldest first."""
+        return [
+            row[0]
+            for row in self._fetch_rows(
+                select(FileLease)  # type: ignore
+                .filter(FileLease.expires_at < now)
+                .order_by(FileLease.claimed_at)
+            )
+        ]
+
+    @_timed
+    def has_parsed_file(self, path: str) -> bool:
+        """
+        Whether a parsed file with the given path, or a MECA archive in a bundle with the given path, is in the
+        database.
+        """
+        rows = self._fetch_rows(
+            select(ParsedFile.id)  # type: ignore
+            .filter(or_(ParsedFile.path == path, _is_in_bundle(path)))
+            .limit(1)
+        )
+        return bool(rows)
+
+    @_timed
+    def fetch_unpruned_files(
+        self, paths: Optional[Sequence[str]] = None
+    ) -> List[Tuple[int, str]]:
+        """
+        Fetch the ids and paths of all parsed files that have not been pruned yet, ordered by id.
+
+        If `paths` is given, only those of parsed files with one of these paths, or of MECA archives in a bundle with
+        one of these paths, are fetched.
+        """
+        if paths is None:
+            rows = self._fetch_rows(
+                select(ParsedFile.id, ParsedFile.path)  # type: ignore
+                .filter(ParsedFile.pruned_at.is_(None))  # type: ignore[union-attr]
+                .order_by(ParsedFile.id)
+            )
+        else:
+            # Pruned files are left out after the query rather than in it, as the database would otherwise look up the
+            # unpruned files in the index on `pruned_at` and compare each of them with all paths.
+            query: Any = select(
+                ParsedFile.id, ParsedFile.path, ParsedFile.pruned_at  # type: ignore
+            )
+            rows = []
+            for start in range(0, len(paths), IN_CLAUSE_CHUNK_SIZE):
+                end = start + IN_CLAUSE_CHUNK_SIZE
+                rows.extend(
+                    row
+                    for row in self._fetch_rows(
+                        query.filter(
+                            or_(
+                                ParsedFile.path.in_(paths[start:end]),  # type: ignore
+                                *map(_is_in_bundle, paths[start:end]),
+                            )
+                        )
+                    )
+                    if row[2] is None
+                )
+            rows.sort(key=lambda row: row[0])
+        return [(row[0], row[1]) for row in rows]
+
+    @_timed
+    def mark_as_pruned(self, ids: List[int], pruned_at: datetime) -> None:
+        """Set the time when the parsed files with the given ids were pruned, in a single transaction."""
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE):
+                    end = start + IN_CLAUSE_CHUNK_SIZE
+                    session.execute(
+                        update(ParsedFile)  # type: ignore
+                        .where(ParsedFile.id.in_(ids[start:end]))  # type: ignore
+                        .values(pruned_at=pruned_at)
+                    )
+
+    @_timed
+    def fetch_seen_files(self, prefix: str, status: int) -> List[SeenFile]:
+        """Fetch the seen files with the given status whose paths start with the given prefix."""
+        return [
+            row[0]
+            for row in self._fetch_rows(
+                select(SeenFile).filter(  # type: ignore
+                    SeenFile.path.startswith(prefix, autoescape=True),  # type: ignore[call-arg]
+                    SeenFile.status == status,
+                )
+            )
+        ]
+
+    @_timed
+    def record_seen_files(
+        self, seen_files: List[SeenFile], forget: Sequence[str] = ()
+    ) -> None:
+        """
+        Record the given seen files, replacing what was recorded before for the same paths, and delete what was
+        recorded for the paths in `forget`.
+        """
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                self._delete_seen_files(
+                    session, [*forget, *(f.path for f in seen_files)]
+                )
+                session.add_all(deepcopy(seen_files))
+
+    @_timed
+    def forget_seen_files(self, paths: Sequence[str]) -> None:
+        """Delete what was recorded for the given paths."""
+        with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
+            with session.begin():
+                self._delete_seen_files(session, paths)
+
+    def _delete_seen_files(self, session: Session, paths: Sequence[str]) -> None:
+        # Bounded chunks keep the number of bound parameters below the limits of the database.
+        for start in range(0, len(paths), IN_CLAUSE_CHUNK_SIZE):
+            end = start + IN_CLAUSE_CHUNK_SIZE
+            session.execute(
+                delete(SeenFile).where(SeenFile.path.in_(paths[start:end]))  # type: ignore
+            )
+
+    @_timed
+    def fetch_prunable_paths(self) -> List[str]:
+        """
+        Fetch the paths of the archived files that may be pruned, i.e. all files that were moved out of the input
+        directory except those that are still leased by a parse worker.
+        """
+        is_leased = exists().where(tbl_file_lease.c.staged_path == SeenFile.path)
+        return [
+            row[0]
+            for row in self._fetch_rows(
+                select(SeenFile.path)  # type: ignore
+                .filter(SeenFile.status == SeenFile.Archived, ~is_leased)
+                .order_by(SeenFile.path)
+            )
+        ]
+
+    @_timed
     def update_preprint_doi(self, parsed_file: ParsedFile, doi: str) -> None:
         with self.session() as session:  # type: ignore[attr-defined] # it does have this attribute
             with session.begin():
@@ -298,3 +1491,11 @@ class BatchDatabase:
                 if updated_file.status == ParsedFile.NoDoi:
                     updated_file.status = ParsedFile.Valid
                 session.add(updated_file)
+
+                records = session.execute(
+                    select(ReviewRecord).filter(  # type: ignore
+                        ReviewRecord.id_parsed_file == updated_file.id
+                    )
+                ).scalars()
+                for record in records:
+                    record.preprint_doi = doi
@@ -1,15 +1,24 @@
 """Handles the creation of random DOIs and tries to ensure they are not reused."""
 
-__all__ = ["get_random_doi", "get_free_doi"]
+__all__ = ["DOIS_PER_YEAR", "get_random_doi", "get_free_doi", "has_year"]
 
 from datetime import datetime
 from secrets import choice
 from sqlalchemy.exc import IntegrityError
 from string import digits, Template
 
-from mecadoi.config import DOI_TEMPLATE
+from mecadoi import config
 from mecadoi.db import BatchDatabase
 
+RANDOM_PART_LENGTH = 6
+"""The number of random digits in a DOI."""
+
+DOIS_PER_YEAR = len(digits) ** RANDOM_PART_LENGTH
+"""
+The number of distinct DOIs per year, as the year is part of the DOI. If the DOI template doesn't contain the year, this
+is the number of distinct DOIs altogether.
+"""
+
 
 def get_free_doi(doi_db: BatchDatabase, resource: str) -> str:
     """
@@ -20,8 +29,8 @@ def get_free_doi(doi_db: BatchDatabase, resource: str) -> str:
     and a string of 6 random digits, respectively. For example, the template "10.15252/rc.$year$random" produces DOIs
     like "10.15252/rc.2022123456".
 
-    The DOI that this function returns is stored, with the given resource and a timestamp, in the DOI database. It's
-    an sqlite3 database located at the path set in the DOI_DB_FILE configuration parameter.
+    The DOI that this function returns is stored, with the given resource and a timestamp, in the given database.
+    Storing it fails if another process already reserved the same DOI, so concurrent callers never get the same DOI.
 
     IMPORTANT: wether a DOI is unused depends solely on wether it has already been marked as used in the currently
     configured DOI database. Therefore, if the database or its contents are modified, or a different database is
@@ -50,7 +59,15 @@ def get_free_doi(doi_db: BatchDatabase, resource: str) -> str:
 def get_random_doi() -> str:
     # create the random part of the DOI: a string of 6 random digits
     population = digits
-    k = 6
+    k = RANDOM_PART_LENGTH
     random_part = "".join([choice(population) for i in range(k)])
     year = str(datetime.now().year)
-    return Template(DOI_TEMPLATE).substitute(year=year, random=random_part)
+    return Template(config.DOI_TEMPLATE).substitute(year=year, random=random_part)
+
+
+def has_year(template: str) -> bool:
+    """Whether the given DOI template contains the "year" parameter, i.e. whether DOIs may repeat across years."""
+    return any(
+        "year" in (match.group("named"), match.group("braced"))
+        for match in Template.pattern.finditer(template)
+    )
@@ -1,4 +1,4 @@
-import requests
+from requests import Session
 from typing import List, Optional, TypedDict, cast
 
 
@@ -61,7 +61,11 @@ class Article(TypedDict):
     highlighted_entities: List[str]
 
 
+# The session keeps connections to the EEB API open between requests, e.g. in a long-running `batch watch` process.
+SESSION = Session()
+
+
 def get_articles(doi: str) -> List[Article]:
     return cast(
-        List[Article], requests.get(f"https://eeb.embo.org/api/v1/doi/{doi}").json()
+        List[Article], SESSION.get(f"https://eeb.embo.org/api/v1/doi/{doi}").json()
     )
@@ -0,0 +1,313 @@
+"""
+Claim files from an input directory that several parse workers drain concurrently.
+
+A worker claims a file by recording a lease on it in the batch database and then renaming it to its own directory.
+Renaming within a file system is atomic, also on network file systems shared by several nodes, so of multiple workers
+claiming the same file, only one finds it in the input directory. The lease keeps other workers from claiming the same
+path in the meantime, and it allows them to return the file to the input directory if its worker crashes before it has
+finished parsing the file.
+
+Files are claimed one by one, so a worker never moves a directory that another process is still writing to. Files
+that are still being written are not claimed at all, see `Inbox.select_complete()`, and hidden files are ignored.
+
+The state of files that were found to be incomplete, and of the files that were moved out of the input directory, is
+recorded in the batch database as `SeenFile`s. Incomplete files are only examined again once they have changed, and the
+moved files can be pruned without checking every path in the database for whether it still exists.
+"""
+
+__all__ = ["Inbox", "TEMPORARY_NAME_PATTERNS"]
+
+from datetime import datetime, timedelta
+from errno import EXDEV
+from fnmatch import fnmatch
+from logging import getLogger
+from os import getpid, makedirs, rename, SEEK_END
+from os.path import basename, dirname, exists, isdir, join, relpath
+from shutil import move
+from socket import gethostname
+from typing import Callable, Dict, List, Optional
+
+from mecadoi.db import BatchDatabase, FileLease, SeenFile
+from mecadoi.watch import find_candidates, get_snapshot, Snapshot
+
+LOGGER = getLogger(__name__)
+
+TEMPORARY_NAME_PATTERNS = [
+    "*.part",
+    "*.partial",
+    "*.filepart",
+    "*.crdownload",
+    "*.tmp",
+    "*~",
+]
+"""
+Names of files that are still being uploaded, e.g. `<name>.filepart` by WinSCP. Hidden files, such as the temporary
+files of rsync and Pure-FTPd, are not found in the input directory in the first place, see `find_candidates`.
+"""
+
+ZIP_LOCAL_FILE_HEADER = b"PK\x03\x04"
+ZIP_END_OF_CENTRAL_DIRECTORY = b"PK\x05\x06"
+ZIP_END_OF_CENTRAL_DIRECTORY_MAX_SIZE = 22 + 0xFFFF
+"""The size of the end of central directory record with a comment of the maximum length."""
+
+TAR_BLOCK_SIZE = 512
+
+
+class Inbox:
+    """
+    The input directory of parse workers.
+
+    Workers must refer to the input directory by the same path, as the leases are recorded by path.
+    """
+
+    def __init__(
+        self,
+        input_dir: str,
+        db: BatchDatabase,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 3600,
+        min_age: float = 0,
+        max_wait: float = 86400,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.input_dir = input_dir
+        self.db = db
+        self.worker_id = worker_id or f"{gethostname()}:{getpid()}"
+        """Identifies this worker in the leases. Defaults to the host name and the process ID."""
+        self.lease_seconds = lease_seconds
+        """The time after which other workers consider files that this worker has not released as abandoned."""
+        self.min_age = min_age
+        """The time in seconds since their last modification after which files may be complete."""
+        self.max_wait = max_wait
+        """
+        The time in seconds since their last modification after which files are considered complete even if they don't
+        look like it, so that they are registered as invalid instead of remaining in the input directory unnoticed.
+        """
+        self._clock = clock
+
+    def discover(self) -> List[str]:
+        """Find the files and extracted MECA archives in the input directory that seem to be completely written."""
+        return self.select_complete(find_candidates(self.input_dir), listing=True)
+
+    def select_complete(
+        self, candidates: Dict[str, Snapshot], listing: bool = False
+    ) -> List[str]:
+        """
+        Return the paths of the candidates that seem to be completely written, in sorted order.
+
+        A file is still being written if it was modified less than `min_age` seconds ago, if its name matches one of the
+        `TEMPORARY_NAME_PATTERNS`, or if it's a ZIP or uncompressed TAR file that doesn't end like one. Only the end of
+        the file is read for the latter check, and only if the file has changed since it was last found incomplete.
+        Directories are only checked by their name and the time of their latest modification.
+
+        If `listing` is True, `candidates` are all files in the input directory, and what was recorded about files that
+        are no longer there is deleted.
+        """
+        now = self._clock()
+        now_ns = int(now.timestamp() * 1e9)
+        known_incomplete = {
+            seen_file.path: seen_file
+            for seen_file in self.db.fetch_seen_files(
+                join(self.input_dir, ""), SeenFile.Incomplete
+            )
+        }
+        selected = []
+        incomplete = []
+        for path, snapshot in sorted(candidates.items()):
+            age = (now_ns - snapshot.mtime_ns) / 1e9
+            if age >= self.max_wait:
+                selected.append(path)
+                continue
+            if age < self.min_age:
+                LOGGER.info(
+                    'Leaving "%s" for the next pass: modified %.0f s ago', path, age
+                )
+                continue
+            known = known_incomplete.get(path)
+            if known is not None and _get_snapshot_of_seen_file(known) == snapshot:
+                LOGGER.debug('"%s" is still incomplete', path)
+                continue
+            reason = _why_incomplete(path)
+            if reason is None:
+                selected.append(path)
+                continue
+            LOGGER.info('Leaving "%s" for the next pass: %s', path, reason)
+            incomplete.append(_new_seen_file(path, snapshot, SeenFile.Incomplete, now))
+
+        gone = (
+            [path for path in known_incomplete if path not in candidates]
+            if listing
+            else []
+        )
+        if incomplete or gone:
+            self.db.record_seen_files(incomplete, forget=gone)
+        return selected
+
+    def claim(self, paths: List[str], staging_dir: str) -> List[FileLease]:
+        """
+        Move the given files or directories from the input directory to the same relative path in `staging_dir`, which
+        must not be shared with other workers. Paths that another worker has claimed first are skipped.
+
+        Returns the leases on the claimed paths, which must be released once their files are parsed.
+        """
+        claimed_at = self._clock()
+        expires_at = claimed_at + timedelta(seconds=self.lease_seconds)
+        leases = []
+        for path in paths:
+            lease = FileLease(
+                path=path,
+                staged_path=join(staging_dir, relpath(path, self.input_dir)),
+                worker_id=self.worker_id,
+                claimed_at=claimed_at,
+                expires_at=expires_at,
+            )
+            if not self.db.acquire_lease(lease):
+                LOGGER.debug('"%s" is claimed by another worker', path)
+                continue
+            try:
+                _move(path, lease.staged_path)
+            except FileNotFoundError:
+                # Another worker has claimed and released the file since it was listed.
+                LOGGER.debug('"%s" has been claimed by another worker', path)
+                self.db.release_leases([lease])
+                continue
+            except OSError as e:
+                LOGGER.warning('Claiming "%s" failed with "%s"', path, str(e))
+                self.db.release_leases([lease])
+                continue
+            leases.append(lease)
+
+        if leases:
+            self.db.record_seen_files(
+                [
+                    _new_seen_file(
+                        lease.staged_path,
+                        get_snapshot(lease.staged_path),
+                        SeenFile.Archived,
+                        claimed_at,
+                    )
+                    for lease in leases
+                ],
+                forget=[lease.path for lease in leases],
+            )
+        return leases
+
+    def release(
+        self, leases: List[FileLease], return_unregistered: bool = False
+    ) -> None:
+        """
+        Release the given leases, after their files have been parsed and registered in the batch database.
+
+        With `return_unregistered`, e.g. because parsing the files failed, the files that have not been registered are
+        returned to the input directory first, so that they are parsed again.
+        """
+        if return_unregistered:
+            for lease in leases:
+                if self._return_unless_registered(lease):
+                    LOGGER.info('Returned "%s" to the input directory', lease.path)
+        if leases:
+            self.db.release_leases(leases)
+
+    def recover_expired_leases(self) -> List[str]:
+        """
+        Return files whose leases have expired to the input directory unless they have already been registered in the
+        batch database, and release their leases. Returns the paths of the returned files.
+        """
+        recovered = []
+        for lease in self.db.fetch_expired_leases(self._clock()):
+            if self._return_unless_registered(lease):
+                LOGGER.info(
+                    'Lease of worker "%s" on "%s" expired. Returned it to the input directory',
+                    lease.worker_id,
+                    lease.path,
+                )
+                recovered.append(lease.path)
+            self.db.release_leases([lease])
+        return recovered
+
+    def _return_unless_registered(self, lease: FileLease) -> bool:
+        """
+        Move the file of the given lease back to the input directory unless it has been registered in the batch
+        database. Returns whether it was moved.
+        """
+        if self.db.has_parsed_file(lease.staged_path):
+            return False  # the worker crashed after registering the file
+        if not exists(lease.staged_path):
+            LOGGER.warning(
+                'Cannot return "%s", as "%s" no longer exists',
+                lease.path,
+                lease.staged_path,
+            )
+            return False
+        if exists(lease.path):
+            LOGGER.warning(
+                'Cannot return "%s", as it has been replaced. Leaving it at "%s"',
+                lease.path,
+                lease.staged_path,
+            )
+            return False
+        try:
+            _move(lease.staged_path, lease.path)
+            return True
+        except FileNotFoundError:
+            return False  # another worker has returned it
+        finally:
+            self.db.forget_seen_files([lease.staged_path])
+
+
+def _move(source: str, target: str) -> None:
+    makedirs(dirname(target), exist_ok=True)
+    try:
+        rename(source, target)
+    except OSError as e:
+        if e.errno != EXDEV:
+            raise
+        # The target is on another file system, so the file is copied. That's not atomic, but the lease keeps other
+        # workers from claiming the file until it's removed from the input directory.
+        move(source, target)
+
+
+def _new_seen_file(
+    path: str, snapshot: Snapshot, status: int, seen_at: datetime
+) -> SeenFile:
+    return SeenFile(
+        path=path,
+        size=snapshot.size,
+        mtime_ns=snapshot.mtime_ns,
+        inode=snapshot.inode,
+        status=status,
+        seen_at=seen_at,
+    )
+
+
+def _get_snapshot_of_seen_file(seen_file: SeenFile) -> Snapshot:
+    return Snapshot(seen_file.size, seen_file.mtime_ns, seen_file.inode)
+
+
+def _why_incomplete(path: str) -> Optional[str]:
+    if any(fnmatch(basename(path), pattern) for pattern in TEMPORARY_NAME_PATTERNS):
+        return "temporary name"
+    if not isdir(path) and _is_truncated(path):
+        return "truncated"
+    return None
+
+
+def _is_truncated(path: str) -> bool:
+    """Whether the given file starts like a ZIP or uncompressed TAR file but lacks the structure at its end."""
+    try:
+        with open(path, "rb") as file:
+            header = file.read(TAR_BLOCK_SIZE)
+            size = file.seek(0, SEEK_END)
+            if header.startswith(ZIP_LOCAL_FILE_HEADER):
+                # The central directory is written last, and it ends with the end of central directory record.
+                file.seek(max(0, size - ZIP_END_OF_CENTRAL_DIRECTORY_MAX_SIZE))
+                return ZIP_END_OF_CENTRAL_DIRECTORY not in file.read()
+            if header[257:262] == b"ustar":
+                # TAR files consist of whole blocks and end with two empty blocks.
+                if size % TAR_BLOCK_SIZE:
+                    return True
+                file.seek(size - 2 * TAR_BLOCK_SIZE)
+                return any(file.read())
+    except OSError:
+        pass  # e.g. it was deleted; claiming will skip it
+    return False
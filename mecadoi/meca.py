@@ -6,13 +6,19 @@ manuscripts between different publishers. A single MECA archive contains a singl
 reviews of that manuscript, and can contain any further data related to the manuscript.
 
 `parse_meca_archive()` is the main entrypoint that parses a MECA archive into a `Manuscript`, the intermediate format
-defined in this module.
+defined in this module. With `level="triage"` it only reads as much of the archive as is needed to decide whether the
+manuscript can be deposited and returns a `ManuscriptTriage`.
 """
 
 __all__ = [
     "parse_meca_archive",
+    "PARSER_VERSION",
+    "ArchiveLimitExceeded",
+    "ArchiveLimits",
     "AuthorReply",
     "Manuscript",
+    "ManuscriptTriage",
+    "MecaSource",
     "Review",
     "RevisionRound",
 ]
@@ -20,13 +26,108 @@ __all__ = [
 from dataclasses import dataclass
 from datetime import datetime
 from html import unescape
-from lxml.etree import parse, tostring
+from io import BytesIO, RawIOBase, SEEK_CUR, SEEK_END, SEEK_SET
+from lxml.etree import iterparse, parse, tostring, XMLParser, XMLSyntaxError, XPath
+from mmap import mmap
+from os import walk
+from os.path import isdir
 from pathlib import Path
-from typing import Any, IO, List, Optional, Set, Union
-from zipfile import BadZipFile, ZipFile
+from types import TracebackType
+from typing import (
+    Any,
+    Dict,
+    IO,
+    List,
+    Literal,
+    Optional,
+    overload,
+    Set,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
+from zipfile import BadZipFile, ZipFile, ZipInfo
+from zlib import error as ZlibError
 
 from mecadoi.model import Author, DigitalObject, Institution, Orcid, Work
 
+PARSER_VERSION = 1
+"""
+The version of the parser in this module. Increase it whenever a change to the parser changes the result of parsing an
+archive, so that results stored for an archive by earlier versions are not reused for identical archives.
+"""
+
+# XPath expressions that are evaluated for every author, affiliation or review item are compiled only once. Compiled
+# expressions return lists, use `_first()` to get the first matching element like `find()` does.
+CONTRIBS = XPath("contrib[@contrib-type=$contrib_type]")
+ORCID = XPath('contrib-id[@contrib-id-type="orcid"]')
+GIVEN_NAMES = XPath("name/given-names")
+SURNAME = XPath("name/surname")
+AFF_XREF_IDS = XPath('xref[@ref-type="aff"]/@rid', smart_strings=False)
+AFFS_WITH_ID = XPath("aff[@id]")
+INSTITUTION = XPath("institution")
+DEPARTMENT = XPath('institution[@content-type="dept"]')
+CITY = XPath('addr-line[@content-type="city"]')
+COUNTRY = XPath("country")
+REVIEW_ITEMS = XPath("review-item-group/review-item")
+REVIEW_ITEM_QUESTION = XPath("review-item-question/alt-title")
+REVIEW_ITEM_RESPONSE = XPath("review-item-response/text")
+
+# MECA archives come from external systems, so their XML is parsed without loading DTDs, resolving entities or accessing
+# the network. Without `huge_tree`, libxml2 rejects documents nested deeper than 256 levels.
+XML_PARSER_OPTIONS: Dict[str, Any] = {
+    "resolve_entities": False,
+    "no_network": True,
+    "load_dtd": False,
+    "huge_tree": False,
+}
+XML_PARSER = XMLParser(**XML_PARSER_OPTIONS)
+
+MIN_SIZE_FOR_RATIO_CHECK = 1024 * 1024
+"""
+Files in a MECA archive that are smaller than this many bytes when uncompressed are exempt from the compression ratio
+limit: they can't do much harm, and small XML files often compress very well.
+"""
+
+MecaSource = Union[str, Path, bytes, bytearray, memoryview, mmap, IO[bytes]]
+"""
+A MECA archive, given by its path, its content in memory, or a seekable binary file object that it can be read from.
+The path can also be the path of a directory that contains the extracted files of a MECA archive.
+"""
+
+
+@dataclass(frozen=True)
+class ArchiveLimits:
+    """
+    Limits on the files in a MECA archive. A limit of None means no limit.
+
+    All limits except `max_xml_size` are checked against the central directory of the ZIP archive when it is opened,
+    before any file in it is decompressed. Archives that exceed them are rejected with an `ArchiveLimitExceeded` error.
+    """
+
+    max_members: Optional[int] = 10_000
+    """The maximum number of files in the archive."""
+
+    max_total_size: Optional[int] = 4 * 1024 * 1024 * 1024
+    """The maximum total uncompressed size in bytes of all files in the archive."""
+
+    max_compression_ratio: Optional[float] = 100
+    """
+    The maximum ratio of the uncompressed to the compressed size of a single file in the archive. Only applies to files
+    of at least `MIN_SIZE_FOR_RATIO_CHECK` bytes.
+    """
+
+    max_xml_size: Optional[int] = 100 * 1024 * 1024
+    """The maximum uncompressed size in bytes of an XML file that is parsed. Other files in the archive are not read."""
+
+
+class ArchiveLimitExceeded(ValueError):
+    """
+    Raised when a MECA archive exceeds one of its `ArchiveLimits`. Unlike other errors, this depends on the limits, so
+    the same archive may be read with higher limits.
+    """
+
 
 @dataclass
 class Review(Work):
@@ -94,7 +195,42 @@ class Manuscript(DigitalObject, Work):
     """
 
 
-def parse_meca_archive(path_to_archive: Union[str, Path]) -> Manuscript:
+@dataclass
+class ManuscriptTriage:
+    """
+    The information about the article packaged in a MECA archive that decides whether its reviews can be deposited.
+    """
+
+    preprint_doi: Optional[str]
+    """The DOI of the preprint that this article is based on, see `Manuscript.preprint_doi`."""
+
+    has_reviews: bool
+    """Whether the MECA archive contains a file with information about the review process."""
+
+
+@overload
+def parse_meca_archive(
+    path_to_archive: MecaSource,
+    level: Literal["full"] = "full",
+    limits: Optional[ArchiveLimits] = None,
+) -> Manuscript:
+    ...
+
+
+@overload
+def parse_meca_archive(
+    path_to_archive: MecaSource,
+    level: Literal["triage"],
+    limits: Optional[ArchiveLimits] = None,
+) -> ManuscriptTriage:
+    ...
+
+
+def parse_meca_archive(
+    path_to_archive: MecaSource,
+    level: Literal["full", "triage"] = "full",
+    limits: Optional[ArchiveLimits] = None,
+) -> Union[Manuscript, ManuscriptTriage]:
     """
     Read the MECA archive at the given path and construct a Manuscript from it.
 
@@ -102,41 +238,58 @@ def parse_meca_archive(path_to_archive: Union[str, Path]) -> Manuscript:
     such as a file with article metadata.
 
     Args:
-        path_to_archive: The path to the MECA archive to parse. This can be a string or a pathlib.Path.
+        path_to_archive: The MECA archive to parse. This can be its path as a string or a pathlib.Path, its content as
+            bytes, a bytearray, a memoryview or an mmap, or a seekable binary file object. It can also be the path of a
+            directory with the extracted files of a MECA archive.
+        level: "full" to parse the complete manuscript including its review process, or "triage" to only read the
+            manifest and the article metadata up to the end of <article-meta>. Defaults to "full".
+        limits: The limits on the files in the archive, see `ArchiveLimits`. Defaults to `ArchiveLimits()`.
 
     Returns:
-        A Manuscript that represents the article in the MECA archive.
+        A Manuscript that represents the article in the MECA archive, or a ManuscriptTriage if `level` is "triage".
     """
 
-    meca = MECArchive(path_to_archive)
-    article_xml = meca.get_xml(MECArchive.ARTICLE)
+    with MECArchive(path_to_archive, limits) as meca:
+        if level == "triage":
+            return _triage(meca)
+        return _parse(meca)
+
+
+def _parse(meca: "MECArchive") -> Manuscript:
+    # Only the front matter of the article is used, so its potentially large body and back matter is not parsed.
+    front_xml = meca.get_xml_until(MECArchive.ARTICLE, "front")
+    if front_xml is None:
+        raise ValueError("Invalid MECA archive: missing article front matter")
 
     article_authors = _get_authors(
-        article_xml.find("front/article-meta/contrib-group"), contrib_type="author"
+        front_xml.find("article-meta/contrib-group"), contrib_type="author"
     )
 
     try:
-        review_xml = meca.get_xml(MECArchive.REVIEWS)
+        review_file = meca._get_file_of_type(MECArchive.REVIEWS)
     except ValueError:
         review_xml = None
+    else:
+        # invalid XML in the review file makes the whole archive invalid
+        review_xml = meca._parse_xml(review_file)
 
     if review_xml is not None:
-        author_replies = meca._get_files_of_type(MECArchive.AUTHOR_REPLY)
+        author_reply_versions = {
+            file.version for file in meca._get_files_of_type(MECArchive.AUTHOR_REPLY)
+        }
         review_process = _get_review_process(
-            review_xml, article_authors, author_replies
+            review_xml, article_authors, author_reply_versions
         )
     else:
         review_process = None
 
-    abstract_node = article_xml.find("front/article-meta/abstract")
+    abstract_node = front_xml.find("article-meta/abstract")
     return Manuscript(
         authors=article_authors,
-        doi=_text(
-            article_xml.find('front/article-meta/article-id[@pub-id-type="doi"]')
-        ),
-        preprint_doi=_get_preprint_doi(article_xml),
+        doi=_text(front_xml.find('article-meta/article-id[@pub-id-type="doi"]')),
+        preprint_doi=_get_preprint_doi(front_xml.find("article-meta")),
         journal=_text_or_default(
-            article_xml.find("front/journal-meta/journal-title-group/journal-title")
+            front_xml.find("journal-meta/journal-title-group/journal-title")
         ),
         review_process=review_process,
         text={
@@ -144,7 +297,18 @@ def parse_meca_archive(path_to_archive: Union[str, Path]) -> Manuscript:
         }
         if abstract_node is not None
         else {},
-        title=_text(article_xml.find("front/article-meta/title-group/article-title")),
+        title=_text(front_xml.find("article-meta/title-group/article-title")),
+    )
+
+
+def _triage(meca: "MECArchive") -> ManuscriptTriage:
+    article_meta_xml = meca.get_xml_until(MECArchive.ARTICLE, "article-meta")
+    if article_meta_xml is None:
+        raise ValueError("Invalid MECA archive: missing article metadata")
+
+    return ManuscriptTriage(
+        preprint_doi=_get_preprint_doi(article_meta_xml),
+        has_reviews=len(meca._get_files_of_type(MECArchive.REVIEWS)) > 0,
     )
 
 
@@ -158,16 +322,12 @@ def _assigned_date(review_xml: Any) -> datetime:
 
 
 def _get_review_process(
-    review_xml: Any, article_authors: List[Author], author_replies: List["FileInMeca"]
+    review_xml: Any, article_authors: List[Author], author_reply_versions: Set[str]
 ) -> Optional[List[RevisionRound]]:
     review_process = []
     for revision_round_xml in review_xml.findall("version"):
         revision_id = revision_round_xml.get("revision")
-        author_reply_present = (
-            True
-            if len(list(filter(lambda f: f.version == revision_id, author_replies))) > 0
-            else False
-        )
+        author_reply_present = revision_id in author_reply_versions
 
         revision_round = RevisionRound(
             revision_id=revision_id,
@@ -178,12 +338,10 @@ def _get_review_process(
                     ),
                     running_number=str(running_number),
                     text={
-                        _text(
-                            review_item_xml.find("review-item-question/alt-title")
-                        ): _text(review_item_xml.find("review-item-response/text"))
-                        for review_item_xml in review_xml.findall(
-                            "review-item-group/review-item"
+                        _text(_first(REVIEW_ITEM_QUESTION, review_item_xml)): _text(
+                            _first(REVIEW_ITEM_RESPONSE, review_item_xml)
                         )
+                        for review_item_xml in REVIEW_ITEMS(review_xml)
                     },
                 )
                 for running_number, review_xml in enumerate(
@@ -202,25 +360,23 @@ def _get_review_process(
     return review_process
 
 
-def _get_preprint_doi(article_xml: Any) -> Optional[str]:
-    for custom_meta in article_xml.findall(
-        "front/article-meta/custom-meta-group/custom-meta"
-    ):
+def _get_preprint_doi(article_meta_xml: Any) -> Optional[str]:
+    for custom_meta in article_meta_xml.findall("custom-meta-group/custom-meta"):
         if "Pre-existing BioRxiv Preprint DOI" == _text(custom_meta.find("meta-name")):
             return _text(custom_meta.find("meta-value"))
     return None
 
 
 def _get_authors(contrib_group_xml: Any, contrib_type: str) -> List[Author]:
-    authors_xml = contrib_group_xml.findall(f'contrib[@contrib-type="{contrib_type}"]')
+    affiliations = _get_affiliations(contrib_group_xml)
 
     authors: List[Author] = []
-    for author_xml in authors_xml:
-        orcid_xml = author_xml.find('contrib-id[@contrib-id-type="orcid"]')
+    for author_xml in CONTRIBS(contrib_group_xml, contrib_type=contrib_type):
+        orcid_xml = _first(ORCID, author_xml)
         authors.append(
             Author(
-                given_name=_text(author_xml.find("name/given-names")),
-                surname=_text(author_xml.find("name/surname")),
+                given_name=_text(_first(GIVEN_NAMES, author_xml)),
+                surname=_text(_first(SURNAME, author_xml)),
                 orcid=Orcid(
                     id=_text(orcid_xml),
                     is_authenticated=orcid_xml.get("specific-use") == "authenticated",
@@ -228,46 +384,69 @@ def _get_authors(contrib_group_xml: Any, contrib_type: str) -> List[Author]:
                 if orcid_xml is not None
                 else None,
                 is_corresponding_author=author_xml.get("corresp") == "yes",
-                institutions=_get_institutions(contrib_group_xml, author_xml),
+                institutions=_get_institutions(affiliations, author_xml),
             )
         )
     return authors
 
 
-def _get_institutions(contrib_group_xml: Any, author_xml: Any) -> List[Institution]:
+def _get_affiliations(contrib_group_xml: Any) -> Dict[str, Any]:
+    """Index the affiliations in the given contrib-group by their id. Only the first affiliation with an id is kept."""
+    affiliations: Dict[str, Any] = {}
+    for affiliation_xml in AFFS_WITH_ID(contrib_group_xml):
+        affiliations.setdefault(affiliation_xml.get("id"), affiliation_xml)
+    return affiliations
+
+
+def _get_institutions(
+    affiliations: Dict[str, Any], author_xml: Any
+) -> List[Institution]:
     institutions = []
-    aff_xrefs = author_xml.findall('xref[@ref-type="aff"]')
-    for aff_xref in aff_xrefs:
-        aff_id = aff_xref.get("rid")
-        if aff_id is not None:
-            affiliation_xml = contrib_group_xml.find(f'aff[@id="{aff_id}"]')
-            institution = affiliation_xml.find("institution")
-            if institution is not None:
-                institutions.append(
-                    Institution(
-                        name=_text(institution),
-                        department=_text_or_default(
-                            affiliation_xml.find('institution[@content-type="dept"]')
-                        ),
-                        city=_text_or_default(
-                            affiliation_xml.find('addr-line[@content-type="city"]')
-                        ),
-                        country=_text_or_default(affiliation_xml.find("country")),
-                    )
+    for aff_id in AFF_XREF_IDS(author_xml):
+        affiliation_xml = affiliations.get(aff_id)
+        if affiliation_xml is None:
+            raise ValueError(f'Found no affiliation with id "{aff_id}"')
+        institution = _first(INSTITUTION, affiliation_xml)
+        if institution is not None:
+            institutions.append(
+                Institution(
+                    name=_text(institution),
+                    department=_text_or_default(_first(DEPARTMENT, affiliation_xml)),
+                    city=_text_or_default(_first(CITY, affiliation_xml)),
+                    country=_text_or_default(_first(COUNTRY, affiliation_xml)),
                 )
+            )
     return institutions
 
 
+def _first(xpath: XPath, node: Any, **variables: Any) -> Any:
+    """Return the first element matched by the given compiled XPath expression, or None."""
+    matches = xpath(node, **variables)
+    return matches[0] if matches else None
+
+
 def _text(node: Any) -> str:
-    return unescape(  # replace all entity references like &scedil; to their corresponding unicode characters
-        str(
-            tostring(
-                node,
-                method="text",  # return only text content, no <tag>s
-                encoding=str,  # return an unencoded unicode string
-            ).strip()  # remove trailing whitespace
+    """
+    Return the text content of the given node and its descendants, followed by the node's tail, without surrounding
+    whitespace.
+
+    Entity references in the text, e.g. &scedil; in escaped HTML, are replaced by their corresponding characters.
+    """
+    if len(node) == 0:
+        # Most nodes we read, e.g. names and titles, have no children. Their text can be read without serializing them.
+        text = node.text or ""
+        if node.tail:
+            text += node.tail
+    else:
+        text = tostring(
+            node,
+            method="text",  # return only text content, no <tag>s
+            encoding=str,  # return an unencoded unicode string
         )
-    )
+    text = text.strip()
+    if "&" in text:
+        text = unescape(text)
+    return text
 
 
 def _text_or_default(node: Any, default: Optional[str] = None) -> Optional[str]:
@@ -295,6 +474,31 @@ class FileInMeca:
     version: str
 
 
+def _check_limits(infos: List[ZipInfo], limits: ArchiveLimits) -> None:
+    """
+    Raise an `ArchiveLimitExceeded` error if the files with the given entries of a ZIP central directory exceed the
+    given limits.
+    """
+    if limits.max_members is not None and len(infos) > limits.max_members:
+        raise ArchiveLimitExceeded(f"Archive has too many files ({len(infos)})")
+
+    total_size = sum(info.file_size for info in infos)
+    if limits.max_total_size is not None and total_size > limits.max_total_size:
+        raise ArchiveLimitExceeded(
+            f"Archive is too large when uncompressed ({total_size} bytes)"
+        )
+
+    if limits.max_compression_ratio is not None:
+        for info in infos:
+            if info.file_size < MIN_SIZE_FOR_RATIO_CHECK:
+                continue
+            if info.file_size > limits.max_compression_ratio * info.compress_size:
+                raise ArchiveLimitExceeded(
+                    f'File "{info.filename}" is compressed too much '
+                    f"({info.file_size} bytes compressed to {info.compress_size} bytes)"
+                )
+
+
 class MECArchive:
     """
     Encapsulates a MECA archive.
@@ -305,12 +509,16 @@ class MECArchive:
     These can have custom names but must be listed in the manifest file with the file types specified in the class
     variables below.
 
-    To get started, pass a zipfile.ZipFile to the constructor of this class: `meca = MECArchive(zip_file)`. This parses
-    the manifest and raises a ValueError if it is not present. Then, call `meca.get_xml(MECArchive.ARTICLE)` to parse
-    the XML file that contains metadata about the manuscript.
+    To get started, pass the path to a ZIP file, its content, or a file object to read it from to the constructor of
+    this class: `meca = MECArchive(zip_file)`. This parses the manifest and raises a ValueError if it is not present.
+    Then, call `meca.get_xml(MECArchive.ARTICLE)` to parse the XML file that contains metadata about the manuscript.
+
+    Instead of a ZIP file, the archive can also be given as the path of a directory that contains its extracted files.
 
-    For simplicity, the ZIP archive is opened and closed during every read of files within the archive, i.e. once at
-    instantiation of this class and again during every call to get_xml().
+    The ZIP archive stays open until `close()` is called, or until the end of the `with` block if the MECArchive is used
+    as a context manager. Only its central directory is read when it is opened; files in it are decompressed only when
+    they are parsed, and only as far as the parser reads them. The archive is rejected if its central directory exceeds
+    the given `ArchiveLimits`.
     """
 
     # The file types of entries in the manifest file that are of interest to us. AUTHOR_REPLY is likely specific to
@@ -319,25 +527,62 @@ class MECArchive:
     REVIEWS = "review-metadata"
     AUTHOR_REPLY = "Response to Reviewers"
 
-    def __init__(self, path_to_archive: Union[str, Path]) -> None:
+    def __init__(
+        self, path_to_archive: MecaSource, limits: Optional[ArchiveLimits] = None
+    ) -> None:
         self.path_to_archive = path_to_archive
-
-        with self._open_archive() as archive:
-            self.files_in_archive = archive.namelist()
+        self.limits = limits or ArchiveLimits()
+        self._archive_file = _as_file(path_to_archive)
+        self._archive = self._open_archive()
+        try:
+            self._read_manifest()
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "MECArchive":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the ZIP archive. Files given as file objects are left open."""
+        self._archive.close()
+
+    def _read_manifest(self) -> None:
+        infos = self._archive.infolist()
+        _check_limits(infos, self.limits)
+        # Later entries with the same name take precedence, like in ZipFile.getinfo().
+        self._infos_by_name: Dict[str, ZipInfo] = {
+            info.filename: info for info in infos
+        }
+        self.files_in_archive = [info.filename for info in infos]
 
         filename_manifest = "manifest.xml"
-        if filename_manifest not in self.files_in_archive:
+        if filename_manifest not in self._infos_by_name:
             raise ValueError("Invalid MECA archive: missing manifest file")
 
         manifest = self._parse_xml(filename_manifest)
 
         self.files_in_manifest: Set[FileInMeca] = set()
-        for item in manifest.findall("item"):
+        # iterchildren() matches the same elements as findall() and find() with a tag name, but is considerably faster
+        # on manifests with thousands of items.
+        for item in manifest.iterchildren("item"):
             file_id = item.get("id")
             file_type = item.get("type")
             file_version = item.get("version")
 
-            instance = item.find("instance")
+            instance = next(item.iterchildren("instance"), None)
+            if instance is None:
+                raise ValueError(
+                    f'Invalid MECA archive: manifest item "{file_id}" has no instance'
+                )
             file_name = instance.get("href")
             media_type = instance.get("media-type")
 
@@ -351,39 +596,89 @@ class MECArchive:
                 )
             )
 
-    def _open_archive(self) -> ZipFile:
+        # Index the files by type and by type and version, so that looking them up doesn't require a full scan.
+        self.files_by_type: Dict[str, List[FileInMeca]] = {}
+        self.files_by_type_and_version: Dict[
+            Tuple[str, Optional[str]], List[FileInMeca]
+        ] = {}
+        for file in self.files_in_manifest:
+            self.files_by_type.setdefault(file.type, []).append(file)
+            self.files_by_type_and_version.setdefault(
+                (file.type, file.version), []
+            ).append(file)
+
+    def _open_archive(self) -> Union[ZipFile, "_DirectoryArchive"]:
+        if isinstance(self._archive_file, (str, Path)) and isdir(self._archive_file):
+            return _DirectoryArchive(self._archive_file)
         try:
-            return ZipFile(self.path_to_archive, "r")
+            return ZipFile(self._archive_file, "r")
         except BadZipFile as e:
             raise ValueError("Bad zip file: " + str(e))
 
-    def _open_file_in_archive(self, file: Union[str, FileInMeca]) -> IO[bytes]:
-        with self._open_archive() as archive:
-            try:
-                file_name = file.file_name  # type: ignore[union-attr] # handled by try/except block
-            except AttributeError:
-                file_name = file
-            return archive.open(file_name)
+    def _open_file_in_archive(
+        self, file: Union[str, FileInMeca], max_size: Optional[int] = None
+    ) -> IO[bytes]:
+        """
+        Open the given file, raising a ValueError if it is missing, or an `ArchiveLimitExceeded` error if it's larger
+        than `max_size` bytes.
+        """
+        try:
+            file_name = file.file_name  # type: ignore[union-attr] # handled by try/except block
+        except AttributeError:
+            file_name = file
+        try:
+            info = self._infos_by_name[file_name]
+        except KeyError:
+            raise ValueError(f'Invalid MECA archive: missing file "{file_name}"')
+        # ZipFile never reads more than the uncompressed size that is recorded in the central directory.
+        if max_size is not None and info.file_size > max_size:
+            raise ArchiveLimitExceeded(
+                f'File "{file_name}" is too large ({info.file_size} bytes)'
+            )
+        try:
+            return self._archive.open(info)
+        except BadZipFile as e:
+            raise ValueError(f'Bad zip file: "{file_name}": {e}')
 
     def _parse_xml(self, file: Union[str, FileInMeca]) -> Any:
         """Parse the given file and return an lxml.etree.Element."""
-        with self._open_file_in_archive(file) as xml_file:
-            tree = parse(xml_file)
+        with self._open_file_in_archive(file, self.limits.max_xml_size) as xml_file:
+            try:
+                tree = parse(xml_file, XML_PARSER)
+            except (XMLSyntaxError, BadZipFile, ZlibError) as e:
+                raise ValueError(f'Invalid XML in "{xml_file.name}": {e}')
             return tree.getroot()
 
+    def _parse_xml_until(self, file: Union[str, FileInMeca], tag: str) -> Any:
+        """
+        Parse the given file only up to the end of the first element with the given tag and return that element as an
+        lxml.etree.Element, or None if the file contains no such element.
+
+        The rest of the file is not read. Elements that precede the returned element are removed from the tree, so only
+        the returned element and its ancestors are kept in memory.
+        """
+        with self._open_file_in_archive(file, self.limits.max_xml_size) as xml_file:
+            try:
+                for _, element in iterparse(
+                    xml_file, events=("end",), tag=tag, **XML_PARSER_OPTIONS
+                ):
+                    node = element
+                    while node is not None:
+                        while node.getprevious() is not None:
+                            del node.getparent()[0]
+                        node = node.getparent()
+                    return element
+            except (XMLSyntaxError, BadZipFile, ZlibError) as e:
+                raise ValueError(f'Invalid XML in "{xml_file.name}": {e}')
+        return None
+
     def _get_files_of_type(
         self, file_type: str, version: Optional[str] = None
     ) -> List[FileInMeca]:
         """Finds all files of the given type and optionally the given version."""
-
-        def predicate(file: FileInMeca) -> bool:
-            if file.type != file_type:
-                return False
-            if version is not None and file.version != version:
-                return False
-            return True
-
-        return list(filter(predicate, self.files_in_manifest))
+        if version is None:
+            return list(self.files_by_type.get(file_type, []))
+        return list(self.files_by_type_and_version.get((file_type, version), []))
 
     def _get_file_of_type(
         self, file_type: str, version: Optional[str] = None
@@ -413,3 +708,104 @@ class MECArchive:
         """
         file = self._get_file_of_type(file_type, version=version)
         return self._parse_xml(file)
+
+    def get_xml_until(
+        self, file_type: str, tag: str, version: Optional[str] = None
+    ) -> Any:
+        """
+        Like `get_xml()`, but stop parsing at the end of the first element with the given tag and return only that
+        element, or None if the file does not contain such an element.
+        """
+        file = self._get_file_of_type(file_type, version=version)
+        return self._parse_xml_until(file, tag)
+
+
+class _DirectoryArchive:
+    """Provides the files in a directory with an extracted MECA archive like a ZipFile that is opened for reading."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+
+    def infolist(self) -> List[ZipInfo]:
+        """
+        Return a ZipInfo for every file in the directory and its subdirectories, named by its relative path.
+
+        Symbolic links are skipped, as they could point to files outside the directory.
+        """
+        infos = []
+        for directory, _, file_names in walk(self.path):
+            for file_name in sorted(file_names):
+                path = Path(directory, file_name)
+                if path.is_symlink() or not path.is_file():
+                    continue
+                info = ZipInfo.from_file(path, path.relative_to(self.path).as_posix())
+                # The files are not compressed.
+                info.compress_size = info.file_size
+                infos.append(info)
+        return infos
+
+    def open(self, info: ZipInfo) -> IO[bytes]:
+        return open(self.path / info.filename, "rb")
+
+    def close(self) -> None:
+        pass
+
+
+def _as_file(meca_source: MecaSource) -> Union[str, Path, IO[bytes]]:
+    """Return something that zipfile.ZipFile can read the given MECA archive from, without copying its content."""
+    if isinstance(meca_source, (str, Path)):
+        return meca_source
+    if isinstance(meca_source, bytes):
+        # BytesIO shares the buffer of an immutable bytes object as long as nothing is written to it.
+        return BytesIO(meca_source)
+    if isinstance(meca_source, (bytearray, memoryview, mmap)):
+        return cast(IO[bytes], _MemoryReader(memoryview(meca_source)))
+    return meca_source
+
+
+class _MemoryReader(RawIOBase):
+    """A read-only binary file object that reads from the given memoryview."""
+
+    def __init__(self, buffer: memoryview) -> None:
+        super().__init__()
+        self._buffer = buffer.cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_SET:
+            position = offset
+        elif whence == SEEK_CUR:
+            position = self._position + offset
+        elif whence == SEEK_END:
+            position = len(self._buffer) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self._position = position
+        return position
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        start = self._position
+        end = len(self._buffer) if size is None or size < 0 else start + size
+        data = self._buffer[start:end].tobytes()
+        self._position += len(data)
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        start = self._position
+        end = start + len(buffer)
+        data = self._buffer[start:end]
+        size = len(data)
+        buffer[:size] = data
+        self._position += size
+        return size
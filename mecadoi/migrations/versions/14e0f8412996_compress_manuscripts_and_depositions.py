@@ -0,0 +1,89 @@
+"""compress manuscripts and depositions
+
+Revision ID: 14e0f8412996
+Revises: 3daf0532955b
+Create Date: 2026-10-19 12:13:03.182363
+
+"""
+from typing import Any, Callable
+from alembic import op
+import sqlalchemy as sa
+
+from mecadoi.compression import compress, decompress
+
+
+# revision identifiers, used by Alembic.
+revision = "14e0f8412996"
+down_revision = "3daf0532955b"
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 500
+COMPRESSED_COLUMNS = [
+    ("parsed_file", "manuscript"),
+    ("deposition_attempt", "deposition"),
+]
+
+
+def upgrade() -> None:
+    for table_name, column_name in COMPRESSED_COLUMNS:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column_name,
+                existing_type=sa.Text(),
+                type_=sa.LargeBinary(),
+                existing_nullable=True,
+                postgresql_using=f"convert_to({column_name}, 'UTF8')",
+            )
+        _recode(table_name, column_name, lambda value: compress(decompress(value)))
+
+
+def downgrade() -> None:
+    for table_name, column_name in COMPRESSED_COLUMNS:
+        _recode(
+            table_name, column_name, lambda value: decompress(value).encode("utf-8")
+        )
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column_name,
+                existing_type=sa.LargeBinary(),
+                type_=sa.Text(),
+                existing_nullable=True,
+                postgresql_using=f"convert_from({column_name}, 'UTF8')",
+            )
+
+
+def _recode(
+    table_name: str, column_name: str, recode: Callable[[bytes], bytes]
+) -> None:
+    """Replace every value in the given column by its recoded form, CHUNK_SIZE rows at a time."""
+    table = sa.table(
+        table_name,
+        sa.column("id", sa.Integer()),
+        sa.column(column_name, sa.LargeBinary()),
+    )
+    id_column: Any = table.c.id
+    value_column: Any = table.c[column_name]
+    update = (
+        table.update()
+        .where(id_column == sa.bindparam("_id"))
+        .values({column_name: sa.bindparam("_value")})
+    )
+
+    connection: Any = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select([id_column, value_column])
+            .where(value_column.is_not(None))
+            .where(id_column > last_id)
+            .order_by(id_column)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        connection.execute(
+            update, [{"_id": row[0], "_value": recode(row[1])} for row in rows]
+        )
+        last_id = rows[-1][0]
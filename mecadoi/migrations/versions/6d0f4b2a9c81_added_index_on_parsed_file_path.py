@@ -0,0 +1,41 @@
+"""added index on parsed_file.path
+
+Revision ID: 6d0f4b2a9c81
+Revises: beebad7cff70
+Create Date: 2026-10-20 11:05:52.917364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6d0f4b2a9c81"
+down_revision = "beebad7cff70"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        # Compare paths bytewise, so that the MECA archives in a bundle form a range of the index.
+        op.alter_column(
+            "parsed_file",
+            "path",
+            type_=sa.Text(collation="C"),
+            existing_type=sa.Text(),
+            existing_nullable=False,
+        )
+    op.create_index("ix_parsed_file_path", "parsed_file", ["path"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_parsed_file_path", table_name="parsed_file")
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column(
+            "parsed_file",
+            "path",
+            type_=sa.Text(),
+            existing_type=sa.Text(collation="C"),
+            existing_nullable=False,
+        )
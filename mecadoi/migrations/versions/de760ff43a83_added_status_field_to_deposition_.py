@@ -22,10 +22,21 @@ def upgrade() -> None:
         "deposition_attempt", sa.Column("status", sa.Integer(), nullable=True)
     )
     # ### end Alembic commands ###
-    op.execute("UPDATE deposition_attempt SET status=1 WHERE succeeded=1")
-    op.execute("UPDATE deposition_attempt SET status=10 WHERE succeeded=0")
-    op.execute("UPDATE deposition_attempt SET status=20 WHERE verification_failed=1")
-    op.execute("UPDATE deposition_attempt SET status=21 WHERE deposition IS NULL")
+    # Compare booleans with true/false instead of 1/0 to keep the statements portable, e.g. to PostgreSQL.
+    deposition_attempt = sa.table(
+        "deposition_attempt",
+        sa.column("status", sa.Integer()),
+        sa.column("succeeded", sa.Boolean()),
+        sa.column("verification_failed", sa.Boolean()),
+        sa.column("deposition", sa.Text()),
+    )
+    for status, condition in [
+        (1, deposition_attempt.c.succeeded == sa.true()),
+        (10, deposition_attempt.c.succeeded == sa.false()),
+        (20, deposition_attempt.c.verification_failed == sa.true()),
+        (21, deposition_attempt.c.deposition.is_(None)),  # type: ignore[no-untyped-call]
+    ]:
+        op.execute(deposition_attempt.update().where(condition).values(status=status))
 
 
 def downgrade() -> None:
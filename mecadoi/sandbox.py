@@ -0,0 +1,198 @@
+"""
+Run functions in a separate worker process with limits on the CPU time and memory that each call may use.
+
+Parsing files from external sources can take arbitrarily long or use arbitrary amounts of memory for pathological
+input. A `Sandbox` runs such work in a worker process. If a call exceeds its limits, it raises a `LimitExceeded` error
+instead of stalling or crashing the calling process. A new worker process is started for the next call if necessary.
+
+Functions, their arguments and their results are passed between the processes by pickling, so functions must be
+defined at module level.
+"""
+
+__all__ = ["LimitExceeded", "Sandbox"]
+
+from math import ceil
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from os import sysconf
+from resource import (
+    getrlimit,
+    getrusage,
+    RLIM_INFINITY,
+    RLIMIT_AS,
+    RLIMIT_CPU,
+    RUSAGE_SELF,
+    setrlimit,
+)
+from types import TracebackType
+from typing import Any, Callable, Optional, Type, TypeVar
+
+T = TypeVar("T")
+
+
+class LimitExceeded(ValueError):
+    """Raised when a call in a `Sandbox` exceeds its CPU time, memory or wall-clock time limit."""
+
+
+class Sandbox:
+    """
+    A worker process that runs one function call at a time.
+
+    Use it as a context manager to stop the worker process when it's no longer needed:
+
+        with Sandbox(cpu_seconds=10, memory_bytes=512 * 1024 * 1024) as sandbox:
+            result = sandbox.run(function, argument)
+
+    Exceptions raised by the function are re-raised by `run()`.
+    """
+
+    def __init__(
+        self,
+        cpu_seconds: Optional[int] = None,
+        memory_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.cpu_seconds = cpu_seconds
+        """The CPU time in seconds that a single call may use. None means no limit."""
+        self.memory_bytes = memory_bytes
+        """The memory in bytes that the worker may allocate on top of what it inherits. None means no limit."""
+        self.timeout = timeout
+        """
+        The time in seconds to wait for the result of a call, which also limits calls that are blocked on I/O. Defaults
+        to twice the CPU time limit, which is enforced in whole seconds and may thus be up to one second longer.
+        """
+        if self.timeout is None and cpu_seconds is not None:
+            self.timeout = 2 * (cpu_seconds + 1)
+        self._process: Any = None
+        self._connection: Optional[Connection] = None
+
+    def __enter__(self) -> "Sandbox":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def run(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call the given function with the given arguments in the worker process and return its result."""
+        connection = self._start()
+        connection.send((function, args, kwargs))
+
+        if not connection.poll(self.timeout):
+            self.close()
+            raise LimitExceeded(f"call did not finish within {self.timeout} s")
+        try:
+            succeeded, value = connection.recv()
+        except EOFError:
+            self.close()
+            raise LimitExceeded(
+                f"worker process exited with code {self._process.exitcode}, "
+                "probably because the call exceeded the CPU time limit"
+            )
+
+        if succeeded:
+            return value  # type: ignore[no-any-return]
+        if isinstance(value, LimitExceeded):
+            self.close()
+        raise value
+
+    def close(self) -> None:
+        """Stop the worker process, if it's running."""
+        if self._connection is not None:
+            # The worker process inherits this end of the connection as well, so it doesn't notice when it's closed.
+            try:
+                self._connection.send(None)
+            except OSError:
+                pass  # the worker process has already exited
+            self._connection.close()
+            self._connection = None
+        if self._process is not None:
+            self._process.join(timeout=1)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+
+    def _start(self) -> Connection:
+        if self._connection is not None and self._process.is_alive():
+            return self._connection
+        self.close()
+
+        context = get_context()
+        connection: Connection
+        worker_connection: Connection
+        connection, worker_connection = context.Pipe()
+        self._process = context.Process(
+            target=_work,
+            args=(worker_connection, self.cpu_seconds, self.memory_bytes),
+            daemon=True,
+        )
+        self._process.start()
+        worker_connection.close()
+        self._connection = connection
+        return connection
+
+
+def _work(
+    connection: Connection, cpu_seconds: Optional[int], memory_bytes: Optional[int]
+) -> None:
+    """Run function calls received through the given connection and send back their results."""
+    if memory_bytes is not None:
+        _limit_memory(memory_bytes)
+
+    while True:
+        try:
+            call = connection.recv()
+        except EOFError:
+            return
+        if call is None:
+            return
+        function, args, kwargs = call
+
+        if cpu_seconds is not None:
+            _limit_cpu_time(cpu_seconds)
+        try:
+            result = (True, function(*args, **kwargs))
+        except MemoryError:
+            # The process may be left in an inconsistent state, so it's replaced by a new one.
+            connection.send((False, LimitExceeded("call exceeded the memory limit")))
+            return
+        except Exception as e:
+            result = (False, e)
+
+        try:
+            connection.send(result)
+        except Exception as e:
+            # e.g. the result or exception can't be pickled
+            connection.send((False, ValueError(f"{type(e).__name__}: {e}")))
+
+
+def _limit_cpu_time(cpu_seconds: int) -> None:
+    """Let the operating system terminate this process once it has used `cpu_seconds` more CPU time."""
+    usage = getrusage(RUSAGE_SELF)
+    soft_limit = ceil(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    _, hard_limit = getrlimit(RLIMIT_CPU)
+    if hard_limit != RLIM_INFINITY:
+        soft_limit = min(soft_limit, hard_limit)
+    setrlimit(RLIMIT_CPU, (soft_limit, hard_limit))
+
+
+def _limit_memory(memory_bytes: int) -> None:
+    """Make allocations fail once this process has allocated `memory_bytes` more memory."""
+    soft_limit = _address_space_size() + memory_bytes
+    _, hard_limit = getrlimit(RLIMIT_AS)
+    if hard_limit != RLIM_INFINITY:
+        soft_limit = min(soft_limit, hard_limit)
+    setrlimit(RLIMIT_AS, (soft_limit, hard_limit))
+
+
+def _address_space_size() -> int:
+    """The size of the virtual address space of this process, or 0 if it can't be determined."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[0]) * sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
@@ -0,0 +1,55 @@
+"""Record how long the stages of a batch run take, e.g. reading the XML of each MECA archive."""
+
+__all__ = ["StageTimings"]
+
+from contextlib import contextmanager
+from math import ceil
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List
+
+
+class StageTimings:
+    """
+    The durations of the stages of a batch run. A stage is timed every time it's entered, e.g. once per file for
+    parsing and once per chunk of files for inserting them into the database.
+    """
+
+    def __init__(self, clock: Callable[[], float] = perf_counter) -> None:
+        self._clock = clock
+        self.started_at = clock()
+        self.durations: Dict[str, List[float]] = {}
+        """The durations in seconds of each stage, in the order in which they were recorded."""
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the `with` block as one run of the given stage, also if it raises an exception."""
+        started_at = self._clock()
+        try:
+            yield
+        finally:
+            self.durations.setdefault(name, []).append(self._clock() - started_at)
+
+    def seconds(self) -> float:
+        """The time since these timings were created."""
+        return self._clock() - self.started_at
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        The number of runs of each stage, the median, 95th percentile and maximum of their durations, and their total
+        duration. Durations are in seconds, and percentiles use the nearest-rank method.
+        """
+        return {
+            name: {
+                "count": len(durations),
+                "p50": round(_percentile(durations, 50), 4),
+                "p95": round(_percentile(durations, 95), 4),
+                "max": round(max(durations), 4),
+                "seconds": round(sum(durations), 4),
+            }
+            for name, durations in self.durations.items()
+        }
+
+
+def _percentile(durations: List[float], percentile: float) -> float:
+    ordered = sorted(durations)
+    return ordered[max(0, ceil(percentile / 100 * len(ordered)) - 1)]
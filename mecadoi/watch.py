@@ -0,0 +1,288 @@
+"""
+Watch a directory for new MECA archives and process them as soon as they are completely written.
+
+A `Watcher` runs in a single long-running process, which keeps its database connections, worker processes and HTTP
+sessions between cycles. In every cycle it scans the input directory and passes the paths that have been stable, i.e.
+whose size and modification time have not changed for a given number of seconds, to its `ingest` callback. It also
+calls its `deposit` callback at a fixed interval.
+
+Between cycles, the watcher waits for changes in the input directory if the optional `watchdog` package is installed,
+and otherwise polls the directory.
+"""
+
+__all__ = [
+    "find_candidates",
+    "get_snapshot",
+    "get_snapshots",
+    "Snapshot",
+    "StableFiles",
+    "Watcher",
+]
+
+from logging import getLogger
+from os import lstat, scandir, walk
+from os.path import isdir, isfile, join
+from threading import Event
+from time import monotonic
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - watchdog is optional
+    FileSystemEventHandler = object
+    Observer = None
+
+LOGGER = getLogger(__name__)
+
+MIN_SCAN_INTERVAL = 1.0
+"""
+The minimum time in seconds between two scans of the input directory, unless `poll_interval` is shorter. Changes in
+the input directory during that time are handled by a single scan.
+"""
+
+
+class Snapshot(NamedTuple):
+    """The state of a file, or of a directory and its content."""
+
+    size: int
+    """The size in bytes of the file, or the total size of the files in the directory."""
+    mtime_ns: int
+    """The modification time in nanoseconds of the file, or the latest one of the files in the directory."""
+    inode: int = 0
+    """The inode number of the file or directory, which changes if it's replaced by a file with the same name."""
+
+
+def find_candidates(input_dir: str) -> Dict[str, Snapshot]:
+    """
+    Find all files in the given directory and its subdirectories and return a snapshot of each.
+
+    Directories that contain a manifest.xml file are extracted MECA archives. They are returned as a whole, with the
+    total size and the latest modification time of the files in them.
+
+    Hidden files and directories, whose names start with a dot, are ignored. These are e.g. `.DS_Store` files, editor
+    swap files, and the temporary files that rsync (`.<name>.<random suffix>`) and Pure-FTPd (`.pureftpd-upload.*`)
+    write uploads to before renaming them.
+
+    The directories are listed with `os.scandir()`, which tells files from directories and provides inode numbers
+    without an extra system call. Only files are `stat`-ed. Files and directories that are removed or renamed while
+    the input directory is scanned are left out.
+    """
+    candidates: Dict[str, Snapshot] = {}
+    directories = [input_dir]
+    while directories:
+        directory = directories.pop()
+        try:
+            with scandir(directory) as iterator:
+                entries = list(iterator)
+        except FileNotFoundError:
+            if directory == input_dir:
+                raise
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if isfile(join(entry.path, "manifest.xml")):
+                        candidates[entry.path] = _get_snapshot_of_directory(
+                            entry.path, entry.inode()
+                        )
+                    else:
+                        directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    candidates[entry.path] = Snapshot(
+                        stat.st_size, stat.st_mtime_ns, entry.inode()
+                    )
+            except FileNotFoundError:
+                continue
+    return candidates
+
+
+def get_snapshot(path: str) -> Snapshot:
+    """Return the snapshot of the given file, or of the content of the given directory."""
+    stat = lstat(path)
+    if isdir(path):
+        return _get_snapshot_of_directory(path, stat.st_ino)
+    return Snapshot(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def get_snapshots(paths: Iterable[str]) -> Dict[str, Snapshot]:
+    """Return the snapshots of the given files or directories, leaving out those that no longer exist."""
+    snapshots = {}
+    for path in paths:
+        try:
+            snapshots[path] = get_snapshot(path)
+        except FileNotFoundError:
+            LOGGER.info('"%s" was removed or renamed', path)
+    return snapshots
+
+
+def _get_snapshot_of_directory(path: str, inode: int) -> Snapshot:
+    size = 0
+    mtime_ns = 0
+    for directory, _, file_names in walk(path):
+        for file_name in file_names:
+            stat = lstat(join(directory, file_name))
+            size += stat.st_size
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+    return Snapshot(size, mtime_ns, inode)
+
+
+class StableFiles:
+    """Keeps track of paths and finds those whose snapshots have not changed for at least `stable_seconds`."""
+
+    def __init__(
+        self, stable_seconds: float, clock: Callable[[], float] = monotonic
+    ) -> None:
+        self.stable_seconds = stable_seconds
+        self._clock = clock
+        self._unchanged_since: Dict[str, Tuple[Snapshot, float]] = {}
+
+    def update(self, snapshots: Dict[str, Snapshot]) -> List[str]:
+        """
+        Record the current snapshots of all paths and return the paths that are stable, in sorted order.
+
+        Paths that are missing from `snapshots` are forgotten.
+        """
+        now = self._clock()
+        unchanged_since = {}
+        for path, snapshot in snapshots.items():
+            previous = self._unchanged_since.get(path)
+            unchanged_since[path] = (
+                previous
+                if previous is not None and previous[0] == snapshot
+                else (snapshot, now)
+            )
+        self._unchanged_since = unchanged_since
+        return sorted(
+            path
+            for path, (_, since) in unchanged_since.items()
+            if now - since >= self.stable_seconds
+        )
+
+    def forget(self, paths: List[str]) -> None:
+        """Stop keeping track of the given paths, e.g. because they were moved."""
+        for path in paths:
+            self._unchanged_since.pop(path, None)
+
+    def seconds_until_next_stable(self) -> Optional[float]:
+        """The time until the next path may become stable, or None if no path is being tracked."""
+        if not self._unchanged_since:
+            return None
+        since = min(since for _, since in self._unchanged_since.values())
+        return max(0.0, since + self.stable_seconds - self._clock())
+
+
+class Watcher:
+    """
+    Watch `input_dir` and pass stable paths to `ingest`, which must move them out of `input_dir`. Call `deposit` every
+    `deposit_interval` seconds, starting with the first cycle, unless `deposit_interval` is 0.
+
+    Exceptions raised by the callbacks are logged, and the watcher carries on with the next cycle.
+    """
+
+    def __init__(
+        self,
+        input_dir: str,
+        ingest: Callable[[List[str]], None],
+        stable_seconds: float = 10,
+        poll_interval: float = 5,
+        deposit: Optional[Callable[[], None]] = None,
+        deposit_interval: float = 0,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.input_dir = input_dir
+        self.ingest = ingest
+        self.poll_interval = poll_interval
+        """The maximum time in seconds between two scans of the input directory."""
+        self.min_scan_interval = min(poll_interval, MIN_SCAN_INTERVAL)
+        """The minimum time in seconds between two scans of the input directory."""
+        self.deposit = deposit
+        self.deposit_interval = deposit_interval
+        self._clock = clock
+        self._stable_files = StableFiles(stable_seconds, clock=clock)
+        self._next_deposit_at: Optional[float] = clock() if deposit_interval else None
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._last_scan_at: Optional[float] = None
+
+    def run(self) -> None:
+        """Run cycles until `stop()` is called."""
+        observer = self._start_observer()
+        try:
+            while not self._stopped.is_set():
+                self.run_once()
+                self._wait()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self) -> None:
+        """Stop the watcher after its current cycle. Can be called from a signal handler or another thread."""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run_once(self) -> None:
+        """Ingest all paths that are stable and deposit if it's due."""
+        self._last_scan_at = self._clock()
+        stable_paths = self._stable_files.update(find_candidates(self.input_dir))
+        if stable_paths:
+            LOGGER.info("Ingesting %s stable files", len(stable_paths))
+            try:
+                self.ingest(stable_paths)
+            except Exception:
+                LOGGER.exception("Ingesting %s failed", stable_paths)
+            self._stable_files.forget(stable_paths)
+
+        if (
+            self.deposit is not None
+            and self._next_deposit_at is not None
+            and self._clock() >= self._next_deposit_at
+        ):
+            self._next_deposit_at = self._clock() + self.deposit_interval
+            try:
+                self.deposit()
+            except Exception:
+                LOGGER.exception("Depositing failed")
+
+    def _wait(self) -> None:
+        timeouts = [self.poll_interval]
+        seconds_until_next_stable = self._stable_files.seconds_until_next_stable()
+        if seconds_until_next_stable is not None:
+            timeouts.append(seconds_until_next_stable)
+        if self._next_deposit_at is not None:
+            timeouts.append(self._next_deposit_at - self._clock())
+        self._wakeup.wait(max(0.0, min(timeouts)))
+        self._wakeup.clear()
+
+        # Writing a file causes many events in quick succession. Waiting out the minimum interval since the last scan
+        # handles them, and those of other files written meanwhile, in a single scan.
+        if self._last_scan_at is not None:
+            delay = self._last_scan_at + self.min_scan_interval - self._clock()
+            if delay > 0:
+                self._stopped.wait(delay)
+
+    def _start_observer(self) -> Any:
+        if Observer is None:
+            LOGGER.info(
+                'Polling "%s" every %s seconds', self.input_dir, self.poll_interval
+            )
+            return None
+        observer = Observer()
+        observer.schedule(_WakeUp(self._wakeup), self.input_dir, recursive=True)
+        observer.start()
+        return observer
+
+
+class _WakeUp(FileSystemEventHandler):  # type: ignore[misc]
+    """Wakes up the watcher on every change in the input directory."""
+
+    def __init__(self, wakeup: Event) -> None:
+        super().__init__()
+        self.wakeup = wakeup
+
+    def on_any_event(self, event: Any) -> None:
+        self.wakeup.set()
@@ -74,6 +74,11 @@ cmd_prune() {
     _execute_batch_command prune --no-dry-run
 }
 
+cmd_rescan_prune() {
+    echo "$(date) Batch prune rescan"
+    _execute_batch_command prune --no-dry-run --rescan
+}
+
 
 with_lock() {
     command="$@"
@@ -1,11 +1,20 @@
+from dataclasses import replace
 from datetime import datetime, timedelta
+from hashlib import sha256
 from pathlib import Path
+from multiprocessing import get_start_method
+from shutil import copyfile
+from tarfile import open as tar_open
 from typing import Iterable, List
+from unittest import skipUnless
 from unittest.mock import Mock, patch
+from zipfile import ZipFile
 
 from mecadoi.batch import add_preprint_doi, deposit, parse
+from mecadoi.bundle import BUNDLE_SEPARATOR, MAX_IN_MEMORY_SIZE
 from mecadoi.crossref.verify import VerificationResult
 from mecadoi.db import DepositionAttempt, ParsedFile
+from mecadoi.meca import parse_meca_archive, PARSER_VERSION
 from tests.common import DepositionFileTestCase, MecaArchiveTestCase
 from tests.test_article import (
     ARTICLES,
@@ -14,6 +23,7 @@ from tests.test_article import (
 )
 from tests.test_db import BatchDbTestCase
 from tests.test_meca import MANUSCRIPTS
+from tests.test_sandbox import allocate, spin
 
 
 class BaseBatchTestCase(BatchDbTestCase):
@@ -28,6 +38,7 @@ class BaseBatchTestCase(BatchDbTestCase):
 
 class BaseParseTestCase(MecaArchiveTestCase, BaseBatchTestCase):
     def setUp(self) -> None:
+        super().setUp()
         meca_names_by_status = {
             ParsedFile.Invalid: ["no-article", "no-manifest"],
             ParsedFile.NoReviews: ["no-reviews"],
@@ -48,20 +59,23 @@ class BaseParseTestCase(MecaArchiveTestCase, BaseBatchTestCase):
             ParsedFile(
                 path=self.get_meca_archive_path(meca_name),
                 received_at=datetime.now(),
+                # files without reviews are only triaged, not parsed completely
                 manuscript=MANUSCRIPTS[meca_name]
-                if status != ParsedFile.Invalid
+                if status not in [ParsedFile.Invalid, ParsedFile.NoReviews]
                 else None,
                 doi=MANUSCRIPTS[meca_name].preprint_doi
                 if status != ParsedFile.Invalid
                 else None,
                 status=status,
+                sha256=sha256(
+                    Path(self.get_meca_archive_path(meca_name)).read_bytes()
+                ).hexdigest(),
+                parser_version=PARSER_VERSION,
             )
             for status, meca_names in meca_names_by_status.items()
             for meca_name in meca_names
         ]
 
-        return super().setUp()
-
     def assert_parsed_files_in_db(
         self, expected_meca_archives: List[ParsedFile]
     ) -> None:
@@ -102,6 +116,260 @@ class ParseTestCase(BaseParseTestCase):
         self.assert_parsed_files_equal(self.expected_parsed_files, actual_parsed_files)
         self.assert_parsed_files_in_db(self.expected_parsed_files)
 
+    def test_batch_parse_duplicates(self) -> None:
+        """Verifies that files with the same preprint DOI as a file in the database are stored as duplicates."""
+        parse(self.input_files, self.db)
+        valid_files = [
+            f.path for f in self.expected_parsed_files if f.status == ParsedFile.Valid
+        ]
+
+        actual_parsed_files = parse(valid_files, self.db)
+
+        self.assertEqual(
+            [ParsedFile.Duplicate] * len(valid_files),
+            [f.status for f in actual_parsed_files],
+        )
+        self.assertEqual(
+            [None] * len(valid_files), [f.manuscript for f in actual_parsed_files]
+        )
+
+    def test_batch_parse_malformed_archives_are_only_triaged(self) -> None:
+        """
+        Verifies that files without reviews and duplicates are classified by their front matter, even if the rest of
+        their article XML is malformed.
+        """
+        parse(self.get_meca_archive_paths(["multiple-revision-rounds"]), self.db)
+        malformed_archives = {}
+        for number, meca_name in enumerate(["no-reviews", "multiple-revision-rounds"]):
+            source_dir = Path(self.MECA_SOURCE_DIR, meca_name)
+            article = (source_dir / "article.xml").read_text()
+            end_of_front_matter = article.index("</article-meta>") + len(
+                "</article-meta>"
+            )
+            malformed_archive = f"{self.MECA_TARGET_DIR}/malformed-{number}.zip"
+            with ZipFile(malformed_archive, "w") as archive:
+                for path in source_dir.iterdir():
+                    if path.name == "article.xml":
+                        archive.writestr(
+                            path.name, article[:end_of_front_matter] + "<body><p>"
+                        )
+                    else:
+                        archive.write(path, path.name)
+            with self.assertRaises(ValueError):
+                parse_meca_archive(malformed_archive)
+            malformed_archives[meca_name] = malformed_archive
+
+        parsed_files = parse(list(malformed_archives.values()), self.db)
+
+        self.assertEqual(
+            [
+                (ParsedFile.NoReviews, MANUSCRIPTS["no-reviews"].preprint_doi, None),
+                (
+                    ParsedFile.Duplicate,
+                    MANUSCRIPTS["multiple-revision-rounds"].preprint_doi,
+                    None,
+                ),
+            ],
+            [(f.status, f.doi, f.manuscript) for f in parsed_files],
+        )
+
+    def test_batch_parse_identical_files(self) -> None:
+        """Verifies that files with the same content as a file parsed before are classified without parsing them."""
+        expected_statuses = {
+            "no-article": ParsedFile.Invalid,
+            "no-reviews": ParsedFile.NoReviews,
+            "no-preprint-doi": ParsedFile.Duplicate,
+            "no-institution": ParsedFile.Duplicate,
+        }
+        copies = {}
+        for meca_name in expected_statuses:
+            # files are parsed in order of their paths, so the copies are parsed after the original files
+            copy = f"{self.MECA_TARGET_DIR}/zz-copy-of-{meca_name}.zip"
+            copyfile(self.get_meca_archive_path(meca_name), copy)
+            copies[meca_name] = copy
+
+        for in_same_batch in [True, False]:
+            with self.subTest(in_same_batch=in_same_batch):
+                self.clear_database()
+                self.db.initialize()
+                if in_same_batch:
+                    files = self.input_files + list(copies.values())
+                else:
+                    parse(self.input_files, self.db)
+                    files = list(copies.values())
+
+                with patch(
+                    "mecadoi.batch.parse_meca_archive", wraps=parse_meca_archive
+                ) as parse_mock:
+                    # the mock only sees calls in this process
+                    parsed_files = parse(files, self.db, isolate=False)
+                parsed_paths = {call.args[0] for call in parse_mock.call_args_list}
+                self.assertFalse(parsed_paths & set(copies.values()))
+
+                parsed_copies = {f.path: f for f in parsed_files}
+                for meca_name, copy in copies.items():
+                    parsed_copy = parsed_copies[copy]
+                    self.assertEqual(expected_statuses[meca_name], parsed_copy.status)
+                    self.assertIsNone(parsed_copy.manuscript)
+                    self.assertEqual(
+                        MANUSCRIPTS[meca_name].preprint_doi
+                        if meca_name != "no-article"
+                        else None,
+                        parsed_copy.doi,
+                    )
+
+    def test_batch_parse_identical_files_with_new_parser_version(self) -> None:
+        """Verifies that results of earlier parser versions are not reused."""
+        parse(self.input_files, self.db)
+        valid_file = self.get_meca_archive_path("no-institution")
+        copy = f"{self.MECA_TARGET_DIR}/copy-of-no-institution.zip"
+        copyfile(valid_file, copy)
+
+        with patch("mecadoi.batch.PARSER_VERSION", PARSER_VERSION + 1):
+            [parsed_copy] = parse([copy], self.db)
+
+        # the preprint DOI is already in the database, but the copy was parsed again
+        self.assertEqual(ParsedFile.Duplicate, parsed_copy.status)
+        self.assertEqual(PARSER_VERSION + 1, parsed_copy.parser_version)
+
+    @skipUnless(
+        get_start_method() == "fork",
+        "the worker process must inherit the patched parser",
+    )
+    def test_batch_parse_bundles(self) -> None:
+        """Verifies that the MECA archives in TAR and ZIP bundles are parsed."""
+        bundles = {
+            "tar": f"{self.MECA_TARGET_DIR}/bundle.tar",
+            "tar.gz": f"{self.MECA_TARGET_DIR}/bundle.tar.gz",
+            "zip": f"{self.MECA_TARGET_DIR}/bundle.zip",
+        }
+        for bundle_type, bundle in bundles.items():
+            if bundle_type == "zip":
+                with ZipFile(bundle, "w") as zip_bundle:
+                    for path in self.input_files:
+                        zip_bundle.write(path, Path(path).name)
+            else:
+                with tar_open(
+                    bundle, "w:gz" if bundle_type == "tar.gz" else "w"
+                ) as tar:
+                    for path in self.input_files:
+                        tar.add(path, Path(path).name)
+        expected_parsed_files = self.expected_parsed_files_in_bundle(bundles["tar"])
+
+        for bundle_type, bundle in bundles.items():
+            for max_in_memory_size in [MAX_IN_MEMORY_SIZE, 0]:
+                with self.subTest(
+                    bundle_type=bundle_type, max_in_memory_size=max_in_memory_size
+                ), patch("mecadoi.bundle.MAX_IN_MEMORY_SIZE", max_in_memory_size):
+                    self.clear_database()
+                    self.db.initialize()
+                    actual_parsed_files = parse([bundle], self.db)
+
+                    expected_parsed_files = self.expected_parsed_files_in_bundle(bundle)
+                    self.assert_parsed_files_equal(
+                        expected_parsed_files, actual_parsed_files
+                    )
+                    self.assert_parsed_files_in_db(expected_parsed_files)
+
+    def test_batch_parse_truncated_bundle(self) -> None:
+        """Verifies that the MECA archives before the end of a truncated bundle are kept."""
+        bundle = f"{self.MECA_TARGET_DIR}/bundle.tar"
+        with tar_open(bundle, "w") as tar:
+            for path in self.input_files:
+                tar.add(path, Path(path).name)
+        content = Path(bundle).read_bytes()
+        Path(bundle).write_bytes(content[: len(content) // 2])
+
+        actual_parsed_files = parse([bundle], self.db)
+
+        *parsed_archives, parsed_bundle = actual_parsed_files
+        self.assertEqual(bundle, parsed_bundle.path)
+        self.assertEqual(ParsedFile.Invalid, parsed_bundle.status)
+        self.assertTrue(parsed_archives)
+        expected_parsed_files = self.expected_parsed_files_in_bundle(bundle)
+        self.assert_parsed_files_equal(
+            expected_parsed_files[: len(parsed_archives)], parsed_archives
+        )
+
+    def test_batch_parse_extracted_archives(self) -> None:
+        """Verifies that directories with extracted MECA archives are parsed."""
+        paths = {
+            meca_name: f"{self.MECA_SOURCE_DIR}/{meca_name}"
+            for meca_name in ["no-institution", "no-reviews"]
+        }
+
+        actual_parsed_files = parse(list(paths.values()), self.db)
+
+        self.assertEqual(
+            [ParsedFile.Valid, ParsedFile.NoReviews],
+            [f.status for f in actual_parsed_files],
+        )
+        self.assertEqual(
+            MANUSCRIPTS["no-institution"], actual_parsed_files[0].manuscript
+        )
+
+    def expected_parsed_files_in_bundle(self, bundle: str) -> List[ParsedFile]:
+        """The expected parsed files if the input files are in the given bundle, in the order of the input files."""
+        expected_parsed_files = {f.path: f for f in self.expected_parsed_files}
+        return [
+            replace(
+                expected_parsed_files[path],
+                path=f"{bundle}{BUNDLE_SEPARATOR}{Path(path).name}",
+            )
+            for path in self.input_files
+        ]
+
+    @patch("mecadoi.batch.PARSE_MEMORY_LIMIT", 64)
+    @patch("mecadoi.batch.PARSE_CPU_LIMIT", 1)
+    def test_batch_parse_files_exceeding_limits(self) -> None:
+        """Verifies that files that take too long or too much memory to parse are stored as invalid."""
+        path = self.get_meca_archive_path("no-institution")
+        pathological_parsers = {
+            "cpu": lambda _: spin(),
+            "memory": lambda _: allocate(1024 * 1024 * 1024),
+        }
+        for limit, pathological_parser in pathological_parsers.items():
+            with self.subTest(limit=limit):
+                self.clear_database()
+                self.db.initialize()
+                with patch("mecadoi.meca._triage", pathological_parser):
+                    [parsed_file] = parse([path], self.db)
+                self.assertEqual(ParsedFile.LimitExceeded, parsed_file.status)
+
+    @skipUnless(
+        get_start_method() == "fork",
+        "the worker process must inherit the patched parser",
+    )
+    @patch("mecadoi.batch.PARSE_CPU_LIMIT", 1)
+    def test_batch_parse_files_exceeding_limits_again(self) -> None:
+        """Verifies that files whose parse exceeded the limits are parsed again when their content is received again."""
+        path = self.get_meca_archive_path("no-institution")
+        copy = f"{self.MECA_TARGET_DIR}/zz-copy-of-no-institution.zip"
+        copyfile(path, copy)
+        with patch("mecadoi.meca._triage", lambda _: spin()):
+            parsed_files = parse([path], self.db)
+        self.assertEqual([ParsedFile.LimitExceeded], [f.status for f in parsed_files])
+
+        [parsed_copy] = parse([copy], self.db)
+
+        self.assertEqual(ParsedFile.Valid, parsed_copy.status)
+        self.assertEqual(MANUSCRIPTS["no-institution"], parsed_copy.manuscript)
+
+    def test_batch_parse_files_exceeding_archive_limits_again(self) -> None:
+        """Verifies that archives that exceeded the archive limits are parsed again after the limits were raised."""
+        path = self.get_meca_archive_path("no-institution")
+        copy = f"{self.MECA_TARGET_DIR}/zz-copy-of-no-institution.zip"
+        copyfile(path, copy)
+        with patch("mecadoi.batch.PARSE_MAX_MEMBERS", 1):
+            parsed_files = parse([path], self.db)
+        self.assertEqual([ParsedFile.LimitExceeded], [f.status for f in parsed_files])
+        self.assertIsNone(parsed_files[0].doi)
+
+        [parsed_copy] = parse([copy], self.db)
+
+        self.assertEqual(ParsedFile.Valid, parsed_copy.status)
+        self.assertEqual(MANUSCRIPTS["no-institution"], parsed_copy.manuscript)
+
 
 class BaseDepositTestCase(DepositionFileTestCase, BaseBatchTestCase):
     """Verifies that the mecadoi.batch.deposit function works as expected."""
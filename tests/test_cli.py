@@ -1,25 +1,41 @@
 from dataclasses import asdict
-from datetime import datetime
-from os import mkdir
+from datetime import datetime, timedelta
+from json import loads
+from pstats import Stats
+from os import environ, mkdir
 from pathlib import Path
-from shutil import rmtree
+from shutil import copytree, rmtree
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
 from typing import Any, Dict, List
+from unittest import skipIf
 from unittest.mock import Mock, patch
 from click.testing import CliRunner, Result
-from yaml import Loader, load, safe_load
+from yaml import Loader, load, safe_load, safe_load_all
 from mecadoi.article import Article
 from mecadoi.cli.batch.commands import (
+    GROUPS_BY_STATUS,
     group_deposition_attempts_by_status,
     group_parsed_files_by_status,
 )
 from mecadoi.cli.main import main as mecadoi
+from mecadoi.cli.profile import SamplingProfiler
 from mecadoi.config import DB_URL
 from mecadoi.crossref.verify import VerificationResult
-from mecadoi.db import DepositionAttempt, ParsedFile
+from mecadoi.db import (
+    BatchRun,
+    DepositionAttempt,
+    FileLease,
+    ParsedFile,
+    SeenFile,
+)
+from mecadoi.watch import Watcher
 from tests.common import MecaArchiveTestCase
 from tests.test_article import DOI_FOR_REVIEWS_AND_AUTHOR_REPLIES
 from tests.test_batch import BaseDepositTestCase, BaseParseTestCase
 from tests.test_db import BatchDbTestCase
+from tests.test_meca import MANUSCRIPTS
 
 
 class CliTestCase(MecaArchiveTestCase):
@@ -47,6 +63,86 @@ class MecaTestCase(CliTestCase):
         self.assertIn(publisher, result.output)
 
 
+class LazyImportTestCase(CliTestCase):
+    def test_meca_info_imports_no_database_or_crossref_modules(self) -> None:
+        """Commands only import the modules they need, so that they start quickly."""
+        test_file = self.get_meca_archive_path("multiple-revision-rounds")
+        code = (
+            "import sys\n"
+            "from mecadoi.cli.main import main\n"
+            f"main(['meca', 'info', '{test_file}'], standalone_mode=False)\n"
+            "print(sorted({name.split('.')[0] for name in sys.modules}))\n"
+        )
+        process = run([executable, "-c", code], capture_output=True, text=True)
+        self.assertEqual(0, process.returncode, process.stderr)
+        imported_packages = process.stdout.splitlines()[-1]
+        for package in ["sqlalchemy", "xsdata", "requests"]:
+            self.assertNotIn(f"'{package}'", imported_packages)
+        self.assertIn("'lxml'", imported_packages)
+
+    def test_help_lists_all_commands(self) -> None:
+        result = self.run_mecadoi_command(["--help"])
+        self.assertEqual(0, result.exit_code)
+        for command in ["batch", "crossref", "meca"]:
+            self.assertIn(command, result.output)
+
+
+class ProfileTestCase(CliTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.runner = CliRunner(mix_stderr=False)
+        self.test_file = self.get_meca_archive_path("multiple-revision-rounds")
+        profile_dir = TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_dir = Path(profile_dir.name)
+
+    def test_profile(self) -> None:
+        profile_path = str(self.profile_dir / "mecadoi.prof")
+        result = self.run_mecadoi_command(
+            [
+                "--profile",
+                profile_path,
+                "--profile-top",
+                "3",
+                "meca",
+                "info",
+                self.test_file,
+            ]
+        )
+        self.assertEqual(0, result.exit_code, result.stderr)
+
+        self.assertEqual(
+            self.run_mecadoi_command(["meca", "info", self.test_file]).output,
+            result.output,
+        )
+        summary = result.stderr.splitlines()
+        self.assertTrue(summary[0].startswith(f'Profile written to "{profile_path}"'))
+        self.assertEqual(4, len(summary))
+        self.assertGreater(Stats(profile_path).total_calls, 0)  # type: ignore[attr-defined]
+
+    @skipIf(SamplingProfiler is None, "pyinstrument is not installed")
+    def test_profile_with_sampling_profiler(self) -> None:
+        profile_path = str(self.profile_dir / "mecadoi.html")
+        result = self.run_mecadoi_command(
+            ["--profile", profile_path, "meca", "info", self.test_file]
+        )
+        self.assertEqual(0, result.exit_code, result.stderr)
+
+        self.assertIn("<html", Path(profile_path).read_text())
+        self.assertTrue(
+            result.stderr.startswith(f'Profile written to "{profile_path}"')
+        )
+
+    @patch("mecadoi.cli.profile.SamplingProfiler", None)
+    def test_profile_requires_sampling_profiler_for_html(self) -> None:
+        profile_path = str(self.profile_dir / "mecadoi.html")
+        result = self.run_mecadoi_command(
+            ["--profile", profile_path, "meca", "info", self.test_file]
+        )
+        self.assertEqual(2, result.exit_code)
+        self.assertIn("pyinstrument", result.stderr)
+
+
 class BaseBatchTestCase(CliTestCase, BatchDbTestCase):
     def setUp(self) -> None:
         self.output_directory = "tests/tmp/batch"
@@ -75,6 +171,26 @@ class BaseBatchTestCase(CliTestCase, BatchDbTestCase):
         self.assertEqual(expected, actual_output)
         return actual_output
 
+    def assert_batch_run_recorded(
+        self,
+        actual_output: Dict[str, Any],
+        command: str,
+        files: int,
+        stages: List[str],
+    ) -> BatchRun:
+        batch_runs: List[BatchRun] = self.db.fetch_all(BatchRun)
+        [batch_run] = batch_runs
+        self.assertEqual(
+            (actual_output["id"], command, files, sorted(stages)),
+            (
+                batch_run.id,
+                batch_run.command,
+                batch_run.files,
+                sorted(batch_run.stages),
+            ),
+        )
+        return batch_run
+
 
 OutputDirName = "deadbeef-2708-4afb-bbde-5890bd7e8fd0"
 
@@ -95,6 +211,8 @@ class ParseTestCase(BaseBatchTestCase, BaseParseTestCase):
                 manuscript=parsed_file.manuscript,
                 doi=parsed_file.doi,
                 status=parsed_file.status,
+                sha256=parsed_file.sha256,
+                parser_version=parsed_file.parser_version,
             )
             for parsed_file in self.expected_parsed_files
         ]
@@ -113,6 +231,166 @@ class ParseTestCase(BaseBatchTestCase, BaseParseTestCase):
 
         self.assert_parsed_files_in_db(self.expected_parsed_files)
         self.assert_input_files_are_in_output_dir(actual_output)
+        self.assertEqual(
+            sorted(parsed_file.path for parsed_file in self.expected_parsed_files),
+            sorted(seen_file.path for seen_file in self.db.fetch_all(SeenFile)),
+        )
+        self.assert_batch_run_recorded(
+            actual_output,
+            BatchRun.Parse,
+            len(self.expected_parsed_files),
+            [
+                "discovery",
+                "claim",
+                "archive_open",
+                "xml_triage",
+                "xml_parse",
+                "db_insert",
+            ],
+        )
+
+    def test_batch_parse_timings(self, _uuid_mock: Mock) -> None:
+        """Verifies that the duration of the run and of its stages is only printed with `--timings`."""
+        result = self.run_mecadoi_command(
+            [
+                "batch",
+                "parse",
+                "-o",
+                self.output_directory,
+                "--timings",
+                self.input_directory,
+            ]
+        )
+        self.assertEqual(0, result.exit_code)
+
+        actual_output = safe_load(result.output)
+        batch_run = self.assert_batch_run_recorded(
+            actual_output,
+            BatchRun.Parse,
+            len(self.expected_parsed_files),
+            [
+                "discovery",
+                "claim",
+                "archive_open",
+                "xml_triage",
+                "xml_parse",
+                "db_insert",
+            ],
+        )
+        run = actual_output["run"]
+        self.assertEqual(
+            (batch_run.files, batch_run.seconds, batch_run.stages),
+            (run["files"], run["seconds"], run["stages"]),
+        )
+        self.assertIn("timings", actual_output)
+
+    def test_batch_parse_in_chunks(self, _uuid_mock: Mock) -> None:
+        """Verifies that files are claimed and parsed a chunk at a time, and that their leases are released."""
+        result = self.run_mecadoi_command(
+            [
+                "batch",
+                "parse",
+                "-o",
+                self.output_directory,
+                "--claim-size",
+                "1",
+                self.input_directory,
+            ]
+        )
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(
+            sorted(parsed_file.path for parsed_file in self.expected_parsed_files),
+            sorted(parsed_file.path for parsed_file in self.db.fetch_all(ParsedFile)),
+        )
+        self.assertEqual([], self.db.fetch_all(FileLease))
+
+    @patch("mecadoi.cli.batch.commands.batch_parse", side_effect=ValueError("failed"))
+    def test_batch_parse_returns_files_if_parsing_fails(
+        self, _batch_parse_mock: Mock, _uuid_mock: Mock
+    ) -> None:
+        """Verifies that the leases are released and the files returned to the input directory if parsing fails."""
+        input_files = sorted(Path(self.input_directory).iterdir())
+        result = self.run_mecadoi_command(
+            ["batch", "parse", "-o", self.output_directory, self.input_directory]
+        )
+        self.assertNotEqual(0, result.exit_code)
+        self.assertEqual([], self.db.fetch_all(FileLease))
+        self.assertEqual(input_files, sorted(Path(self.input_directory).iterdir()))
+
+    def test_batch_parse_leaves_incomplete_files(self, _uuid_mock: Mock) -> None:
+        """Verifies that files that are still being written are left in the input directory."""
+        partial_file = f"{self.input_directory}/.upload.zip.Ab12Cd"
+        with open(self.meca_archives[0], "rb") as archive:
+            Path(partial_file).write_bytes(archive.read(100))
+
+        result = self.run_mecadoi_command(
+            ["batch", "parse", "-o", self.output_directory, self.input_directory]
+        )
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(
+            sorted(parsed_file.path for parsed_file in self.expected_parsed_files),
+            sorted(parsed_file.path for parsed_file in self.db.fetch_all(ParsedFile)),
+        )
+        self.assertTrue(Path(partial_file).exists())
+
+    def test_batch_parse_extracted_archive(self, _uuid_mock: Mock) -> None:
+        """Verifies that directories with a manifest in the input directory are parsed as one MECA archive."""
+        input_directory = f"{self.MECA_TARGET_DIR}/input"
+        copytree(
+            f"{self.MECA_SOURCE_DIR}/no-institution",
+            f"{input_directory}/no-institution",
+        )
+        result = self.run_mecadoi_command(
+            ["batch", "parse", "-o", self.output_directory, input_directory]
+        )
+        self.assertEqual(0, result.exit_code)
+        expected_output = {
+            "ready_for_deposition": [
+                f"{self.output_directory}/parsed/{OutputDirName}/no-institution"
+                f"|{MANUSCRIPTS['no-institution'].preprint_doi}"
+            ]
+        }
+        self.assert_cli_output_equal(expected_output, result, ["id"])
+
+    @patch.object(Watcher, "run", Watcher.run_once)
+    @patch(
+        "mecadoi.cli.batch.commands.deposit_files",
+        return_value=([], {"id": OutputDirName, "dry_run": True}),
+    )
+    def test_batch_watch(self, deposit_mock: Mock, _uuid_mock: Mock) -> None:
+        """Verifies that a cycle of the watch command parses stable files and deposits DOIs."""
+        result = self.run_mecadoi_command(
+            [
+                "batch",
+                "watch",
+                "-o",
+                self.output_directory,
+                "--stable-seconds",
+                "0",
+                "--deposit-interval",
+                "60",
+                "--deposit-delay",
+                "2",
+                self.input_directory,
+            ]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+
+        parse_output, deposit_output = safe_load_all(result.output)
+        expected_output = group_parsed_files_by_status(self.expected_parsed_files)
+        expected_output["id"] = OutputDirName
+        self.assertEqual(expected_output, parse_output)
+        self.assertEqual({"id": OutputDirName, "dry_run": True}, deposit_output)
+        self.assert_parsed_files_in_db(self.expected_parsed_files)
+        self.assertEqual([], list(Path(self.input_directory).iterdir()))
+
+        deposit_mock.assert_called_once()
+        self.assert_timestamps_within_interval(
+            datetime.now() - timedelta(days=2),
+            deposit_mock.call_args.kwargs["before"],
+            timedelta(minutes=5),
+        )
+        self.assertTrue(deposit_mock.call_args.kwargs["dry_run"])
 
     def assert_input_files_are_in_output_dir(self, actual: Dict[str, Any]) -> None:
         expected_output_dir = f'{self.output_directory}/parsed/{actual["id"]}'
@@ -154,6 +432,7 @@ class DepositTestCase(BaseBatchTestCase, BaseDepositTestCase):
         self.assert_deposition_attempts_in_db([])
         self.assert_articles_in_output_dir(actual_output["id"], [])
         deposit_file_mock.assert_not_called()
+        self.assertEqual([], self.db.fetch_all(BatchRun))
 
     def test_batch_deposit(
         self,
@@ -173,6 +452,12 @@ class DepositTestCase(BaseBatchTestCase, BaseDepositTestCase):
         self.assert_deposition_attempts_in_db(self.expected_deposition_attempts())
         self.assert_articles_in_output_dir(actual_output["id"], self.expected_articles)
         self.assertEqual(len(self.parsed_files), len(deposit_file_mock.mock_calls))
+        self.assert_batch_run_recorded(
+            actual_output,
+            BatchRun.Deposit,
+            len(self.parsed_files),
+            ["xml_generation", "eeb_verification", "crossref_post", "db_commit"],
+        )
 
     def test_batch_deposit_retry(
         self,
@@ -269,6 +554,226 @@ class DepositTestCase(BaseBatchTestCase, BaseDepositTestCase):
         return expected_output
 
 
+class ListTestCase(BaseBatchTestCase):
+    def test_ls_without_crossref_settings(self) -> None:
+        """Commands that don't generate or send depositions run without the Crossref settings."""
+        self.db.insert_parsed_files(
+            [
+                ParsedFile(
+                    path="a.zip",
+                    received_at=datetime(2022, 1, 1),
+                    status=ParsedFile.Invalid,
+                )
+            ]
+        )
+        env = {
+            name: value
+            for name, value in environ.items()
+            if not name.startswith("CROSSREF_")
+        }
+        env.update(ENV_FILE="/dev/null", DB_URL=DB_URL)
+
+        process = run(
+            [executable, "-m", "mecadoi", "batch", "ls"],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+
+        self.assertEqual(0, process.returncode, process.stderr)
+        self.assertIn("a.zip", process.stdout)
+
+    def test_ls_reviews(self) -> None:
+        manuscript = MANUSCRIPTS["single-revision-round"]
+        self.db.insert_parsed_files(
+            [
+                ParsedFile(
+                    path="single-revision-round.zip",
+                    received_at=datetime(2022, 1, 1),
+                    manuscript=manuscript,
+                    doi=manuscript.preprint_doi,
+                    status=ParsedFile.Valid,
+                )
+            ]
+        )
+
+        result = self.run_mecadoi_command(["batch", "ls", "--reviews"])
+        self.assertEqual(0, result.exit_code)
+
+        expected_output = {
+            "pending": [
+                f"{manuscript.preprint_doi} - {revision_round.revision_id} - {running_number}"
+                for revision_round in manuscript.review_process or []
+                for running_number in [
+                    review.running_number for review in revision_round.reviews
+                ]
+                + (["author reply"] if revision_round.author_reply else [])
+            ]
+        }
+        self.assert_cli_output_equal(expected_output, result, [])
+
+    def test_ls_timings(self) -> None:
+        result = self.run_mecadoi_command(["batch", "ls", "--timings"])
+        self.assertEqual(0, result.exit_code)
+
+        timings = safe_load(result.output)["timings"]
+        self.assertEqual(0, timings["slow_queries"])
+        self.assertEqual(
+            {"stream_parsed_files_between"},
+            set(timings["db"].keys()),
+        )
+        self.assertEqual(1, timings["db"]["stream_parsed_files_between"]["calls"])
+        self.assertGreaterEqual(
+            timings["total_seconds"],
+            timings["db"]["stream_parsed_files_between"]["seconds"],
+        )
+
+    def insert_files(self) -> List[ParsedFile]:
+        manuscript = MANUSCRIPTS["single-revision-round"]
+        parsed_files = [
+            ParsedFile(
+                path="valid.zip",
+                received_at=datetime(2022, 1, 1),
+                manuscript=manuscript,
+                doi=manuscript.preprint_doi,
+                status=ParsedFile.Valid,
+            ),
+            ParsedFile(
+                path="invalid.zip",
+                received_at=datetime(2022, 1, 2),
+                status=ParsedFile.Invalid,
+            ),
+            ParsedFile(
+                path="no-reviews.zip",
+                received_at=datetime(2022, 1, 3),
+                doi="10.1101/no.reviews",
+                status=ParsedFile.NoReviews,
+            ),
+        ]
+        self.db.insert_parsed_files(parsed_files)
+        return parsed_files
+
+    def test_ls_jsonl(self) -> None:
+        parsed_files = self.insert_files()
+
+        result = self.run_mecadoi_command(["batch", "ls", "--format", "jsonl"])
+        self.assertEqual(0, result.exit_code, result.output)
+
+        self.assertEqual(
+            [
+                {
+                    "path": parsed_file.path,
+                    "doi": parsed_file.doi,
+                    "status": GROUPS_BY_STATUS[parsed_file.status],
+                    "received_at": parsed_file.received_at.isoformat(),
+                }
+                for parsed_file in parsed_files
+            ],
+            [loads(line) for line in result.output.splitlines()],
+        )
+
+    def test_ls_reviews_jsonl(self) -> None:
+        [parsed_file, *_] = self.insert_files()
+        manuscript = MANUSCRIPTS["single-revision-round"]
+
+        result = self.run_mecadoi_command(
+            ["batch", "ls", "--reviews", "--format", "jsonl"]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+
+        records = [loads(line) for line in result.output.splitlines()]
+        self.assertEqual(
+            [
+                (manuscript.preprint_doi, revision_round.revision_id, running_number)
+                for revision_round in manuscript.review_process or []
+                for running_number in [
+                    *[review.running_number for review in revision_round.reviews],
+                    *([None] if revision_round.author_reply else []),
+                ]
+            ],
+            [
+                (
+                    record["preprint_doi"],
+                    record["revision_id"],
+                    record["running_number"],
+                )
+                for record in records
+            ],
+        )
+        for record in records:
+            self.assertEqual("pending", record["status"])
+            self.assertEqual(parsed_file.received_at.isoformat(), record["received_at"])
+
+    def test_ls_summary(self) -> None:
+        self.insert_files()
+
+        result = self.run_mecadoi_command(["batch", "ls", "--summary"])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(
+            {"ready_for_deposition": 1, "invalid": 1, "no_reviews": 1},
+            safe_load(result.output),
+        )
+
+        result = self.run_mecadoi_command(
+            ["batch", "ls", "--reviews", "--summary", "--format", "jsonl"]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(
+            [{"status": "pending", "count": 3}],
+            [loads(line) for line in result.output.splitlines()],
+        )
+
+
+class StatsTestCase(BaseBatchTestCase):
+    def test_stats(self) -> None:
+        now = datetime.now()
+        self.db.insert_all(
+            [
+                ParsedFile(
+                    path=f"{status}.zip",
+                    received_at=now - timedelta(days=2),
+                    status=status,
+                )
+                for status in [ParsedFile.Valid, ParsedFile.Invalid]
+            ]
+        )
+        self.db.mark_doi_as_used("10.1/1", "resource")
+
+        result = self.run_mecadoi_command(["batch", "stats", "--days", "3"])
+        self.assertEqual(0, result.exit_code, result.output)
+
+        stats = safe_load(result.output)
+        self.assertEqual(
+            {"ready_for_deposition": 1, "invalid": 1}, stats["parsed_files"]
+        )
+        self.assertEqual({}, stats["deposition_attempts"])
+        self.assertEqual(
+            {str((now - timedelta(days=2)).date()): {"received": 2}},
+            stats["per_day"],
+        )
+        self.assertEqual(1, stats["backlog"]["files"])
+        self.assertEqual(
+            {"p50", "p90", "p99", "max"}, set(stats["backlog"]["age_days"])
+        )
+        self.assertAlmostEqual(2, stats["backlog"]["age_days"]["max"], places=1)
+        self.assertEqual(
+            {now.year: {"used": 1, "available": 999_999, "utilization": 1e-06}},
+            stats["dois"],
+        )
+
+    @patch("mecadoi.config.DOI_TEMPLATE", "10.15252/rc.$random")
+    def test_stats_without_year_in_doi_template(self) -> None:
+        self.db.mark_doi_as_used("10.1/1", "resource")
+
+        result = self.run_mecadoi_command(["batch", "stats"])
+        self.assertEqual(0, result.exit_code, result.output)
+
+        self.assertEqual(
+            {"all": {"used": 1, "available": 999_999, "utilization": 1e-06}},
+            safe_load(result.output)["dois"],
+        )
+
+
 class PruneTestCase(BaseBatchTestCase):
     def path(self, filename: str) -> Path:
         return Path(self.output_directory) / filename
@@ -304,7 +809,9 @@ class PruneTestCase(BaseBatchTestCase):
         self.assert_files_exist(self.existing_files)
         self.assert_files_do_not_exist(self.already_pruned_files)
 
-        result = self.run_mecadoi_command(["batch", "prune", "--no-dry-run"])
+        result = self.run_mecadoi_command(
+            ["batch", "prune", "--no-dry-run", "--rescan"]
+        )
         self.assertEqual(0, result.exit_code)
 
         expected_output = {
@@ -314,13 +821,119 @@ class PruneTestCase(BaseBatchTestCase):
         self.assert_cli_output_equal(expected_output, result, [])
 
         self.assert_files_do_not_exist(self.already_pruned_files + self.existing_files)
+        for parsed_file in self.db.fetch_all(ParsedFile):
+            self.assertIsNotNone(parsed_file.pruned_at)
+
+    def test_prune_files_jsonl(self) -> None:
+        result = self.run_mecadoi_command(
+            ["batch", "prune", "--rescan", "--format", "jsonl"]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+
+        self.assertEqual(
+            [
+                *[
+                    {"path": str(self.path(filename)), "status": "would_delete"}
+                    for filename in self.existing_files
+                ],
+                {"dry_run": True},
+            ],
+            [loads(line) for line in result.output.splitlines()],
+        )
+        self.assert_files_exist(self.existing_files)
+
+    def test_prune_only_checks_unpruned_files(self) -> None:
+        self.run_mecadoi_command(["batch", "prune", "--no-dry-run", "--rescan"])
+        self.path("exists.zip").write_text("this file is present again")
+
+        with patch("mecadoi.cli.batch.commands.path_exists") as path_exists_mock:
+            result = self.run_mecadoi_command(
+                ["batch", "prune", "--no-dry-run", "--rescan"]
+            )
+        self.assertEqual(0, result.exit_code)
+        self.assert_cli_output_equal({"dry_run": False}, result, [])
+        path_exists_mock.assert_not_called()
+        self.assert_files_exist(["exists.zip"])
+
+    def test_prune_recorded_files(self) -> None:
+        """Verifies that only files recorded when they were moved are deleted, unless they are still leased."""
+        self.path("leased.zip").write_text("this file is being parsed")
+        self.db.record_seen_files(
+            [
+                SeenFile(
+                    path=str(self.path(filename)),
+                    size=20,
+                    mtime_ns=0,
+                    inode=0,
+                    status=SeenFile.Archived,
+                    seen_at=datetime.now(),
+                )
+                for filename in ["exists.zip", "leased.zip"]
+            ]
+        )
+        self.db.acquire_lease(
+            FileLease(
+                path="input/leased.zip",
+                staged_path=str(self.path("leased.zip")),
+                worker_id="worker",
+                claimed_at=datetime.now(),
+                expires_at=datetime.now(),
+            )
+        )
+
+        result = self.run_mecadoi_command(["batch", "prune", "--no-dry-run"])
+        self.assertEqual(0, result.exit_code)
+
+        expected_output = {
+            "deleted": [str(self.path("exists.zip"))],
+            "dry_run": False,
+        }
+        self.assert_cli_output_equal(expected_output, result, [])
+        self.assert_files_do_not_exist(["exists.zip"])
+        self.assert_files_exist(["yes.zml", "leased.zip"])
+        self.assertEqual(
+            [str(self.path("leased.zip"))],
+            [seen_file.path for seen_file in self.db.fetch_all(SeenFile)],
+        )
+
+    def test_prune_bundles_and_extracted_archives(self) -> None:
+        self.path("bundle.tar").write_text("this file is present")
+        self.path("extracted").mkdir()
+        self.path("extracted/manifest.xml").write_text("this file is present")
+        self.db.insert_all(
+            [
+                ParsedFile(path=path, received_at=datetime.now())
+                for path in [
+                    f"{self.path('bundle.tar')}!/first.zip",
+                    f"{self.path('bundle.tar')}!/second.zip",
+                    str(self.path("extracted")),
+                ]
+            ]
+        )
+
+        result = self.run_mecadoi_command(
+            ["batch", "prune", "--no-dry-run", "--rescan"]
+        )
+        self.assertEqual(0, result.exit_code)
+
+        expected_output = {
+            "deleted": sorted(
+                str(self.path(filename))
+                for filename in self.existing_files + ["bundle.tar", "extracted"]
+            ),
+            "dry_run": False,
+        }
+        self.assert_cli_output_equal(expected_output, result, [])
+        self.assert_files_do_not_exist(["bundle.tar", "extracted"])
 
     @patch("mecadoi.cli.batch.commands.remove", side_effect=ValueError("failed"))
     def test_prune_files_fails(self, _remove_mock: Mock) -> None:
         self.assert_files_exist(self.existing_files)
         self.assert_files_do_not_exist(self.already_pruned_files)
 
-        result = self.run_mecadoi_command(["batch", "prune", "--no-dry-run"])
+        result = self.run_mecadoi_command(
+            ["batch", "prune", "--no-dry-run", "--rescan"]
+        )
         self.assertEqual(0, result.exit_code)
 
         expected_output = {
@@ -328,12 +941,20 @@ class PruneTestCase(BaseBatchTestCase):
             "failed": [str(self.path(filename)) for filename in self.existing_files],
         }
         self.assert_cli_output_equal(expected_output, result, [])
+        self.assertEqual(
+            sorted(str(self.path(filename)) for filename in self.already_pruned_files),
+            sorted(
+                parsed_file.path
+                for parsed_file in self.db.fetch_all(ParsedFile)
+                if parsed_file.pruned_at is not None
+            ),
+        )
 
     def test_prune_files_dry_run(self) -> None:
         self.assert_files_exist(self.existing_files)
         self.assert_files_do_not_exist(self.already_pruned_files)
 
-        result = self.run_mecadoi_command(["batch", "prune"])
+        result = self.run_mecadoi_command(["batch", "prune", "--rescan"])
         self.assertEqual(0, result.exit_code)
 
         expected_output = {
@@ -0,0 +1,47 @@
+from pathlib import Path
+from unittest import TestCase
+from zlib import compress as zlib_compress
+from mecadoi.compression import (
+    COMPRESSION_LEVEL,
+    DICTIONARY_V1,
+    compress,
+    decompress,
+)
+
+
+class CompressionTestCase(TestCase):
+    def test_round_trip(self) -> None:
+        for file in Path("tests/resources/expected").glob("*"):
+            with self.subTest(file=file.name):
+                text = file.read_text()
+                compressed = compress(text)
+                self.assertEqual(text, decompress(compressed))
+                self.assertLess(len(compressed), len(text.encode()))
+
+    def test_dictionary_improves_compression(self) -> None:
+        text = Path("tests/resources/expected/multiple-revision-rounds.xml").read_text()
+        self.assertLess(
+            len(compress(text)),
+            len(zlib_compress(text.encode(), COMPRESSION_LEVEL)) * 0.6,
+        )
+
+    def test_incompressible_text_is_stored(self) -> None:
+        for text in ["", "ä", "x"]:
+            with self.subTest(text=text):
+                compressed = compress(text)
+                self.assertEqual(b"\x00\x00" + text.encode("utf-8"), compressed)
+                self.assertEqual(text, decompress(compressed))
+
+    def test_decompress_legacy_values(self) -> None:
+        """Values written before compression was introduced are returned unchanged."""
+        text = "<doi_batch>ä</doi_batch>"
+        self.assertEqual(text, decompress(text))
+        self.assertEqual(text, decompress(text.encode("utf-8")))
+        self.assertEqual(text, decompress(memoryview(text.encode("utf-8"))))
+
+    def test_decompress_unknown_format(self) -> None:
+        with self.assertRaises(ValueError):
+            decompress(b"\x00\xffdata")
+
+    def test_dictionary_fits_into_zlib_window(self) -> None:
+        self.assertLessEqual(len(DICTIONARY_V1), 32 * 1024)
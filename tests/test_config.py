@@ -0,0 +1,45 @@
+from os import environ
+from subprocess import run
+from sys import executable
+from unittest import TestCase
+
+
+class ConfigTestCase(TestCase):
+    def run_python(self, code: str) -> str:
+        """Run the given code in a new Python process without any configuration file or Crossref credentials."""
+        env = {
+            name: value
+            for name, value in environ.items()
+            if not name.startswith("CROSSREF_")
+        }
+        env["ENV_FILE"] = "/dev/null"
+        process = run([executable, "-c", code], env=env, capture_output=True, text=True)
+        self.assertEqual(0, process.returncode, process.stderr)
+        return process.stdout
+
+    def test_settings_are_read_on_first_use(self) -> None:
+        output = self.run_python(
+            "import os\n"
+            "import mecadoi.config as config\n"
+            "os.environ['PARSE_CPU_LIMIT'] = '5'\n"
+            "print(config.PARSE_CPU_LIMIT, config.PARSE_MEMORY_LIMIT)\n"
+            "os.environ['PARSE_CPU_LIMIT'] = '10'\n"
+            "print(config.PARSE_CPU_LIMIT)\n"
+        )
+        self.assertEqual("5 1024\n5\n", output)
+
+    def test_missing_settings_raise_when_used(self) -> None:
+        output = self.run_python(
+            "import mecadoi.config as config\n"
+            "try:\n"
+            "    config.CROSSREF_USERNAME\n"
+            "except ValueError as e:\n"
+            "    print(e)\n"
+        )
+        self.assertEqual('no env variable found for name "CROSSREF_USERNAME"\n', output)
+
+    def test_unknown_settings(self) -> None:
+        import mecadoi.config as config
+
+        with self.assertRaises(AttributeError):
+            config.UNKNOWN_SETTING
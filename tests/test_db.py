@@ -1,9 +1,21 @@
-from datetime import datetime
-from os import remove
+from datetime import datetime, timedelta
+from os import getenv, remove
 from typing import List
-from unittest import TestCase
-
-from mecadoi.db import BatchDatabase, DepositionAttempt, ParsedFile
+from unittest import skipUnless, TestCase
+
+from sqlalchemy import text
+from yaml import dump
+from mecadoi.article import from_meca_manuscript
+from mecadoi.db import (
+    BatchDatabase,
+    DepositionAttempt,
+    DepositionClaim,
+    ParsedFile,
+    ParsedFileSummary,
+    ReviewRecord,
+    UsedDoi,
+    metadata,
+)
 from tests.test_meca import MANUSCRIPTS
 
 
@@ -270,6 +282,126 @@ class DbTestCase(BatchDbTestCase):
             expected_files_ready_for_deposition, files_ready_for_deposition
         )
 
+    def test_get_files_to_retry_deposition_uses_latest_attempt(self) -> None:
+        """Only the latest attempt of a file counts, attempts at the same time are ordered by their insertion."""
+        self.db.insert_all(self.parsed_files)
+        inserted_parsed_files = self.db.fetch_all(ParsedFile)
+        attempted_at = datetime(2022, 2, 1)
+        self.db.insert_all(
+            [
+                DepositionAttempt(
+                    meca=inserted_parsed_files[2],
+                    attempted_at=attempted_at,
+                    status=DepositionAttempt.Succeeded,
+                ),
+                DepositionAttempt(
+                    meca=inserted_parsed_files[2],
+                    attempted_at=attempted_at,
+                    status=DepositionAttempt.Failed,
+                ),
+                DepositionAttempt(
+                    meca=inserted_parsed_files[3],
+                    attempted_at=attempted_at,
+                    status=DepositionAttempt.Failed,
+                ),
+                DepositionAttempt(
+                    meca=inserted_parsed_files[3],
+                    attempted_at=attempted_at,
+                    status=DepositionAttempt.Succeeded,
+                ),
+            ]
+        )
+
+        self.assertEqual(
+            [inserted_parsed_files[2]],
+            self.db.get_files_to_retry_deposition(datetime(1900, 1, 1), datetime.now()),
+        )
+
+    def test_claim_files_for_deposition(self) -> None:
+        """Claiming files selects the same files as fetching the files ready for or to retry deposition."""
+        self.db.insert_all(self.parsed_files)
+        inserted_parsed_files = self.db.fetch_all(ParsedFile)
+        self.db.insert_all(
+            [
+                DepositionAttempt(
+                    meca=inserted_parsed_files[3],
+                    deposition="<deposition_attempt></deposition_attempt>",
+                    attempted_at=datetime.now(),
+                    status=DepositionAttempt.Failed,
+                )
+            ]
+        )
+
+        for retry_failed, expected in [
+            (False, self.db.get_files_ready_for_deposition),
+            (True, self.db.get_files_to_retry_deposition),
+        ]:
+            with self.subTest(retry_failed=retry_failed):
+                with self.db.claim_files_for_deposition(
+                    datetime(1900, 1, 1), datetime.now(), retry_failed=retry_failed
+                ) as claimed_files:
+                    self.assertEqual(
+                        expected(datetime(1900, 1, 1), datetime.now()), claimed_files
+                    )
+
+    def test_claims_skip_files_claimed_by_other_workers(self) -> None:
+        """A file claimed by one worker is not claimed by another worker until the first one is done."""
+        self.db.insert_all(self.parsed_files)
+        other_worker_db = BatchDatabase(self.get_db_url())
+        after, before = datetime(1900, 1, 1), datetime.now()
+
+        with self.db.claim_files_for_deposition(after, before) as claimed_files:
+            self.assertTrue(claimed_files)
+            with other_worker_db.claim_files_for_deposition(
+                after, before
+            ) as files_claimed_by_other_worker:
+                self.assertEqual([], files_claimed_by_other_worker)
+
+            # Depositing the claimed files while they are claimed must not block.
+            self.db.insert_all(
+                [
+                    DepositionAttempt(
+                        meca=claimed_files[0],
+                        attempted_at=datetime.now(),
+                        status=DepositionAttempt.Succeeded,
+                    )
+                ]
+            )
+
+        with other_worker_db.claim_files_for_deposition(
+            after, before
+        ) as files_claimed_by_other_worker:
+            self.assertEqual(claimed_files[1:], files_claimed_by_other_worker)
+        other_worker_db.engine.dispose()
+
+        self.assertEqual([], self.db.fetch_all(DepositionClaim))
+
+    def test_expired_claims_are_taken_over(self) -> None:
+        """A file whose claim has expired, e.g. because its worker crashed, can be claimed by another worker."""
+        self.db.insert_all(self.parsed_files)
+        other_worker_db = BatchDatabase(self.get_db_url())
+        after, before = datetime(1900, 1, 1), datetime.now()
+
+        expired_claim = self.db.claim_files_for_deposition(
+            after, before, lease_seconds=-1, worker_id="crashed-worker"
+        )
+        claimed_files = expired_claim.__enter__()
+        self.assertTrue(claimed_files)
+        with other_worker_db.claim_files_for_deposition(
+            after, before, worker_id="other-worker"
+        ) as files_claimed_by_other_worker:
+            self.assertEqual(claimed_files, files_claimed_by_other_worker)
+
+            # Releasing the expired claims keeps the claims that replaced them.
+            expired_claim.__exit__(None, None, None)
+            self.assertEqual(
+                ["other-worker"] * len(claimed_files),
+                [claim.worker_id for claim in self.db.fetch_all(DepositionClaim)],
+            )
+
+        self.assertEqual([], self.db.fetch_all(DepositionClaim))
+        other_worker_db.engine.dispose()
+
     def test_get_parsed_files_with_doi(self) -> None:
         self.db.insert_all(self.parsed_files)
         inserted_parsed_files = self.db.fetch_all(ParsedFile)
@@ -278,6 +410,14 @@ class DbTestCase(BatchDbTestCase):
             actual = self.db.fetch_parsed_files_with_doi(parsed_file.doi)
             self.assertEqual([parsed_file], actual)
 
+    def test_has_parsed_file_with_doi(self) -> None:
+        self.db.insert_all(self.parsed_files)
+
+        for parsed_file in self.parsed_files:
+            if parsed_file.doi is not None:
+                self.assertTrue(self.db.has_parsed_file_with_doi(parsed_file.doi))
+        self.assertFalse(self.db.has_parsed_file_with_doi("10.1101/unknown"))
+
     def test_get_parsed_files_with_manuscript_id(self) -> None:
         manuscript_id = "JOURNAL-2025-12345"
         # ensure no accidental matches
@@ -310,6 +450,72 @@ class DbTestCase(BatchDbTestCase):
         )
         self.assert_parsed_files_equal(expected_parsed_files, actual_parsed_files)
 
+    def test_fetch_unpruned_files_with_paths(self) -> None:
+        self.db.insert_all(
+            [
+                ParsedFile(path=path, received_at=datetime(2022, 1, 1))
+                for path in [
+                    "recorded.zip",
+                    "unrecorded.zip",
+                    "bundle.tar!/first.zip",
+                    "bundle.tar!/second.zip",
+                    "bundle.tar.gz!/first.zip",
+                    # These sort right before and after the MECA archives in "bundle.tar".
+                    "bundle.tar!.zip",
+                    "bundle.tar!0.zip",
+                    "pruned.zip",
+                ]
+            ]
+        )
+        pruned_file = self.db.fetch_all(ParsedFile)[-1]
+        self.db.mark_as_pruned([pruned_file.id], datetime(2022, 1, 2))
+
+        self.assertEqual(
+            ["recorded.zip", "bundle.tar!/first.zip", "bundle.tar!/second.zip"],
+            [
+                path
+                for _, path in self.db.fetch_unpruned_files(
+                    ["bundle.tar", "pruned.zip", "recorded.zip"]
+                )
+            ],
+        )
+        self.assertEqual(7, len(self.db.fetch_unpruned_files()))
+
+    def test_has_parsed_file(self) -> None:
+        self.db.insert_all(
+            [
+                ParsedFile(path=path, received_at=datetime(2022, 1, 1))
+                for path in ["file.zip", "bundle.tar!/first.zip", "other.tar!.zip"]
+            ]
+        )
+
+        for path, expected in [
+            ("file.zip", True),
+            ("bundle.tar", True),
+            ("other.tar", False),
+            ("file", False),
+        ]:
+            with self.subTest(path=path):
+                self.assertEqual(expected, self.db.has_parsed_file(path))
+
+    def test_stream_parsed_files_between(self) -> None:
+        self.db.insert_all(self.parsed_files)
+
+        expected_rows = [
+            (f.id, f.path, f.doi, f.status, f.received_at)
+            for f in self.db.fetch_parsed_files_between(
+                datetime(2021, 1, 1), datetime(2022, 1, 1)
+            )
+        ]
+        rows = list(
+            self.db.stream_parsed_files_between(
+                datetime(2021, 1, 1), datetime(2022, 1, 1)
+            )
+        )
+        self.assertEqual(expected_rows, rows)
+        for row in rows:
+            self.assertIsInstance(row, ParsedFileSummary)
+
     def test_update_preprint_doi(self) -> None:
         parsed_file = ParsedFile(
             path="no-preprint-doi",
@@ -333,6 +539,288 @@ class DbTestCase(BatchDbTestCase):
         self.assertEqual(updated_file.manuscript.preprint_doi, preprint_doi)
         self.assertEqual(updated_file.status, ParsedFile.Valid)
 
+    def test_insert_parsed_files_creates_review_records(self) -> None:
+        """Review records are created for all reviews and replies in files that are or may become depositable."""
+        self.db.insert_parsed_files(self.parsed_files)
+        inserted_parsed_files = self.db.fetch_all(ParsedFile)
+        self.assert_parsed_files_equal(self.parsed_files, inserted_parsed_files)
+
+        ready = inserted_parsed_files[2]
+        expected_records = [
+            ReviewRecord(
+                id_parsed_file=ready.id,
+                received_at=ready.received_at,
+                preprint_doi=ready.doi,
+                revision_id=revision_round.revision_id,
+                running_number=review.running_number,
+            )
+            for revision_round in MANUSCRIPTS["no-author-reply"].review_process or []
+            for review in revision_round.reviews
+        ]
+        expected_count = sum(
+            len(revision_round.reviews) + (1 if revision_round.author_reply else 0)
+            for parsed_file in inserted_parsed_files
+            if parsed_file.status == ParsedFile.Valid and parsed_file.manuscript
+            for revision_round in parsed_file.manuscript.review_process or []
+        )
+        self.assertEqual(
+            expected_count,
+            len(self.db.fetch_all(ReviewRecord)),
+        )
+        self.assertEqual(
+            expected_records,
+            [
+                self.without_id(record)
+                for record in self.db.fetch_all(ReviewRecord)
+                if record.id_parsed_file == ready.id
+            ],
+        )
+
+    def test_insert_deposition_attempts_updates_review_records(self) -> None:
+        self.db.insert_parsed_files(self.parsed_files)
+        inserted_parsed_files = self.db.fetch_all(ParsedFile)
+        deposited = inserted_parsed_files[4]
+        failed = inserted_parsed_files[3]
+        article = from_meca_manuscript(
+            deposited.manuscript,
+            datetime.now(),
+            lambda resource: f"10.12345/{resource.split(' - ', 1)[1]}",
+        )
+
+        self.db.insert_deposition_attempts(
+            [
+                DepositionAttempt(
+                    meca=deposited,
+                    attempted_at=datetime.now(),
+                    status=DepositionAttempt.Succeeded,
+                ),
+                DepositionAttempt(
+                    meca=failed,
+                    attempted_at=datetime.now(),
+                    status=DepositionAttempt.GenerationFailed,
+                ),
+            ],
+            {deposited.id: article},
+        )
+
+        self.assertEqual(2, len(self.db.fetch_all(DepositionAttempt)))
+        records = self.db.fetch_review_records_between(
+            datetime(1900, 1, 1), datetime.now()
+        )
+        self.assertEqual(
+            [
+                ("0", "1", "10.12345/0 - 1", DepositionAttempt.Succeeded),
+                ("0", "2", "10.12345/0 - 2", DepositionAttempt.Succeeded),
+                ("0", None, "10.12345/0 - author reply", DepositionAttempt.Succeeded),
+            ],
+            [
+                (r.revision_id, r.running_number, r.doi, r.status)
+                for r in records
+                if r.id_parsed_file == deposited.id
+            ],
+        )
+        self.assertEqual(
+            {(None, DepositionAttempt.GenerationFailed)},
+            {(r.doi, r.status) for r in records if r.id_parsed_file == failed.id},
+        )
+        self.assertEqual(
+            {(None, None)},
+            {
+                (r.doi, r.status)
+                for r in records
+                if r.id_parsed_file == inserted_parsed_files[2].id
+            },
+        )
+
+    def test_update_preprint_doi_updates_review_records(self) -> None:
+        self.db.insert_parsed_files(
+            [
+                ParsedFile(
+                    path="no-preprint-doi",
+                    received_at=datetime(2023, 1, 1),
+                    manuscript=MANUSCRIPTS["no-preprint-doi"],
+                    status=ParsedFile.NoDoi,
+                )
+            ]
+        )
+        records = self.db.fetch_all(ReviewRecord)
+        self.assertNotEqual([], records)
+        self.assertEqual({None}, {record.preprint_doi for record in records})
+
+        preprint_doi = "10.1234/new-doi"
+        self.db.update_preprint_doi(self.db.fetch_all(ParsedFile)[0], preprint_doi)
+
+        self.assertEqual(
+            {preprint_doi},
+            {record.preprint_doi for record in self.db.fetch_all(ReviewRecord)},
+        )
+
+    def test_count_statistics(self) -> None:
+        self.db.insert_all(self.parsed_files)
+        inserted_parsed_files = self.db.fetch_all(ParsedFile)
+        self.db.insert_all(
+            [
+                DepositionAttempt(
+                    meca=inserted_parsed_files[index],
+                    attempted_at=attempted_at,
+                    status=status,
+                )
+                for index, attempted_at, status in [
+                    (3, datetime(2022, 1, 1, 9), DepositionAttempt.Failed),
+                    (3, datetime(2022, 1, 2, 9), DepositionAttempt.Failed),
+                    (4, datetime(2022, 1, 2, 10), DepositionAttempt.Succeeded),
+                ]
+            ]
+        )
+
+        self.assertEqual(
+            {"2021-11-05": 1, "2022-01-01": 1},
+            self.db.count_parsed_files_per_day(
+                datetime(2021, 6, 1), datetime(2022, 12, 31)
+            ),
+        )
+        self.assertEqual(
+            {DepositionAttempt.Failed: 2, DepositionAttempt.Succeeded: 1},
+            self.db.count_deposition_attempts_by_status(),
+        )
+        self.assertEqual(
+            {
+                "2022-01-02": {
+                    DepositionAttempt.Failed: 1,
+                    DepositionAttempt.Succeeded: 1,
+                }
+            },
+            self.db.count_deposition_attempts_per_day(
+                datetime(2022, 1, 2), datetime(2022, 1, 3)
+            ),
+        )
+
+    def test_fetch_backlog_percentiles(self) -> None:
+        self.db.insert_all(
+            [
+                ParsedFile(
+                    path=f"ready-{day}",
+                    received_at=datetime(2022, 1, day),
+                    status=ParsedFile.Valid,
+                )
+                for day in range(1, 11)
+            ]
+            + self.parsed_files[:2]
+        )
+
+        self.assertEqual(
+            (
+                10,
+                {
+                    10: datetime(2022, 1, 10),
+                    50: datetime(2022, 1, 6),
+                    100: datetime(2022, 1, 1),
+                },
+            ),
+            self.db.fetch_backlog_percentiles([50, 10, 100], datetime.now()),
+        )
+        self.assertEqual(
+            (0, {}), self.db.fetch_backlog_percentiles([50], datetime(2021, 1, 1))
+        )
+
+    def test_fetch_backlog_percentiles_of_more_than_100_files(self) -> None:
+        self.db.insert_all(
+            [
+                ParsedFile(
+                    path=f"ready-{hour}",
+                    received_at=datetime(2022, 1, 1) + timedelta(hours=hour),
+                    status=ParsedFile.Valid,
+                )
+                for hour in range(201)
+            ]
+        )
+
+        # the file at percentile p is at rank ceil(p * 201 / 100), counted from the youngest file at hour 200
+        self.assertEqual(
+            (
+                201,
+                {
+                    1: datetime(2022, 1, 1) + timedelta(hours=198),
+                    50: datetime(2022, 1, 1) + timedelta(hours=100),
+                    99: datetime(2022, 1, 1) + timedelta(hours=2),
+                    100: datetime(2022, 1, 1),
+                },
+            ),
+            self.db.fetch_backlog_percentiles([1, 50, 99, 100], datetime.now()),
+        )
+
+    def test_fetch_backlog_percentiles_of_files_received_at_the_same_time(
+        self,
+    ) -> None:
+        self.db.insert_all(
+            [
+                ParsedFile(
+                    path=f"ready-{number}",
+                    received_at=datetime(2022, 1, 1, hour),
+                    status=ParsedFile.Valid,
+                )
+                for number, hour in enumerate([1, 2, 1, 2, 1, 2])
+            ]
+        )
+
+        # ranks 1, 3, 3, 5 and 6 of 6 files, three of them received at 2:00 and three at 1:00
+        self.assertEqual(
+            (
+                6,
+                {
+                    16: datetime(2022, 1, 1, 2),
+                    34: datetime(2022, 1, 1, 2),
+                    50: datetime(2022, 1, 1, 2),
+                    67: datetime(2022, 1, 1, 1),
+                    100: datetime(2022, 1, 1, 1),
+                },
+            ),
+            self.db.fetch_backlog_percentiles([16, 34, 50, 67, 100], datetime.now()),
+        )
+
+    def test_count_used_dois_per_year(self) -> None:
+        self.assertEqual({}, self.db.count_used_dois_per_year())
+
+        self.db.insert_all(
+            [
+                UsedDoi(doi=doi, resource="resource", claimed_at=claimed_at)
+                for doi, claimed_at in [
+                    ("10.1/2021000001", datetime(2021, 1, 1)),
+                    ("10.1/2021000002", datetime(2021, 12, 31, 23, 59)),
+                    ("10.1/2023000001", datetime(2023, 6, 1)),
+                ]
+            ]
+        )
+        self.assertEqual({2021: 2, 2023: 1}, self.db.count_used_dois_per_year())
+        self.assertEqual(3, self.db.count_used_dois())
+
+    def test_reading_uncompressed_values(self) -> None:
+        """Manuscripts and depositions stored as plain text before compression was introduced can still be read."""
+        deposition = "<doi_batch></doi_batch>"
+        with self.db.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO parsed_file (id, path, received_at, manuscript) "
+                    "VALUES (1, 'legacy', '2022-01-01 00:00:00', :manuscript)"
+                ),
+                {"manuscript": dump(MANUSCRIPTS["no-reviews"])},
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO deposition_attempt (id_parsed_file, deposition) VALUES (1, :deposition)"
+                ),
+                {"deposition": deposition},
+            )
+
+        self.assertEqual(
+            MANUSCRIPTS["no-reviews"], self.db.fetch_all(ParsedFile)[0].manuscript
+        )
+        self.assertEqual(deposition, self.db.fetch_all(DepositionAttempt)[0].deposition)
+
+    def without_id(self, record: ReviewRecord) -> ReviewRecord:
+        record.id = None
+        return record
+
     def assert_parsed_files_equal(
         self, expected: List[ParsedFile], actual: List[ParsedFile]
     ) -> None:
@@ -345,3 +833,86 @@ class DbTestCase(BatchDbTestCase):
             # Add an id to the expected ParsedFile to allow us to use the assertEqual method.
             parsed_file.id = inserted_parsed_file.id
             self.assertEqual(parsed_file, inserted_parsed_file)
+
+
+TEST_POSTGRES_URL = getenv("TEST_POSTGRES_URL")
+
+
+class TimingsTestCase(BatchDbTestCase):
+    def setUp(self) -> None:
+        self.parsed_files = [
+            ParsedFile(
+                path=name,
+                received_at=datetime(2022, 1, 1),
+                manuscript=MANUSCRIPTS[name],
+                doi=MANUSCRIPTS[name].preprint_doi,
+                status=ParsedFile.Valid,
+            )
+            for name in ["multiple-revision-rounds", "single-revision-round"]
+        ]
+        return super().setUp()
+
+    def test_records_timings_per_method(self) -> None:
+        self.db.insert_parsed_files(self.parsed_files)
+        self.db.fetch_all(ParsedFile)
+        self.db.fetch_all(ParsedFile)
+
+        insert_timings = self.db.timings.methods["insert_parsed_files"]
+        self.assertEqual(1, insert_timings.calls)
+        self.assertGreater(insert_timings.statements, 0)
+        self.assertGreaterEqual(insert_timings.rows, len(self.parsed_files))
+
+        fetch_timings = self.db.timings.methods["fetch_all"]
+        self.assertEqual(2, fetch_timings.calls)
+        self.assertEqual(2, fetch_timings.statements)
+        self.assertEqual(2 * len(self.parsed_files), fetch_timings.rows)
+        self.assertGreater(fetch_timings.sql_seconds, 0)
+        self.assertGreaterEqual(fetch_timings.seconds, fetch_timings.sql_seconds)
+
+        summary = self.db.timings.summary()
+        self.assertEqual(0, summary["slow_queries"])
+        self.assertEqual(
+            {"calls", "rows", "seconds", "sql_seconds", "statements"},
+            set(summary["db"]["fetch_all"].keys()),
+        )
+
+    def test_claiming_files_records_timings(self) -> None:
+        self.db.insert_all(self.parsed_files)
+        with self.db.claim_files_for_deposition(
+            datetime(1900, 1, 1), datetime.now()
+        ) as files:
+            self.db.fetch_all(ParsedFile)
+
+        claim_timings = self.db.timings.methods["claim_files_for_deposition"]
+        self.assertEqual(1, claim_timings.calls)
+        self.assertEqual(len(files), claim_timings.rows)
+        self.assertEqual(1, self.db.timings.methods["fetch_all"].calls)
+
+    def test_logs_slow_queries(self) -> None:
+        db = BatchDatabase(self.get_db_url(), slow_query_threshold=0)
+        with self.assertLogs("mecadoi.db", "WARNING") as logs:
+            db.fetch_all(ParsedFile)
+
+        self.assertEqual(1, db.timings.slow_queries)
+        self.assertIn("Slow query", logs.output[0])
+        self.assertIn("FROM parsed_file", logs.output[0])
+
+
+@skipUnless(
+    TEST_POSTGRES_URL,
+    "set TEST_POSTGRES_URL to the URL of an empty PostgreSQL database to run these tests",
+)
+class PostgresDbTestCase(DbTestCase):
+    """Runs all database tests against the PostgreSQL database at TEST_POSTGRES_URL."""
+
+    def get_db_url(self) -> str:
+        return str(TEST_POSTGRES_URL)
+
+    def clear_database(self) -> None:
+        db = BatchDatabase(self.get_db_url())
+        metadata.drop_all(db.engine)
+        db.engine.dispose()
+
+    def tearDown(self) -> None:
+        self.db.engine.dispose()
+        return super().tearDown()
@@ -3,7 +3,7 @@ from re import escape
 from sqlalchemy.exc import IntegrityError
 from unittest.mock import Mock
 from mecadoi.config import DOI_TEMPLATE
-from mecadoi.dois import get_free_doi
+from mecadoi.dois import get_free_doi, has_year
 from tests.test_db import BatchDbTestCase
 
 
@@ -36,3 +36,9 @@ class DoiTestCase(BatchDbTestCase):
         mocked_doi_db.configure_mock(**attrs)
         with self.assertRaises(Exception):
             get_free_doi(mocked_doi_db, "test")
+
+    def test_has_year(self) -> None:
+        self.assertTrue(has_year("10.15252/rc.$year$random"))
+        self.assertTrue(has_year("10.15252/rc.${year}-$random"))
+        self.assertFalse(has_year("10.15252/rc.$random"))
+        self.assertFalse(has_year("10.15252/rc.$$year$random"))
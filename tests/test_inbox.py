@@ -0,0 +1,269 @@
+from datetime import datetime, timedelta
+from io import BytesIO
+from os import stat, utime
+from pathlib import Path
+from shutil import rmtree
+from tarfile import open as open_tar, TarInfo
+from unittest.mock import patch
+from zipfile import ZipFile
+
+from mecadoi.db import FileLease, ParsedFile, SeenFile
+from mecadoi.inbox import (
+    _why_incomplete,
+    Inbox,
+    ZIP_END_OF_CENTRAL_DIRECTORY,
+    ZIP_LOCAL_FILE_HEADER,
+)
+from mecadoi.watch import find_candidates
+from tests.test_db import BatchDbTestCase
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = datetime(2022, 10, 1, 12)
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+class InboxTestCase(BatchDbTestCase):
+    INPUT_DIR = "tests/tmp/inbox/input"
+    OUTPUT_DIR = "tests/tmp/inbox/output"
+
+    def setUp(self) -> None:
+        super().setUp()
+        rmtree("tests/tmp/inbox", ignore_errors=True)
+        Path(self.INPUT_DIR, "RC").mkdir(parents=True)
+        self.clock = FakeClock()
+        self.paths = [self.write(f"RC/{name}.zip") for name in "abcd"]
+
+    def tearDown(self) -> None:
+        rmtree("tests/tmp/inbox", ignore_errors=True)
+
+    def write(self, name: str) -> str:
+        path = Path(self.INPUT_DIR, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+        return str(path)
+
+    def new_inbox(self, worker_id: str) -> Inbox:
+        return Inbox(
+            self.INPUT_DIR,
+            self.db,
+            worker_id=worker_id,
+            lease_seconds=60,
+            clock=self.clock,
+        )
+
+    def test_claim(self) -> None:
+        inbox = self.new_inbox("worker")
+        leases = inbox.claim(self.paths[:2], f"{self.OUTPUT_DIR}/1")
+
+        self.assertEqual(self.paths[:2], [lease.path for lease in leases])
+        self.assertEqual(
+            [f"{self.OUTPUT_DIR}/1/RC/a.zip", f"{self.OUTPUT_DIR}/1/RC/b.zip"],
+            [lease.staged_path for lease in leases],
+        )
+        for lease in leases:
+            self.assertFalse(Path(lease.path).exists())
+            self.assertTrue(Path(lease.staged_path).exists())
+            self.assertEqual(self.clock.now + timedelta(seconds=60), lease.expires_at)
+        self.assertEqual(leases, self.db.fetch_all(FileLease))
+
+        inbox.release(leases)
+        self.assertEqual([], self.db.fetch_all(FileLease))
+
+    def test_workers_claim_disjoint_files(self) -> None:
+        first = self.new_inbox("first")
+        second = self.new_inbox("second")
+
+        # The second worker listed the files before the first one claimed some of them.
+        first_leases = first.claim(self.paths[:2], f"{self.OUTPUT_DIR}/1")
+        second_leases = second.claim(self.paths, f"{self.OUTPUT_DIR}/2")
+        first.release(first_leases)
+        first_leases += first.claim(self.paths, f"{self.OUTPUT_DIR}/3")
+
+        self.assertEqual(self.paths[:2], [lease.path for lease in first_leases])
+        self.assertEqual(self.paths[2:], [lease.path for lease in second_leases])
+        self.assertEqual(second_leases, self.db.fetch_all(FileLease))
+
+    def test_claim_skips_paths_leased_by_another_worker(self) -> None:
+        self.db.acquire_lease(
+            FileLease(
+                path=self.paths[0],
+                staged_path="elsewhere",
+                worker_id="other",
+                claimed_at=self.clock.now,
+                expires_at=self.clock.now,
+            )
+        )
+        leases = self.new_inbox("worker").claim(self.paths[:2], self.OUTPUT_DIR)
+
+        self.assertEqual([self.paths[1]], [lease.path for lease in leases])
+        self.assertTrue(Path(self.paths[0]).exists())
+
+    def test_recover_expired_leases(self) -> None:
+        crashed = self.new_inbox("crashed")
+        leases = crashed.claim(self.paths[:3], f"{self.OUTPUT_DIR}/1")
+        # The first file was registered before the worker crashed, the second one was removed by someone else.
+        self.db.insert_parsed_files(
+            [
+                ParsedFile(
+                    path=leases[0].staged_path,
+                    received_at=self.clock.now,
+                    status=ParsedFile.Invalid,
+                )
+            ]
+        )
+        Path(leases[1].staged_path).unlink()
+
+        worker = self.new_inbox("worker")
+        self.assertEqual([], worker.recover_expired_leases())
+
+        self.clock.now += timedelta(seconds=61)
+        self.assertEqual([self.paths[2]], worker.recover_expired_leases())
+        self.assertTrue(Path(leases[0].staged_path).exists())
+        self.assertTrue(Path(self.paths[2]).exists())
+        self.assertEqual([], self.db.fetch_all(FileLease))
+
+    def test_release_returns_unregistered_files(self) -> None:
+        inbox = self.new_inbox("worker")
+        leases = inbox.claim(self.paths[:2], f"{self.OUTPUT_DIR}/1")
+        self.db.insert_parsed_files(
+            [
+                ParsedFile(
+                    path=leases[0].staged_path,
+                    received_at=self.clock.now,
+                    status=ParsedFile.Invalid,
+                )
+            ]
+        )
+
+        inbox.release(leases, return_unregistered=True)
+
+        self.assertTrue(Path(leases[0].staged_path).exists())
+        self.assertFalse(Path(self.paths[0]).exists())
+        self.assertFalse(Path(leases[1].staged_path).exists())
+        self.assertTrue(Path(self.paths[1]).exists())
+        self.assertEqual([], self.db.fetch_all(FileLease))
+
+    def test_release_keeps_lease_acquired_since(self) -> None:
+        crashed = self.new_inbox("crashed")
+        stale_leases = crashed.claim(self.paths[:1], f"{self.OUTPUT_DIR}/1")
+        self.clock.now += timedelta(seconds=61)
+        self.new_inbox("first").recover_expired_leases()
+        leases = self.new_inbox("second").claim(self.paths[:1], f"{self.OUTPUT_DIR}/2")
+
+        crashed.release(stale_leases)
+
+        self.assertEqual(leases, self.db.fetch_all(FileLease))
+
+    def test_select_complete(self) -> None:
+        zip_content = BytesIO()
+        with ZipFile(zip_content, "w") as archive:
+            archive.writestr("manifest.xml", "<manifest/>" * 100)
+        tar_content = BytesIO()
+        with open_tar(fileobj=tar_content, mode="w") as bundle:
+            info = TarInfo("a.zip")
+            info.size = len(zip_content.getvalue())
+            bundle.addfile(info, BytesIO(zip_content.getvalue()))
+        files = {
+            "complete.zip": zip_content.getvalue(),
+            "complete.tar": tar_content.getvalue(),
+            "not-an-archive.txt": b"text",
+            "young.zip": zip_content.getvalue(),
+            ".complete.zip.Ab12Cd": zip_content.getvalue(),
+            "complete.zip.part": zip_content.getvalue(),
+            "truncated.zip": zip_content.getvalue()[:100],
+            "truncated.tar": tar_content.getvalue()[:1024],
+            "truncated-long-ago.zip": zip_content.getvalue()[:100],
+            "extracted/manifest.xml": b"<manifest/>",
+        }
+        rmtree(self.INPUT_DIR)
+        now = self.clock.now.timestamp()
+        for name, content in files.items():
+            path = Path(self.INPUT_DIR, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+            age = {"young.zip": 10, "truncated-long-ago.zip": 86400}.get(name, 120)
+            utime(path, (now - age, now - age))
+
+        inbox = Inbox(self.INPUT_DIR, self.db, min_age=60, clock=self.clock)
+        selected = inbox.select_complete(find_candidates(self.INPUT_DIR))
+
+        self.assertEqual(
+            [
+                f"{self.INPUT_DIR}/{name}"
+                for name in [
+                    "complete.tar",
+                    "complete.zip",
+                    "extracted",
+                    "not-an-archive.txt",
+                    "truncated-long-ago.zip",
+                ]
+            ],
+            selected,
+        )
+
+    def test_incomplete_files_are_examined_again_once_changed(self) -> None:
+        truncated = Path(self.INPUT_DIR, "truncated.zip")
+        truncated.write_bytes(ZIP_LOCAL_FILE_HEADER)
+        inbox = Inbox(self.INPUT_DIR, self.db)
+        with patch("mecadoi.inbox._why_incomplete", wraps=_why_incomplete) as check:
+            self.assertEqual(self.paths, inbox.discover())
+            self.assertEqual(5, check.call_count)
+            [seen_file] = self.db.fetch_all(SeenFile)
+            self.assertEqual(
+                (str(truncated), SeenFile.Incomplete),
+                (seen_file.path, seen_file.status),
+            )
+
+            self.assertEqual(self.paths, inbox.discover())
+            self.assertEqual(9, check.call_count)
+
+            with truncated.open("ab") as file:
+                file.write(ZIP_END_OF_CENTRAL_DIRECTORY + bytes(18))
+            self.assertEqual(sorted([*self.paths, str(truncated)]), inbox.discover())
+            self.assertEqual(14, check.call_count)
+
+    def test_discover_ignores_hidden_files(self) -> None:
+        hidden_paths = [
+            self.write(name)
+            for name in [".DS_Store", "RC/.a.zip.swp", ".Trash/old.zip"]
+        ]
+        long_ago = datetime.now().timestamp() - 2 * 86400
+        for path in hidden_paths:
+            utime(path, (long_ago, long_ago))
+
+        inbox = Inbox(self.INPUT_DIR, self.db, max_wait=86400)
+
+        self.assertEqual(self.paths, inbox.discover())
+        self.assertEqual([], self.db.fetch_all(SeenFile))
+
+    def test_discover_forgets_incomplete_files_that_are_gone(self) -> None:
+        Path(self.INPUT_DIR, "upload.part").write_text("partial")
+        inbox = Inbox(self.INPUT_DIR, self.db)
+        inbox.discover()
+        self.assertEqual(1, len(self.db.fetch_all(SeenFile)))
+
+        Path(self.INPUT_DIR, "upload.part").unlink()
+        inbox.discover()
+        self.assertEqual([], self.db.fetch_all(SeenFile))
+
+    def test_claim_records_moved_files(self) -> None:
+        leases = self.new_inbox("worker").claim(self.paths[:2], self.OUTPUT_DIR)
+
+        seen_files = self.db.fetch_all(SeenFile)
+        self.assertEqual(
+            [lease.staged_path for lease in leases],
+            [seen_file.path for seen_file in seen_files],
+        )
+        for seen_file in seen_files:
+            self.assertEqual(SeenFile.Archived, seen_file.status)
+            self.assertEqual(stat(seen_file.path).st_ino, seen_file.inode)
+        self.assertEqual([], self.db.fetch_prunable_paths())
+
+        self.new_inbox("worker").release(leases)
+        self.assertEqual(
+            [lease.staged_path for lease in leases], self.db.fetch_prunable_paths()
+        )
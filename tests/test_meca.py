@@ -1,6 +1,33 @@
+from html import unescape
+from io import BytesIO
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from random import Random
+from typing import Any, Dict, List, Optional
+from unittest import TestCase
+from shutil import copytree
+from unittest.mock import patch
+from zipfile import ZIP_DEFLATED, ZipFile
+from lxml.etree import (
+    Comment,
+    Element,
+    fromstring,
+    parse,
+    ProcessingInstruction,
+    SubElement,
+    tostring,
+)
 from mecadoi.meca import (
+    _get_authors,
+    _text,
+    ArchiveLimitExceeded,
+    ArchiveLimits,
+    FileInMeca,
+    MECArchive,
+    MecaSource,
     parse_meca_archive,
     Manuscript,
+    ManuscriptTriage,
     AuthorReply,
     Review,
     RevisionRound,
@@ -32,12 +59,454 @@ class ParseMecaArchiveTestCase(MecaArchiveTestCase):
                 actual_result = parse_meca_archive(meca_archive_path)
                 self.assertArticlesEqual(expected_result, actual_result)
 
+    def test_parsing_archives_from_memory_and_streams(self) -> None:
+        """MECA archives can be parsed from their content in memory and from binary file objects."""
+        meca_archive_path = self.get_meca_archive_path("multiple-revision-rounds")
+        expected_result = MANUSCRIPTS["multiple-revision-rounds"]
+        content = Path(meca_archive_path).read_bytes()
+
+        with open(meca_archive_path, "rb") as file, mmap(
+            file.fileno(), 0, access=ACCESS_READ
+        ) as mapped_file:
+            sources: List[MecaSource] = [
+                Path(meca_archive_path),
+                content,
+                bytearray(content),
+                memoryview(content),
+                mapped_file,
+                BytesIO(content),
+                file,
+            ]
+            for source in sources:
+                with self.subTest(source=type(source).__name__):
+                    self.assertEqual(expected_result, parse_meca_archive(source))
+                    self.assertEqual(
+                        expected_result.preprint_doi,
+                        parse_meca_archive(source, level="triage").preprint_doi,
+                    )
+
+    def test_parsing_extracted_archives(self) -> None:
+        """MECA archives can be parsed from directories with their extracted files."""
+        for meca_name, expected_result in MANUSCRIPTS.items():
+            with self.subTest(meca_name=meca_name):
+                path = f"{self.MECA_SOURCE_DIR}/{meca_name}"
+                self.assertEqual(expected_result, parse_meca_archive(path))
+                self.assertEqual(
+                    expected_result.preprint_doi,
+                    parse_meca_archive(path, level="triage").preprint_doi,
+                )
+
+    def test_symbolic_links_in_extracted_archives_are_ignored(self) -> None:
+        path = f"{self.MECA_TARGET_DIR}/extracted"
+        copytree(f"{self.MECA_SOURCE_DIR}/multiple-revision-rounds", path)
+        manifest = Path(path, "manifest.xml")
+        manifest.rename(Path(path, "manifest-target.xml"))
+        manifest.symlink_to("manifest-target.xml")
+        with self.assertRaisesRegex(ValueError, "missing manifest"):
+            parse_meca_archive(path)
+
+    def test_parsing_invalid_archives_from_memory(self) -> None:
+        """When parsing content that is not a ZIP file a ValueError should be raised."""
+        content = Path(
+            "tests/resources/expected/multiple-revision-rounds.xml"
+        ).read_bytes()
+        sources: List[MecaSource] = [content, memoryview(content), BytesIO(content)]
+        for source in sources:
+            with self.subTest(source=type(source).__name__):
+                with self.assertRaises(ValueError):
+                    parse_meca_archive(source)
+
+    def test_article_body_is_not_parsed(self) -> None:
+        """Only the front matter of the article is parsed, so anything after it does not affect the result."""
+        meca_archive_path = self.get_meca_archive_path("multiple-revision-rounds")
+        modified_archive_path = f"{self.MECA_TARGET_DIR}/malformed-body.zip"
+        with ZipFile(meca_archive_path) as archive, ZipFile(
+            modified_archive_path, "w"
+        ) as modified_archive:
+            for info in archive.infolist():
+                data = archive.read(info)
+                if b"</front>" in data:
+                    data = data.replace(b"</front>", b"</front><body><p>unclosed")
+                modified_archive.writestr(info, data)
+
+        self.assertEqual(
+            MANUSCRIPTS["multiple-revision-rounds"],
+            parse_meca_archive(modified_archive_path),
+        )
+
+    def test_triaging_archives(self) -> None:
+        """Triaging a MECA archive should yield the same preprint DOI and review status as parsing it completely."""
+        for meca_archive_name, manuscript in MANUSCRIPTS.items():
+            with self.subTest(meca_archive=meca_archive_name):
+                meca_archive_path = self.get_meca_archive_path(meca_archive_name)
+                actual_result = parse_meca_archive(meca_archive_path, level="triage")
+                self.assertEqual(
+                    ManuscriptTriage(
+                        preprint_doi=manuscript.preprint_doi,
+                        has_reviews=bool(manuscript.review_process),
+                    ),
+                    actual_result,
+                )
+
+    def test_triaging_invalid_archives(self) -> None:
+        """When triaging invalid MECA archives a ValueError should be raised."""
+        for meca_archive_name in ["no-manifest", "no-article"]:
+            with self.subTest(meca_archive=meca_archive_name):
+                with self.assertRaises(ValueError):
+                    parse_meca_archive(
+                        self.get_meca_archive_path(meca_archive_name), level="triage"
+                    )
+
     def assertArticlesEqual(
         self, expected_article: Manuscript, actual_article: Manuscript
     ) -> None:
         self.assertEqual(expected_article, actual_article)
 
 
+class ManifestTestCase(MecaArchiveTestCase):
+    """Verify that files are looked up in the manifest by their type and version."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        items = [
+            ("ejp-001", "article-metadata", "0"),
+            ("ejp-002", "Response to Reviewers", "0"),
+            ("ejp-003", "Response to Reviewers", "1"),
+            ("ejp-004", "Response to Reviewers", "1"),
+        ]
+        self.files = {
+            file_id: FileInMeca(
+                id=file_id,
+                file_name=f"{file_id}.xml",
+                media_type="application/xml",
+                type=file_type,
+                version=version,
+            )
+            for file_id, file_type, version in items
+        }
+        manifest = "".join(
+            f'<item id="{file.id}" type="{file.type}" version="{file.version}">'
+            f'<instance href="{file.file_name}" media-type="{file.media_type}"/></item>'
+            for file in self.files.values()
+        )
+        self.archive_path = f"{self.MECA_TARGET_DIR}/manifest-only.zip"
+        with ZipFile(self.archive_path, "w") as archive:
+            archive.writestr("manifest.xml", f"<manifest>{manifest}</manifest>")
+
+    def test_get_files_of_type(self) -> None:
+        with MECArchive(self.archive_path) as meca:
+            files_of_type = meca._get_files_of_type(MECArchive.AUTHOR_REPLY)
+            files_of_version = meca._get_files_of_type(MECArchive.AUTHOR_REPLY, "1")
+            files_of_missing_version = meca._get_files_of_type(
+                MECArchive.AUTHOR_REPLY, "2"
+            )
+            files_of_missing_type = meca._get_files_of_type(MECArchive.REVIEWS)
+        self.assertCountEqual(
+            [self.files["ejp-002"], self.files["ejp-003"], self.files["ejp-004"]],
+            files_of_type,
+        )
+        self.assertCountEqual(
+            [self.files["ejp-003"], self.files["ejp-004"]], files_of_version
+        )
+        self.assertEqual([], files_of_missing_version)
+        self.assertEqual([], files_of_missing_type)
+
+    def test_get_file_of_type(self) -> None:
+        with MECArchive(self.archive_path) as meca:
+            self.assert_get_file_of_type(meca)
+
+    def assert_get_file_of_type(self, meca: MECArchive) -> None:
+        self.assertEqual(
+            self.files["ejp-001"], meca._get_file_of_type(MECArchive.ARTICLE)
+        )
+        self.assertEqual(
+            self.files["ejp-002"],
+            meca._get_file_of_type(MECArchive.AUTHOR_REPLY, version="0"),
+        )
+        for version in [None, "1", "2"]:
+            with self.subTest(version=version):
+                with self.assertRaises(ValueError):
+                    meca._get_file_of_type(MECArchive.AUTHOR_REPLY, version=version)
+
+    def test_item_without_instance(self) -> None:
+        with ZipFile(self.archive_path, "w") as archive:
+            archive.writestr(
+                "manifest.xml", '<manifest><item id="ejp-001"/></manifest>'
+            )
+        with self.assertRaises(ValueError):
+            MECArchive(self.archive_path)
+
+
+class UntrustedXmlTestCase(MecaArchiveTestCase):
+    """Verify that hostile or pathological XML in MECA archives is rejected or defused."""
+
+    def create_archive(self, file_name: str, replacements: Dict[str, str]) -> str:
+        """Create a copy of a valid MECA archive in which the given strings in the given file are replaced."""
+        original_path = self.get_meca_archive_path("multiple-revision-rounds")
+        path = f"{self.MECA_TARGET_DIR}/untrusted.zip"
+        with ZipFile(original_path) as original, ZipFile(path, "w") as archive:
+            for info in original.infolist():
+                data = original.read(info)
+                if info.filename == file_name:
+                    text = data.decode("utf-8")
+                    for old, new in replacements.items():
+                        self.assertIn(old, text)
+                        text = text.replace(old, new)
+                    data = text.encode("utf-8")
+                archive.writestr(info, data)
+        return path
+
+    def test_external_entities_are_not_resolved(self) -> None:
+        secret_file = Path(f"{self.MECA_TARGET_DIR}/secret.txt")
+        secret_file.write_text("secret")
+        path = self.create_archive(
+            "article.xml",
+            {
+                '<!DOCTYPE article SYSTEM "JATS-archivearticle1.dtd">': (
+                    f'<!DOCTYPE article [<!ENTITY secret SYSTEM "{secret_file.absolute().as_uri()}">]>'
+                ),
+                "An article with multiple revision rounds.": "&secret;",
+            },
+        )
+        self.assertNotIn("secret", parse_meca_archive(path).title)
+
+    def test_entity_expansion(self) -> None:
+        entities = '<!ENTITY lol0 "lol">' + "".join(
+            f'<!ENTITY lol{i} "{f"&lol{i - 1};" * 10}">' for i in range(1, 10)
+        )
+        path = self.create_archive(
+            "reviews.xml",
+            {
+                '<!DOCTYPE review-group SYSTEM "reviews.dtd">': (
+                    f"<!DOCTYPE review-group [{entities}]>"
+                ),
+                "</review-group>": "<x>&lol9;</x></review-group>",
+            },
+        )
+        self.assert_invalid(path, levels=["full"])
+
+    def test_deeply_nested_elements(self) -> None:
+        path = self.create_archive(
+            "reviews.xml",
+            {"</review-group>": "<x>" * 300 + "</x>" * 300 + "</review-group>"},
+        )
+        self.assert_invalid(path, levels=["full"])
+
+    def test_malformed_xml(self) -> None:
+        path = self.create_archive("article.xml", {"</article-title>": ""})
+        self.assert_invalid(path)
+
+    def test_large_xml_files(self) -> None:
+        path = self.get_meca_archive_path("multiple-revision-rounds")
+        self.assert_invalid(path, limits=ArchiveLimits(max_xml_size=1024))
+
+    def assert_invalid(
+        self,
+        path: str,
+        levels: List[str] = ["full", "triage"],
+        limits: Optional[ArchiveLimits] = None,
+    ) -> None:
+        for level in levels:
+            with self.subTest(level=level):
+                with self.assertRaises(ValueError):
+                    parse_meca_archive(path, level=level, limits=limits)  # type: ignore[call-overload]
+
+
+class ArchiveLimitsTestCase(MecaArchiveTestCase):
+    """Verify that archives exceeding the limits are rejected before their files are decompressed."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = f"{self.MECA_TARGET_DIR}/limits.zip"
+        with ZipFile(
+            self.get_meca_archive_path("multiple-revision-rounds")
+        ) as original:
+            with ZipFile(self.path, "w", compression=ZIP_DEFLATED) as archive:
+                for info in original.infolist():
+                    archive.writestr(info, original.read(info))
+                # incompressible, like most figures
+                archive.writestr("figure.tif", Random(0).randbytes(2 * 1024 * 1024))
+
+    def test_default_limits(self) -> None:
+        self.assertIsNotNone(parse_meca_archive(self.path).review_process)
+
+    def test_limits(self) -> None:
+        for limits in [
+            ArchiveLimits(max_members=3),
+            ArchiveLimits(max_total_size=1024 * 1024),
+            ArchiveLimits(max_compression_ratio=0.5),
+        ]:
+            with self.subTest(limits=limits):
+                with patch.object(ZipFile, "open") as open_file:
+                    with self.assertRaises(ArchiveLimitExceeded):
+                        MECArchive(self.path, limits)
+                open_file.assert_not_called()
+
+    def test_highly_compressed_file(self) -> None:
+        with ZipFile(self.path, "a", compression=ZIP_DEFLATED) as archive:
+            archive.writestr("bomb.xml", bytes(8 * 1024 * 1024))
+        with self.assertRaisesRegex(ArchiveLimitExceeded, "bomb.xml"):
+            parse_meca_archive(self.path, level="triage")
+
+    def test_no_limits(self) -> None:
+        limits = ArchiveLimits(
+            max_members=None,
+            max_total_size=None,
+            max_compression_ratio=None,
+            max_xml_size=None,
+        )
+        parse_meca_archive(self.path, limits=limits)
+
+    def test_corrupt_xml_member(self) -> None:
+        """Files whose compressed data doesn't match their entry in the central directory are rejected."""
+        with ZipFile(self.path) as archive:
+            info = archive.getinfo("manifest.xml")
+        with open(self.path, "r+b") as archive_file:
+            archive_file.seek(info.header_offset + 30 + len(info.filename) + 100)
+            archive_file.write(b"\x00" * 100)
+        with self.assertRaises(ValueError):
+            MECArchive(self.path)
+
+
+class GetAuthorsTestCase(TestCase):
+    """Verify that authors are matched with their affiliations."""
+
+    def test_authors_with_multiple_affiliations(self) -> None:
+        contrib_group = fromstring(
+            """
+            <contrib-group>
+                <contrib contrib-type="author" corresp="yes">
+                    <name><surname>Doe</surname><given-names>Jane</given-names></name>
+                    <xref ref-type="aff" rid="aff2"/>
+                    <xref ref-type="aff" rid="aff1"/>
+                </contrib>
+                <contrib contrib-type="reviewer">
+                    <name><surname>Roe</surname><given-names>Richard</given-names></name>
+                </contrib>
+                <contrib contrib-type="author">
+                    <name><surname>Doe</surname><given-names>John</given-names></name>
+                    <xref ref-type="aff" rid="aff2"/>
+                    <xref ref-type="fn" rid="fn1"/>
+                </contrib>
+                <aff id="aff1"><institution>EMBL</institution><country>Germany</country></aff>
+                <aff id="aff2">
+                    <institution>EMBO</institution>
+                    <institution content-type="dept">Cell Biology</institution>
+                    <addr-line content-type="city">Heidelberg</addr-line>
+                </aff>
+                <aff id="aff2"><institution>Duplicate id, ignored</institution></aff>
+            </contrib-group>
+            """
+        )
+        embo = Institution(name="EMBO", department="Cell Biology", city="Heidelberg")
+        embl = Institution(name="EMBL", country="Germany")
+
+        self.assertEqual(
+            [
+                Author(
+                    given_name="Jane",
+                    surname="Doe",
+                    orcid=None,
+                    is_corresponding_author=True,
+                    institutions=[embo, embl],
+                ),
+                Author(
+                    given_name="John",
+                    surname="Doe",
+                    orcid=None,
+                    is_corresponding_author=False,
+                    institutions=[embo],
+                ),
+            ],
+            _get_authors(contrib_group, contrib_type="author"),
+        )
+
+    def test_unknown_affiliation(self) -> None:
+        contrib_group = fromstring(
+            """
+            <contrib-group>
+                <contrib contrib-type="author">
+                    <name><surname>Doe</surname><given-names>Jane</given-names></name>
+                    <xref ref-type="aff" rid="aff1"/>
+                </contrib>
+            </contrib-group>
+            """
+        )
+        with self.assertRaises(ValueError):
+            _get_authors(contrib_group, contrib_type="author")
+
+
+def reference_text(node: Any) -> str:
+    """The original implementation of `_text()`, which serializes the node to text and unescapes the result."""
+    return unescape(str(tostring(node, method="text", encoding=str).strip()))
+
+
+class TextTestCase(TestCase):
+    """Verify that `_text()` returns the same text as serializing the node does."""
+
+    def test_corpus(self) -> None:
+        for xml_file in Path("tests/resources/meca").glob("**/*.xml"):
+            with self.subTest(xml_file=str(xml_file)):
+                for node in parse(str(xml_file)).getroot().iter("*"):
+                    self.assertEqual(reference_text(node), _text(node))
+
+    def test_random_trees(self) -> None:
+        random = Random(20221019)
+        for i in range(300):
+            root = self.random_tree(random, depth=4)
+            # parsing the serialized tree again merges adjacent text and resolves character references
+            for tree in [root, fromstring(tostring(root))]:
+                for node in tree.iter("*"):
+                    with self.subTest(i=i, xml=tostring(tree)):
+                        self.assertEqual(reference_text(node), _text(node))
+
+    def random_tree(self, random: Random, depth: int) -> Any:
+        root = Element("root")
+        root.text = self.random_text(random)
+        self.add_children(random, root, depth)
+        return root
+
+    def add_children(self, random: Random, parent: Any, depth: int) -> None:
+        if depth == 0:
+            return
+        for _ in range(random.randint(0, 3)):
+            kind = random.random()
+            if kind < 0.1:
+                child = Comment((self.random_text(random) or "").replace("-", ""))
+            elif kind < 0.15:
+                child = ProcessingInstruction("pi", "data")
+            else:
+                child = SubElement(parent, random.choice(["p", "bold", "italic"]))
+                child.text = self.random_text(random)
+                self.add_children(random, child, depth - 1)
+            if child.getparent() is None:
+                parent.append(child)
+            child.tail = self.random_text(random)
+
+    def random_text(self, random: Random) -> Any:
+        fragments = [
+            "",
+            " ",
+            "\n  ",
+            "\t",
+            "\xa0",
+            "Lorem ipsum",
+            "Şcedil",
+            "&",
+            "&amp;",
+            "&scedil;",
+            "&#351;",
+            "&nbsp;",
+            "&lt;b&gt;",
+            "a < b > c",
+            "&unknown;",
+            "; &",
+        ]
+        if random.random() < 0.2:
+            return None
+        return "".join(random.choice(fragments) for _ in range(random.randint(0, 4)))
+
+
 INVALID_MECA_ARCHIVES = [
     "no-manifest",
     "no-article",
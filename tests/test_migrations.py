@@ -1,13 +1,26 @@
+from datetime import datetime
 from io import StringIO
 from importlib import reload
 from pathlib import Path
-from typing import cast
+from shutil import rmtree
+from typing import List, Optional, Tuple, cast
 from unittest.mock import patch
 import alembic.config
+from sqlalchemy import column, create_engine, insert, select, table
+from yaml import dump
 import sys
 
 from mecadoi.config import DB_URL
+from mecadoi.compression import decompress
+from mecadoi.db import (
+    BatchDatabase,
+    DepositionAttempt,
+    ParsedFile,
+    SeenFile,
+    tbl_review_record,
+)
 from tests.test_db import BatchDbTestCase
+from tests.test_meca import MANUSCRIPTS
 
 
 class DatabaseTestCase(BatchDbTestCase):
@@ -27,6 +40,10 @@ class DatabaseTestCase(BatchDbTestCase):
         command_line_args = ["upgrade", revision]
         alembic.config.CommandLine().main(argv=command_line_args)  # type: ignore[no-untyped-call]
 
+    def downgrade_to(self, revision: str) -> None:
+        command_line_args = ["downgrade", revision]
+        alembic.config.CommandLine().main(argv=command_line_args)  # type: ignore[no-untyped-call]
+
     def get_current_db_revision(self) -> str:
         with patch("sys.stdout", new_callable=StringIO) as stdout_mock:
             reload(alembic.config)
@@ -48,3 +65,214 @@ class DatabaseTestCase(BatchDbTestCase):
                 self.assertEqual("", self.get_current_db_revision())
                 self.migrate_to(target_revision)
                 self.assertEqual(target_revision, self.get_current_db_revision())
+
+    def test_migrate_creates_review_records(self) -> None:
+        """Review records are backfilled from the stored manuscripts and the depositions of existing files."""
+        self.clear_database()
+        self.migrate_to("2e5c2757b779")
+
+        manuscript = MANUSCRIPTS["multiple-revision-rounds"]
+        engine = create_engine(self.get_db_url())
+        with engine.begin() as connection:
+            connection.execute(
+                insert(
+                    table(
+                        "parsed_file",
+                        column("id"),
+                        column("path"),
+                        column("received_at"),
+                        column("manuscript"),
+                        column("doi"),
+                        column("status"),
+                    )
+                ).values(
+                    id=1,
+                    path="deposited",
+                    received_at=datetime(2022, 1, 1),
+                    manuscript=dump(manuscript),
+                    doi=manuscript.preprint_doi,
+                    status=ParsedFile.Valid,
+                )
+            )
+            connection.execute(
+                insert(
+                    table(
+                        "deposition_attempt",
+                        column("id_parsed_file"),
+                        column("deposition"),
+                        column("attempted_at"),
+                        column("status"),
+                    )
+                ).values(
+                    id_parsed_file=1,
+                    deposition=Path(
+                        "tests/resources/expected/multiple-revision-rounds.xml"
+                    ).read_text(),
+                    attempted_at=datetime(2022, 1, 2),
+                    status=DepositionAttempt.Succeeded,
+                )
+            )
+
+        self.migrate_to("3daf0532955b")
+
+        with engine.connect() as connection:
+            records = [
+                (row.revision_id, row.running_number, row.preprint_doi, row.status)
+                for row in connection.execute(select(tbl_review_record)).all()  # type: ignore
+                if row.doi is not None
+            ]
+        engine.dispose()
+
+        expected_records: List[Tuple[str, Optional[str], Optional[str], int]] = []
+        for revision_round in manuscript.review_process or []:
+            for review in revision_round.reviews:
+                expected_records.append(
+                    (
+                        revision_round.revision_id,
+                        review.running_number,
+                        manuscript.preprint_doi,
+                        DepositionAttempt.Succeeded,
+                    )
+                )
+            if revision_round.author_reply:
+                expected_records.append(
+                    (
+                        revision_round.revision_id,
+                        None,
+                        manuscript.preprint_doi,
+                        DepositionAttempt.Succeeded,
+                    )
+                )
+        self.assertEqual(sorted(expected_records, key=str), sorted(records, key=str))
+
+    def test_migrate_compresses_manuscripts_and_depositions(self) -> None:
+        """Existing manuscripts and depositions are compressed, and decompressed again when downgrading."""
+        self.clear_database()
+        self.migrate_to("3daf0532955b")
+
+        manuscript = MANUSCRIPTS["multiple-revision-rounds"]
+        deposition = Path(
+            "tests/resources/expected/multiple-revision-rounds.xml"
+        ).read_text()
+        engine = create_engine(self.get_db_url())
+        with engine.begin() as connection:
+            connection.execute(
+                insert(
+                    table(
+                        "parsed_file",
+                        column("id"),
+                        column("path"),
+                        column("received_at"),
+                        column("manuscript"),
+                        column("status"),
+                    )
+                ).values(
+                    id=1,
+                    path="deposited",
+                    received_at=datetime(2022, 1, 1),
+                    manuscript=dump(manuscript),
+                    status=ParsedFile.Valid,
+                )
+            )
+            connection.execute(
+                insert(
+                    table(
+                        "deposition_attempt",
+                        column("id_parsed_file"),
+                        column("deposition"),
+                        column("attempted_at"),
+                        column("status"),
+                    )
+                ).values(
+                    id_parsed_file=1,
+                    deposition=deposition,
+                    attempted_at=datetime(2022, 1, 2),
+                    status=DepositionAttempt.Succeeded,
+                )
+            )
+
+        self.migrate_to("head")
+
+        with engine.connect() as connection:
+            stored_deposition = connection.execute(
+                select(column("deposition")).select_from(table("deposition_attempt"))  # type: ignore
+            ).scalar_one()
+        self.assertIsInstance(stored_deposition, bytes)
+        self.assertLess(len(stored_deposition), len(deposition))
+        self.assertEqual(deposition, decompress(stored_deposition))
+
+        db = BatchDatabase(self.get_db_url())
+        self.assertEqual(manuscript, db.fetch_all(ParsedFile)[0].manuscript)
+        self.assertEqual(deposition, db.fetch_all(DepositionAttempt)[0].deposition)
+        db.engine.dispose()
+
+        self.downgrade_to("3daf0532955b")
+
+        with engine.connect() as connection:
+            stored_deposition = connection.execute(
+                select(column("deposition")).select_from(table("deposition_attempt"))  # type: ignore
+            ).scalar_one()
+        engine.dispose()
+        self.assertEqual(deposition, stored_deposition)
+
+    def test_migrate_records_archived_files(self) -> None:
+        """Existing parsed files that are still on disk are recorded as archived, so that they are pruned."""
+        self.clear_database()
+        self.migrate_to("5c1e9a7f3b20")
+
+        archived_dir = Path("tests/tmp/batch/archived")
+        rmtree(archived_dir, ignore_errors=True)
+        archived_dir.mkdir(parents=True)
+        archive = archived_dir / "archive.zip"
+        archive.write_bytes(b"archive")
+        bundle = archived_dir / "bundle.tar"
+        bundle.write_bytes(b"bundle")
+        extracted = archived_dir / "extracted"
+        (extracted / "manifest.xml").parent.mkdir()
+        (extracted / "manifest.xml").write_bytes(b"manifest")
+        paths = [
+            str(archive),
+            f"{bundle}!/a.zip",
+            f"{bundle}!/b.zip",
+            str(extracted),
+            str(archived_dir / "pruned.zip"),
+        ]
+
+        engine = create_engine(self.get_db_url())
+        with engine.begin() as connection:
+            for id_parsed_file, path in enumerate(paths, start=1):
+                connection.execute(
+                    insert(
+                        table(
+                            "parsed_file",
+                            column("id"),
+                            column("path"),
+                            column("received_at"),
+                            column("status"),
+                        )
+                    ).values(
+                        id=id_parsed_file,
+                        path=path,
+                        received_at=datetime(2022, 1, 1),
+                        status=ParsedFile.Invalid,
+                    )
+                )
+        engine.dispose()
+
+        self.migrate_to("8a3f2d61c4e7")
+
+        db = BatchDatabase(self.get_db_url())
+        seen_files = db.fetch_all(SeenFile)
+        db.engine.dispose()
+        rmtree(archived_dir)
+        self.assertEqual(
+            sorted([str(archive), str(bundle), str(extracted)]),
+            sorted(seen_file.path for seen_file in seen_files),
+        )
+        self.assertEqual(
+            {SeenFile.Archived}, {seen_file.status for seen_file in seen_files}
+        )
+        self.assertEqual(
+            {str(archive): 7, str(bundle): 6, str(extracted): 8},
+            {seen_file.path: seen_file.size for seen_file in seen_files},
+        )
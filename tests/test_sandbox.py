@@ -0,0 +1,76 @@
+from time import process_time, sleep
+from typing import Callable
+from unittest import TestCase
+
+from mecadoi.sandbox import LimitExceeded, Sandbox
+
+MEGABYTE = 1024 * 1024
+
+
+def spin() -> None:
+    while True:
+        pass
+
+
+def busy(seconds: float) -> None:
+    start = process_time()
+    while process_time() - start < seconds:
+        pass
+
+
+def allocate(size: int) -> bytes:
+    return b"x" * size
+
+
+def fail(message: str) -> None:
+    raise ValueError(message)
+
+
+def unpicklable() -> Callable[[], None]:
+    return lambda: None
+
+
+class SandboxTestCase(TestCase):
+    def setUp(self) -> None:
+        self.sandbox = Sandbox(cpu_seconds=1, memory_bytes=64 * MEGABYTE, timeout=5)
+
+    def tearDown(self) -> None:
+        self.sandbox.close()
+
+    def assert_sandbox_works(self) -> None:
+        self.assertEqual(1, self.sandbox.run(abs, -1))
+
+    def test_run(self) -> None:
+        self.assertEqual(8, self.sandbox.run(pow, 2, 3))
+        self.assertEqual(10 * MEGABYTE, len(self.sandbox.run(allocate, 10 * MEGABYTE)))
+
+    def test_exceptions_are_reraised(self) -> None:
+        with self.assertRaisesRegex(ValueError, "^error message$"):
+            self.sandbox.run(fail, "error message")
+        self.assert_sandbox_works()
+
+    def test_unpicklable_result(self) -> None:
+        with self.assertRaises(ValueError):
+            self.sandbox.run(unpicklable)
+        self.assert_sandbox_works()
+
+    def test_cpu_limit(self) -> None:
+        with self.assertRaises(LimitExceeded):
+            self.sandbox.run(spin)
+        self.assert_sandbox_works()
+
+    def test_memory_limit(self) -> None:
+        with self.assertRaises(LimitExceeded):
+            self.sandbox.run(allocate, 256 * MEGABYTE)
+        self.assert_sandbox_works()
+
+    def test_timeout(self) -> None:
+        self.sandbox.timeout = 0.1
+        with self.assertRaises(LimitExceeded):
+            self.sandbox.run(sleep, 5)
+        self.assert_sandbox_works()
+
+    def test_limits_apply_to_each_call(self) -> None:
+        """CPU time used by earlier calls doesn't count towards the limit of later calls."""
+        for _ in range(3):
+            self.sandbox.run(busy, 0.6)
@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+from mecadoi.timings import StageTimings
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StageTimingsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.timings = StageTimings(clock=self.clock)
+
+    def run_stage(self, name: str, seconds: float) -> None:
+        with self.timings.stage(name):
+            self.clock.now += seconds
+
+    def test_summary(self) -> None:
+        for seconds in range(1, 21):
+            self.run_stage("xml_parse", seconds / 10)
+        self.run_stage("db_insert", 0.5)
+
+        self.assertEqual(
+            {
+                "xml_parse": {
+                    "count": 20,
+                    "p50": 1.0,
+                    "p95": 1.9,
+                    "max": 2.0,
+                    "seconds": 21.0,
+                },
+                "db_insert": {
+                    "count": 1,
+                    "p50": 0.5,
+                    "p95": 0.5,
+                    "max": 0.5,
+                    "seconds": 0.5,
+                },
+            },
+            self.timings.summary(),
+        )
+        self.assertAlmostEqual(21.5, self.timings.seconds())
+
+    def test_stage_is_timed_if_it_raises(self) -> None:
+        with self.assertRaises(ValueError):
+            with self.timings.stage("crossref_post"):
+                self.clock.now += 3
+                raise ValueError()
+
+        self.assertEqual([3.0], self.timings.durations["crossref_post"])
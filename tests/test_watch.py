@@ -0,0 +1,170 @@
+from os import stat, utime
+from pathlib import Path
+from shutil import rmtree
+from typing import List
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from mecadoi.watch import (
+    find_candidates,
+    get_snapshot,
+    get_snapshots,
+    Snapshot,
+    StableFiles,
+    Watcher,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class WatchTestCase(TestCase):
+    INPUT_DIR = "tests/tmp/watch"
+
+    def setUp(self) -> None:
+        rmtree(self.INPUT_DIR, ignore_errors=True)
+        Path(self.INPUT_DIR, "RC").mkdir(parents=True)
+        self.clock = FakeClock()
+
+    def tearDown(self) -> None:
+        rmtree(self.INPUT_DIR, ignore_errors=True)
+
+    def write(self, name: str, content: str) -> str:
+        path = Path(self.INPUT_DIR, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return str(path)
+
+    def test_find_candidates(self) -> None:
+        archive = self.write("RC/archive.zip", "archive")
+        self.write("RC/extracted/manifest.xml", "manifest")
+        self.write("RC/extracted/content/article.xml", "article")
+        utime(f"{self.INPUT_DIR}/RC/extracted/content/article.xml", ns=(0, 123))
+        utime(f"{self.INPUT_DIR}/RC/extracted/manifest.xml", ns=(0, 456))
+
+        candidates = find_candidates(self.INPUT_DIR)
+
+        self.assertEqual(
+            {archive, f"{self.INPUT_DIR}/RC/extracted"}, set(candidates.keys())
+        )
+        snapshot = candidates[f"{self.INPUT_DIR}/RC/extracted"]
+        self.assertEqual((15, 456), (snapshot.size, snapshot.mtime_ns))
+        self.assertEqual(stat(f"{self.INPUT_DIR}/RC/extracted").st_ino, snapshot.inode)
+
+    def test_find_candidates_leaves_out_removed_paths(self) -> None:
+        archive = self.write("RC/archive.zip", "archive")
+        self.write("RC/extracted/manifest.xml", "manifest")
+
+        # the extracted archive is removed between listing its parent directory and reading its content
+        with patch(
+            "mecadoi.watch._get_snapshot_of_directory", side_effect=FileNotFoundError
+        ):
+            candidates = find_candidates(self.INPUT_DIR)
+
+        self.assertEqual([archive], list(candidates))
+
+    def test_get_snapshots_leaves_out_missing_paths(self) -> None:
+        archive = self.write("RC/archive.zip", "archive")
+        self.write("RC/extracted/manifest.xml", "manifest")
+        extracted = f"{self.INPUT_DIR}/RC/extracted"
+        missing = f"{self.INPUT_DIR}/RC/renamed.zip"
+
+        snapshots = get_snapshots([archive, missing, extracted])
+
+        self.assertEqual(
+            {archive: get_snapshot(archive), extracted: get_snapshot(extracted)},
+            snapshots,
+        )
+
+    def test_stable_files(self) -> None:
+        stable_files = StableFiles(stable_seconds=10, clock=self.clock)
+        self.assertEqual(
+            [], stable_files.update({"a": Snapshot(1, 1), "b": Snapshot(1, 1)})
+        )
+        self.assertEqual(10, stable_files.seconds_until_next_stable())
+
+        self.clock.now += 5
+        self.assertEqual(
+            [], stable_files.update({"a": Snapshot(1, 1), "b": Snapshot(2, 2)})
+        )
+        self.assertEqual(5, stable_files.seconds_until_next_stable())
+
+        self.clock.now += 5
+        self.assertEqual(
+            ["a"], stable_files.update({"a": Snapshot(1, 1), "b": Snapshot(2, 2)})
+        )
+
+        stable_files.forget(["a"])
+        self.clock.now += 5
+        self.assertEqual(["b"], stable_files.update({"b": Snapshot(2, 2)}))
+
+        self.assertEqual([], stable_files.update({}))
+        self.assertIsNone(stable_files.seconds_until_next_stable())
+
+    def test_watcher_ingests_stable_files(self) -> None:
+        ingested: List[List[str]] = []
+
+        def ingest(paths: List[str]) -> None:
+            ingested.append(paths)
+            for path in paths:
+                Path(path).unlink()
+
+        watcher = Watcher(self.INPUT_DIR, ingest, stable_seconds=10, clock=self.clock)
+        first = self.write("RC/first.zip", "first")
+        watcher.run_once()
+        self.clock.now += 5
+        second = self.write("RC/second.zip", "second")
+        watcher.run_once()
+        self.clock.now += 5
+        watcher.run_once()
+        self.clock.now += 5
+        watcher.run_once()
+        self.clock.now += 5
+        watcher.run_once()
+
+        self.assertEqual([[first], [second]], ingested)
+
+    def test_watcher_deposits_at_interval(self) -> None:
+        deposit = Mock(side_effect=[ValueError("failed"), None, None])
+        watcher = Watcher(
+            self.INPUT_DIR,
+            Mock(),
+            deposit=deposit,
+            deposit_interval=60,
+            clock=self.clock,
+        )
+        for _ in range(4):
+            watcher.run_once()
+            self.clock.now += 30
+
+        self.assertEqual(2, deposit.call_count)
+
+    def test_watcher_coalesces_changes(self) -> None:
+        """After a change, the watcher waits for the minimum interval since the last scan before scanning again."""
+        for poll_interval, expected_delay in [(60, 0.75), (0.5, 0.25)]:
+            with self.subTest(poll_interval=poll_interval):
+                watcher = Watcher(
+                    self.INPUT_DIR,
+                    Mock(),
+                    poll_interval=poll_interval,
+                    clock=self.clock,
+                )
+                watcher.run_once()
+                self.clock.now += 0.25
+                watcher._wakeup.set()
+                with patch.object(watcher._stopped, "wait") as wait:
+                    watcher._wait()
+
+                wait.assert_called_once_with(expected_delay)
+
+    def test_watcher_stops(self) -> None:
+        watcher = Watcher(self.INPUT_DIR, Mock(), poll_interval=60)
+        run_once = Mock(side_effect=watcher.stop)
+        watcher.run_once = run_once  # type: ignore[assignment]
+        watcher.run()
+        run_once.assert_called_once()